@@ -1,20 +1,22 @@
 from flask import Flask
 from app.config import Config
 from app.routes import register_routes
-from pymongo import MongoClient
-from langchain_cohere import CohereEmbeddings
+from app.services.embedding_service import get_embedding_model
+from app.services.llm_cache import install_llm_cache
+from app.services.db_service import get_mongo_client
+from app.services.history_service import start_history_index_build
 
 
 def create_app():
     app = Flask(__name__)
     app.config.from_object(Config)
 
-    mongo_client = MongoClient(app.config['MONGODB_URI'])
+    mongo_client = get_mongo_client()
+    # Off the startup path: retried with backoff while MongoDB is unreachable
+    start_history_index_build()
 
-    embedding_model = CohereEmbeddings(
-        cohere_api_key=app.config['COHERE_API_KEY'],
-        model="embed-english-v3.0"
-    )
+    embedding_model = get_embedding_model()
+    install_llm_cache()
 
     app.mongo_client = mongo_client
     app.embedding_model = embedding_model
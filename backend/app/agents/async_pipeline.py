@@ -0,0 +1,103 @@
+import time
+from typing import Dict, Any, Optional
+
+from app.agents.dag import DagScheduler
+from app.agents.pipeline_agent import (
+    get_pipeline_mode,
+    lookup_cached_result,
+    store_cached_result,
+    schedule_background_work,
+    resolve_pipeline_config,
+    retrieve_knowledge,
+    get_stage_concurrency,
+    build_pipeline_stages,
+    checkpointed_stages,
+    instrumented_stages,
+    skipped_final_results,
+    finish_pipeline_run
+)
+from app.services.embedding_service import get_embedding_model
+from app.services.metrics import RunMetrics, metrics_scope
+from app.services.stage_checkpoints import STAGE_CHECKPOINTS, start_run_checkpoint
+from app.services.tracing import current_span, traced
+from app.services.vectorstore_service import asearch_documents
+from app.utils.async_utils import run_blocking
+from app.utils.logging import setup_logger
+
+logger = setup_logger(__name__)
+
+# asyncio equivalent of the threaded pipeline in pipeline_agent. It runs the same stage
+# DAG, but every stage awaits the agent's ainvoke / the chain's arun, so a run holds no
+# thread while it waits on Groq, and a timeout cancels the awaiting task instead of
+# leaving a worker thread behind.
+
+@traced("pipeline")
+async def run_pipeline_async(query: str, skip_validation: bool = False, skip_chains: bool = False, use_cache: bool = True,
+                             config=None, latency_budget: Optional[float] = None, deadline_ms: Optional[float] = None) -> Dict[str, Any]:
+    """
+    Async version of run_optimized_pipeline; same arguments and result structure
+    """
+    start_time = time.time()
+    run_metrics = RunMetrics()
+    deadline = start_time + deadline_ms / 1000 if deadline_ms is not None else None
+    if latency_budget is None and deadline_ms is not None:
+        latency_budget = deadline_ms / 1000
+    config = resolve_pipeline_config(config, latency_budget)
+    skip_validation = skip_validation or config.skip_validation
+    skip_chains = skip_chains or config.skip_chains
+    use_cache = use_cache and config.enable_caching
+    logger.info(f" Starting async pipeline for query: {query}")
+    current_span().set_attribute("pipeline.query", query)
+
+    embedding_model = get_embedding_model()
+    mode = get_pipeline_mode(config, skip_validation, skip_chains)
+
+    query_vector = None
+    if use_cache:
+        try:
+            with metrics_scope(run_metrics):
+                query_vector = await embedding_model.aembed_query(query)
+        except Exception as e:
+            logger.error(f"Query embedding failed: {e}")
+        if query_vector is not None:
+            cached_result = lookup_cached_result(query, mode, embedding_model, query_vector)
+            if cached_result is not None:
+                cached_result["execution_time"] = time.time() - start_time
+                return cached_result
+
+    # Step 0: Retrieve from FAISS
+    try:
+        with metrics_scope(run_metrics):
+            vector_results = await asearch_documents(query, embedding_model, k=config.vector_search_k)
+        retrieved_knowledge = retrieve_knowledge(vector_results, config)
+    except Exception as e:
+        logger.error(f"FAISS retrieval failed: {e}")
+        retrieved_knowledge = ""
+
+    checkpoint = None
+    if STAGE_CHECKPOINTS:
+        try:
+            checkpoint = await run_blocking(start_run_checkpoint, query, retrieved_knowledge, config, skip_validation, skip_chains)
+        except Exception as e:
+            logger.error(f"Could not start stage checkpoints: {e}")
+
+    # Steps 1-8: DAG of agent and chain stages on the event loop
+    scheduler = DagScheduler(max_concurrency=get_stage_concurrency(config), deadline=deadline)
+    stages = build_pipeline_stages(query, retrieved_knowledge, config, skip_validation, skip_chains)
+    if checkpoint is not None:
+        stages = checkpointed_stages(stages, checkpoint)
+    results = await scheduler.arun(instrumented_stages(stages, run_metrics))
+    results.update(skipped_final_results(query, skip_validation, skip_chains))
+
+    execution_time = time.time() - start_time
+    logger.info(f" Async pipeline completed in {execution_time:.2f} seconds")
+    result = finish_pipeline_run(query, retrieved_knowledge, results, scheduler, run_metrics, execution_time,
+                                 deadline_ms, checkpoint)
+
+    if use_cache and not result.get("degraded"):
+        store_cached_result(query, mode, embedding_model, result, query_vector)
+
+    # Indexing and saving go to the shared background pool (don't wait for them)
+    schedule_background_work(query, result["research"], result["analysis"], result, embedding_model, config, mode)
+
+    return result
@@ -0,0 +1,283 @@
+import argparse
+import dataclasses
+import json
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Any, Dict, Iterable, Iterator, Optional
+
+from app.agents.dag import DagScheduler, Stage
+from app.agents.pipeline_agent import (
+    get_pipeline_mode,
+    lookup_cached_result,
+    store_cached_result,
+    schedule_background_work,
+    resolve_pipeline_config,
+    retrieve_knowledge,
+    get_stage_concurrency,
+    build_pipeline_stages,
+    instrumented_stages,
+    skipped_final_results,
+    finish_pipeline_run,
+    single_flight_key
+)
+from app.config.pipeline_config import PipelineConfig
+from app.services.embedding_service import get_embedding_model
+from app.services.llm_clients import LLM_MAX_CONCURRENCY
+from app.services.metrics import RunMetrics
+from app.services.rate_limiter import rate_priority
+from app.services.tracing import iter_in_span, span, start_span, use_span
+from app.services.vectorstore_service import search_documents_batch
+from app.utils.logging import setup_logger
+
+logger = setup_logger(__name__)
+
+# Batch mode for many topics at once. Every query's embedding and FAISS lookup happen
+# up front in one call each, then the queries run their stage DAGs side by side, few
+# enough at a time that their LLM calls stay within LLM_MAX_CONCURRENCY. Provider calls
+# wait at "batch" priority, so interactive runs go first when a rate limit is tight.
+# Finished stages and queries are appended to a checkpoint file, so an interrupted batch
+# picks up where it stopped.
+
+# Queries run at once; 0 derives it from LLM_MAX_CONCURRENCY and the mode's stage concurrency
+BATCH_MAX_QUERIES = int(os.getenv("BATCH_MAX_QUERIES", 0))
+
+
+class BatchCheckpoint:
+    """
+    Append-only JSONL progress of a batch: one line per stage that completed ("ok"
+    status, so fallbacks are retried on resume) and one per finished query.
+    Without a path nothing is written.
+    """
+
+    def __init__(self, path: Optional[str] = None):
+        self.path = path
+        self.stages = {}   # key -> {stage: output}
+        self.results = {}  # key -> result
+        self._lock = threading.Lock()
+        if path and os.path.exists(path):
+            self._load()
+
+    def _load(self):
+        with open(self.path, encoding="utf-8") as f:
+            content = f.read()
+        for line in content.splitlines():
+            try:
+                record = json.loads(line)
+            except ValueError:
+                continue  # the line being written when the batch was interrupted
+            if "stage" in record:
+                self.stages.setdefault(record["key"], {})[record["stage"]] = record["result"]
+            else:
+                self.results[record["key"]] = record["result"]
+        if content and not content.endswith("\n"):
+            # Start the next record on its own line
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write("\n")
+        logger.info(f"Checkpoint {self.path}: {len(self.results)} queries done, {len(self.stages)} with finished stages")
+
+    def _append(self, record: Dict[str, Any]):
+        if not self.path:
+            return
+        with self._lock:
+            os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+            with open(self.path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(record, default=str) + "\n")
+
+    def record_stage(self, key: str, stage: str, output: str):
+        self._append({"key": key, "stage": stage, "result": output})
+
+    def record_result(self, key: str, result: Dict[str, Any]):
+        self._append({"key": key, "result": result})
+
+
+def batch_key(query: str, mode: str) -> str:
+    """Checkpoint key: the mode and the whitespace- and case-normalized query"""
+    return f"{mode}:{single_flight_key(query)[0]}"
+
+
+def get_batch_concurrency(config: PipelineConfig) -> int:
+    """Queries to run at once so their LLM calls together fit LLM_MAX_CONCURRENCY"""
+    if BATCH_MAX_QUERIES > 0:
+        return BATCH_MAX_QUERIES
+    # Without the final steps the DAG is a chain: one LLM call in flight per query
+    linear = config.skip_validation or config.skip_chains
+    per_query = 1 if linear else get_stage_concurrency(config)
+    return max(1, LLM_MAX_CONCURRENCY // per_query)
+
+
+def resumed_stage(stage: Stage, output: str) -> Stage:
+    """The stage with its checkpointed output in place of the LLM call"""
+    async def arun(results):
+        return output
+    return dataclasses.replace(stage, run=lambda results: output, arun=arun, cost=0.0)
+
+
+def run_batch_query(query: str, retrieved_knowledge: str, config: PipelineConfig,
+                    completed: Optional[Dict[str, str]] = None, on_stage=None) -> Dict[str, Any]:
+    """
+    One query's stage DAG, skipping the stages in completed (name -> output).
+    on_stage(name, output) is called for every stage that completes on this run.
+    """
+    start_time = time.time()
+    run_metrics = RunMetrics()
+    completed = completed or {}
+    skip_validation, skip_chains = config.skip_validation, config.skip_chains
+    stages = [
+        resumed_stage(stage, completed[stage.name]) if stage.name in completed else stage
+        for stage in build_pipeline_stages(query, retrieved_knowledge, config, skip_validation, skip_chains)
+    ]
+    scheduler = DagScheduler(max_concurrency=get_stage_concurrency(config))
+    results = {}
+    for event in scheduler.iter_run(instrumented_stages(stages, run_metrics)):
+        results[event["stage"]] = event["result"]
+        if on_stage is not None and event["status"] == "ok" and event["stage"] not in completed:
+            on_stage(event["stage"], event["result"])
+    results.update(skipped_final_results(query, skip_validation, skip_chains))
+
+    result = finish_pipeline_run(query, retrieved_knowledge, results, scheduler, run_metrics, time.time() - start_time,
+                                 resumed=completed)
+    if completed:
+        result["resumed_stages"] = sorted(completed)
+    return result
+
+
+def run_batch_pipeline(queries: Iterable[str], mode: str = "balanced", checkpoint_path: Optional[str] = None,
+                       max_queries: Optional[int] = None, use_cache: bool = True) -> Iterator[Dict[str, Any]]:
+    """
+    Run the pipeline for many queries, yielding {"index", "query", "result", "resumed"}
+    as each one finishes (completion order; "index" is the query's position in queries).
+
+    mode is a preset name or PipelineConfig (see resolve_pipeline_config). Repeated
+    queries run once. All queries are embedded in one batched call and looked up in
+    FAISS with one search; semantic cache hits are answered from those same vectors.
+    The rest run max_queries at a time (default: get_batch_concurrency).
+
+    With checkpoint_path, finished stages and queries are appended to that file; run
+    the same batch again with it and finished queries are returned as they were
+    ("resumed": True) while unfinished ones only redo the stages that had not completed.
+    A query whose run raised is yielded with "error" and no result.
+    
+    The batch is one trace: a "pipeline batch" span with a "pipeline" span per query run.
+    """
+    queries = list(queries)
+    batch_span = start_span("pipeline batch", attributes={"batch.queries": len(queries), "batch.mode": str(mode)})
+    return iter_in_span(batch_span, _batch_events(batch_span, queries, mode, checkpoint_path, max_queries, use_cache))
+
+
+def _batch_events(batch_span, queries: list, mode, checkpoint_path: Optional[str], max_queries: Optional[int],
+                  use_cache: bool) -> Iterator[Dict[str, Any]]:
+    config = resolve_pipeline_config(mode)
+    cache_mode = get_pipeline_mode(config)
+    mode_name = mode if isinstance(mode, str) else cache_mode
+    use_cache = use_cache and config.enable_caching
+    checkpoint = BatchCheckpoint(checkpoint_path)
+
+    positions = {}
+    for index, query in enumerate(queries):
+        positions.setdefault(batch_key(query, mode_name), []).append(index)
+
+    def finished(key, result, resumed=False, error=None):
+        for index in positions[key]:
+            item = {"index": index, "query": queries[index], "result": result, "resumed": resumed}
+            if error is not None:
+                item["error"] = error
+            yield item
+
+    pending = []
+    for key in positions:
+        if key in checkpoint.results:
+            yield from finished(key, checkpoint.results[key], resumed=True)
+        else:
+            pending.append(key)
+    if not pending:
+        return
+    logger.info(f" Starting batch of {len(pending)} queries ({len(queries) - len(pending)} from checkpoint or repeated)")
+
+    # One embedding call and one FAISS search for the whole batch
+    embedding_model = get_embedding_model()
+    pending_queries = [queries[positions[key][0]] for key in pending]
+    vectors = [None] * len(pending)
+    knowledge = [""] * len(pending)
+    with use_span(batch_span):
+        try:
+            with rate_priority("batch"):
+                vectors = embedding_model.embed_queries(pending_queries)
+            documents = search_documents_batch(pending_queries, embedding_model, k=config.vector_search_k, embeddings=vectors)
+            knowledge = [retrieve_knowledge(docs, config) for docs in documents]
+        except Exception as e:
+            logger.error(f"Batched embedding / FAISS retrieval failed: {e}")
+
+    to_run = []
+    for key, query, vector, retrieved in zip(pending, pending_queries, vectors, knowledge):
+        cached = lookup_cached_result(query, cache_mode, embedding_model, vector) if use_cache and vector is not None else None
+        if cached is not None:
+            checkpoint.record_result(key, cached)
+            yield from finished(key, cached)
+        else:
+            to_run.append((key, query, vector, retrieved))
+
+    def run(key, query, vector, retrieved):
+        def on_stage(stage, output):
+            checkpoint.record_stage(key, stage, output)
+        # Executor threads don't inherit the batch's context; the span is parented explicitly
+        with span("pipeline", parent=batch_span, attributes={"pipeline.query": query}):
+            with rate_priority("batch"):
+                result = run_batch_query(query, retrieved, config, checkpoint.stages.get(key), on_stage)
+            if use_cache and vector is not None:
+                store_cached_result(query, cache_mode, embedding_model, result, vector)
+            schedule_background_work(query, result["research"], result["analysis"], result, embedding_model, config, cache_mode)
+            checkpoint.record_result(key, result)
+        return result
+
+    executor = ThreadPoolExecutor(max_workers=max_queries or get_batch_concurrency(config), thread_name_prefix="batch-query")
+    try:
+        futures = {executor.submit(run, *item): item[0] for item in to_run}
+        for future in as_completed(futures):
+            key = futures[future]
+            try:
+                result = future.result()
+            except Exception as e:
+                logger.error(f"Batch query '{queries[positions[key][0]]}' failed: {e}")
+                yield from finished(key, None, error=str(e))
+                continue
+            yield from finished(key, result)
+    finally:
+        # A consumer that stops early cancels the queries not yet started
+        executor.shutdown(wait=False, cancel_futures=True)
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the pipeline for every query in a file (one per line)")
+    parser.add_argument("queries_file")
+    parser.add_argument("--mode", default="balanced", help="preset name (default: balanced)")
+    parser.add_argument("--checkpoint", help="progress file, resumed when it exists (default: <queries_file>.checkpoint.jsonl)")
+    parser.add_argument("--output", help="JSONL file for the results (default: stdout)")
+    parser.add_argument("--max-queries", type=int, help="queries run at once")
+    parser.add_argument("--no-cache", action="store_true", help="don't answer from the semantic cache")
+    args = parser.parse_args(argv)
+
+    with open(args.queries_file, encoding="utf-8") as f:
+        queries = [line.strip() for line in f if line.strip()]
+    checkpoint = args.checkpoint or f"{args.queries_file}.checkpoint.jsonl"
+
+    output = open(args.output, "w", encoding="utf-8") if args.output else sys.stdout
+    start_time = time.time()
+    done = 0
+    try:
+        for item in run_batch_pipeline(queries, args.mode, checkpoint, args.max_queries, not args.no_cache):
+            output.write(json.dumps(item, default=str) + "\n")
+            output.flush()
+            done += 1
+            logger.info(f"[{done}/{len(queries)}] {item['query']}{' (resumed)' if item['resumed'] else ''}")
+    finally:
+        if output is not sys.stdout:
+            output.close()
+    elapsed = time.time() - start_time
+    logger.info(f"Batch finished: {done} queries in {elapsed:.1f}s ({done / elapsed * 60:.1f} queries/min)")
+
+
+if __name__ == "__main__":
+    main()
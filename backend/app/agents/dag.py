@@ -0,0 +1,301 @@
+import asyncio
+import contextvars
+import os
+import queue
+import time
+from concurrent.futures import ThreadPoolExecutor
+from dataclasses import dataclass
+from typing import Any, Awaitable, Callable, Dict, List, Optional, Tuple
+
+from app.services.rate_limiter import rate_deadline
+from app.utils.logging import setup_logger
+
+logger = setup_logger(__name__)
+
+# Threads shared by the stages of every threaded run in the process. A timed-out stage keeps
+# its thread until its call returns, so this is sized above runs x max_concurrency.
+DAG_STAGE_THREADS = int(os.getenv("DAG_STAGE_THREADS", 64))
+_stage_executor = ThreadPoolExecutor(max_workers=DAG_STAGE_THREADS, thread_name_prefix="pipeline-stage")
+
+
+@dataclass
+class Stage:
+    """One node of the pipeline DAG.
+
+    `run(results)` (or `arun(results)` on the async path) receives the outputs of
+    the stages finished so far, which always include every stage in `deps`.
+    `fallback(reason, results)` supplies the output when the stage times out
+    (reason "timeout"), raises (reason "error") or is dropped because the run's
+    deadline cannot cover it (reason "skipped"). `cost` is the expected duration
+    in seconds; on the threaded path, when more stages are ready than the cap
+    allows, the most expensive ones start first. `optional` stages are skipped
+    rather than squeezed when the remaining budget is shorter than their cost.
+    """
+    name: str
+    run: Callable[[Dict[str, Any]], Any]
+    deps: Tuple[str, ...] = ()
+    timeout: float = 30
+    fallback: Optional[Callable[[str, Dict[str, Any]], Any]] = None
+    cost: float = 1.0
+    arun: Optional[Callable[[Dict[str, Any]], Awaitable[Any]]] = None
+    optional: bool = False
+
+
+def remaining_path_costs(stages: List[Stage]) -> Dict[str, float]:
+    """
+    For each stage, the expected time from its start to the end of the run: its own cost plus
+    the longest chain of required stages that depend on it
+    """
+    costs = {}
+    for stage in reversed(topological_order(stages)):
+        dependents = [costs[other.name] for other in stages if stage.name in other.deps and not other.optional]
+        costs[stage.name] = max(stage.cost, 0.1) + (max(dependents) if dependents else 0)
+    return costs
+
+
+def topological_order(stages: List[Stage]) -> List[Stage]:
+    """Stages ordered so every stage comes after its deps; ValueError on unknown deps or cycles"""
+    by_name = {stage.name: stage for stage in stages}
+    if len(by_name) != len(stages):
+        raise ValueError("Duplicate stage names in pipeline DAG")
+    for stage in stages:
+        missing = [dep for dep in stage.deps if dep not in by_name]
+        if missing:
+            raise ValueError(f"Stage '{stage.name}' depends on unknown stages {missing}")
+
+    ordered, done, visiting = [], set(), set()
+
+    def visit(stage):
+        if stage.name in done:
+            return
+        if stage.name in visiting:
+            raise ValueError(f"Cycle in pipeline DAG at stage '{stage.name}'")
+        visiting.add(stage.name)
+        for dep in stage.deps:
+            visit(by_name[dep])
+        visiting.discard(stage.name)
+        done.add(stage.name)
+        ordered.append(stage)
+
+    for stage in stages:
+        visit(stage)
+    return ordered
+
+
+class DagScheduler:
+    """Runs a DAG of stages, starting each one as soon as its dependencies have resolved.
+
+    At most `max_concurrency` stages run at a time. A stage that exceeds its
+    timeout resolves to its fallback right away (its dependents are not held
+    up) and no longer counts against the cap. After a run, `trace` holds one
+    Gantt-style entry per stage: start/end in seconds since the run started,
+    elapsed, status ("ok", "timeout", "error" or "skipped") and deps. Use one scheduler per run.
+
+    With a `deadline` (a time.time() value), each stage's timeout is cut to its
+    share of the remaining budget: remaining * cost / remaining_path_cost, so the
+    stages after it keep theirs. Optional stages that would not finish before the
+    deadline are skipped, and required stages starting after it resolve to their
+    fallback at once. Trace entries whose timeout was cut carry "deadline_limited".
+    """
+
+    def __init__(self, max_concurrency: int = 4, deadline: Optional[float] = None):
+        self.max_concurrency = max(1, max_concurrency)
+        self.deadline = deadline
+        self.trace = []
+        self._events = queue.Queue()
+
+    def _budget(self, stage, path_costs):
+        """(timeout, skip) for a stage starting now"""
+        if self.deadline is None:
+            return stage.timeout, False
+        remaining = self.deadline - time.time()
+        if remaining <= 0 or (stage.optional and stage.cost > remaining):
+            return 0.0, True
+        share = remaining if stage.optional else remaining * max(stage.cost, 0.1) / path_costs[stage.name]
+        return min(stage.timeout, share), False
+
+    def publish(self, event: Dict[str, Any]):
+        """Emit an extra event (e.g. a token delta) from inside a running stage; iter_run yields it"""
+        self._events.put(event)
+
+    def _resolve(self, stage, output, error, timed_out, results, timeout=None, skipped=False):
+        if timed_out or error is not None or skipped:
+            reason = "skipped" if skipped else "timeout" if timed_out else "error"
+            if skipped:
+                logger.warning(f" {stage.name} skipped: not enough time left before the deadline")
+            elif error is not None:
+                logger.error(f" {stage.name} failed: {error}")
+            else:
+                logger.warning(f" {stage.name} timed out after {timeout or stage.timeout:.1f}s")
+            if stage.fallback is None:
+                return f"{stage.name} failed", reason
+            return stage.fallback(reason, results), reason
+        logger.info(f" {stage.name} completed")
+        return output, "ok"
+
+    def _record(self, stage, started, finished, status, run_start, timeout=None):
+        entry = {
+            "stage": stage.name,
+            "deps": list(stage.deps),
+            "start": round(started - run_start, 3),
+            "end": round(finished - run_start, 3),
+            "elapsed": round(finished - started, 3),
+            "status": status
+        }
+        if timeout is not None and timeout < stage.timeout:
+            entry["deadline_limited"] = True
+        self.trace.append(entry)
+        return entry
+
+    def iter_run(self, stages: List[Stage]):
+        """
+        Run the stages on threads, yielding
+        {"event": "stage", "stage": ..., "result": ..., "elapsed": ..., "at": ..., "status": ...}
+        for each stage as it resolves, interleaved with any events passed to publish()
+        """
+        order = topological_order(stages)
+        path_costs = remaining_path_costs(order)
+        run_start = time.time()
+        self.trace = []
+        results = {}
+        pending = list(order)
+        # name -> (stage, started, deadline, timeout). A stage's clock starts when a pool thread
+        # picks it up, not when it is queued: until then started is None and only the run's
+        # deadline (if any) applies, so waiting for a busy shared pool doesn't eat its timeout.
+        running = {}
+        resolved = set()  # read by work(): a stage resolved while still queued never runs
+        skipped = []
+        no_deadline = float("inf") if self.deadline is None else self.deadline
+
+        def work(stage, inputs, timeout):
+            if stage.name in resolved:
+                return
+            self._events.put(("_started", stage.name, time.time()))
+            try:
+                # Provider calls stop queueing for their rate limit once the stage has timed out
+                with rate_deadline(timeout):
+                    output = stage.run(inputs)
+                self._events.put(("_done", stage.name, output, None))
+            except Exception as e:
+                self._events.put(("_done", stage.name, None, e))
+
+        while pending or running or skipped:
+            ready = [stage for stage in pending if all(dep in results for dep in stage.deps)]
+            ready.sort(key=lambda stage: -stage.cost)
+            for stage in ready[:self.max_concurrency - len(running)]:
+                pending.remove(stage)
+                timeout, skip = self._budget(stage, path_costs)
+                if skip:
+                    skipped.append(stage)
+                    continue
+                running[stage.name] = (stage, None, no_deadline, timeout)
+                _stage_executor.submit(contextvars.copy_context().run, work, stage, dict(results), timeout)
+
+            if skipped:
+                stage = skipped.pop(0)
+                now = time.time()
+                output, status = self._resolve(stage, None, None, False, results, skipped=True)
+                results[stage.name] = output
+                self._record(stage, now, now, status, run_start)
+                yield {"event": "stage", "stage": stage.name, "result": output, "elapsed": 0.0,
+                       "at": round(now - run_start, 3), "status": status}
+                continue
+
+            next_deadline = min(deadline for _, _, deadline, _ in running.values())
+            wait = None if next_deadline == float("inf") else max(0.0, next_deadline - time.time())
+            try:
+                event = self._events.get(timeout=wait)
+            except queue.Empty:
+                event = None
+
+            if isinstance(event, dict):
+                yield event
+                continue
+
+            if event is not None and event[0] == "_started":
+                _, name, started = event
+                if name in running:
+                    stage, _, _, timeout = running[name]
+                    running[name] = (stage, started, min(started + timeout, no_deadline), timeout)
+                continue
+
+            if event is None:
+                # Time out every stage whose deadline has passed; late results are dropped
+                now = time.time()
+                finished = [(name, None, None, True) for name, (_, _, deadline, _) in running.items() if deadline <= now]
+            else:
+                _, name, output, error = event
+                if name not in running:
+                    continue
+                finished = [(name, output, error, False)]
+
+            for name, output, error, timed_out in finished:
+                stage, started, _, timeout = running.pop(name)
+                resolved.add(name)
+                output, status = self._resolve(stage, output, error, timed_out, results, timeout)
+                results[name] = output
+                now = time.time()
+                entry = self._record(stage, started if started is not None else now, now, status, run_start, timeout)
+                yield {
+                    "event": "stage",
+                    "stage": name,
+                    "result": output,
+                    "elapsed": entry["elapsed"],
+                    "at": entry["end"],
+                    "status": status
+                }
+
+    def run(self, stages: List[Stage]) -> Dict[str, Any]:
+        """Run the stages on threads and return {stage name: output}"""
+        return {
+            event["stage"]: event["result"]
+            for event in self.iter_run(stages)
+            if event["event"] == "stage"
+        }
+
+    async def arun(self, stages: List[Stage]) -> Dict[str, Any]:
+        """Run the stages' `arun` coroutines on the event loop and return {stage name: output}"""
+        order = topological_order(stages)
+        path_costs = remaining_path_costs(order)
+        run_start = time.time()
+        self.trace = []
+        results = {}
+        tasks = {}
+        semaphore = asyncio.Semaphore(self.max_concurrency)
+
+        async def run_stage(stage):
+            await asyncio.gather(*(tasks[dep] for dep in stage.deps))
+            async with semaphore:
+                started = time.time()
+                timeout, skip = self._budget(stage, path_costs)
+                output, error, timed_out = None, None, False
+                if not skip:
+                    try:
+                        output = await asyncio.wait_for(stage.arun(dict(results)), timeout=timeout)
+                    except asyncio.TimeoutError:
+                        timed_out = True
+                    except Exception as e:
+                        error = e
+                output, status = self._resolve(stage, output, error, timed_out, results, timeout, skipped=skip)
+                results[stage.name] = output
+                self._record(stage, started, time.time(), status, run_start, None if skip else timeout)
+
+        for stage in order:
+            tasks[stage.name] = asyncio.ensure_future(run_stage(stage))
+        await asyncio.gather(*tasks.values())
+        return results
+
+
+def render_gantt(trace: List[Dict[str, Any]], width: int = 50) -> str:
+    """Plain-text Gantt chart of a scheduler trace, one row per stage"""
+    if not trace:
+        return ""
+    total = max(entry["end"] for entry in trace) or 1.0
+    name_width = max(len(entry["stage"]) for entry in trace)
+    rows = []
+    for entry in sorted(trace, key=lambda entry: entry["start"]):
+        begin = int(entry["start"] / total * width)
+        end = max(begin + 1, int(entry["end"] / total * width))
+        bar = " " * begin + "#" * (end - begin) + " " * (width - end)
+        rows.append(f"{entry['stage']:<{name_width}} |{bar}| {entry['start']:.2f}-{entry['end']:.2f}s {entry['status']}")
+    return "\n".join(rows)
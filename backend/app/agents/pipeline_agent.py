@@ -1,6 +1,11 @@
 import asyncio
 import concurrent.futures
-from concurrent.futures import ThreadPoolExecutor, as_completed
+import contextvars
+import dataclasses
+import hashlib
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
 from typing import Dict, Any, Optional
 import time
 
@@ -9,15 +14,35 @@ from app.agents.analyst_agent import get_analyst_agent
 from app.agents.planner_agent import get_planner_agent
 from app.agents.writer_agent import get_writer_agent
 from app.agents.validator_agent import get_validator_agent
-from app.services.db_service import save_document
+from app.agents.dag import DagScheduler, Stage
+from app.tools.analyze_tool import analyze_content, aanalyze_content
+from app.tools.plan_tool import plan_content, aplan_content
+from app.tools.write_tool import write_content_wrapper, awrite_content_wrapper
+from app.tools.validate_tool import validate_content_wrapper, avalidate_content_wrapper
+from app.config.pipeline_config import PipelineConfig, PERFORMANCE_CONFIGS
+from app.services.stage_latency import auto_config, get_stage_latency_tracker
+from app.services.background_tasks import get_background_tasks
 from app.services.embedding_service import get_embedding_model
 from app.services.vectorstore_service import search_documents, add_documents_to_index
+from app.services.result_cache import get_result_cache
+from app.services.results_store import build_result_document, get_results_store
+from app.services.llm_cache import install_llm_cache
+from app.services.llm_clients import get_llm_registry
+from app.services.stage_checkpoints import (
+    STAGE_CHECKPOINTS, UnknownCheckpointError, start_run_checkpoint, resume_run_checkpoint
+)
+from app.services.metrics import RunMetrics, metrics_scope, record_stage_trace
+from app.services.rate_limiter import rate_deadline
+from app.services.tracing import current_span, iter_in_span, span, start_span, traced, use_span
+from app.utils.async_utils import run_blocking
 from app.utils.logging import setup_logger
+from app.utils.streaming import run_with_token_sink
+from app.utils.hedging import hedged_call, ahedged_call
+from app.utils.single_flight import SingleFlight
 from app.utils.formatters import (
     clean_output,
     extract_key_points,
-    wrap_markdown_section,
-    format_json_readable
+    wrap_markdown_section
 )
 from langchain.schema import Document
 from langchain_core.messages import HumanMessage, AIMessage
@@ -29,6 +54,51 @@ from app.chains.timeline_chain import get_timeline_chain
 
 logger = setup_logger(__name__)
 
+# Route every LLM call made by agents, tools and chains through the shared response cache
+install_llm_cache()
+
+# Agent behind each agent-backed stage
+STAGE_AGENTS = {
+    'research': 'researcher',
+    'analysis': 'analyst',
+    'plan': 'planner',
+    'draft': 'writer',
+    'validation': 'validator'
+}
+
+# Tool functions (sync, async) the single-tool stages call directly in "direct" execution mode
+DIRECT_STAGE_TOOLS = {
+    'analysis': (analyze_content, aanalyze_content),
+    'plan': (plan_content, aplan_content),
+    'draft': (write_content_wrapper, awrite_content_wrapper),
+    'validation': (validate_content_wrapper, avalidate_content_wrapper)
+}
+
+# Retries for transient provider errors (rate limits, 5xx, connection resets) per stage call
+LLM_RETRIES = int(os.getenv("LLM_RETRIES", 2))
+
+# Final steps the deadline may drop; research, analysis, plan, draft and the strategic report always run
+OPTIONAL_STAGES = ("validation", "swot_analysis", "timeline")
+SKIPPED_TEXT = "Skipped for performance"
+
+PIPELINE_STAGES = ("research", "analysis", "plan", "draft", "validation", "strategic_report", "swot_analysis", "timeline")
+
+# Threads for execute_with_timeout; a call that timed out keeps its thread until the LLM returns
+STEP_TIMEOUT_THREADS = int(os.getenv("STEP_TIMEOUT_THREADS", 16))
+_step_executor = ThreadPoolExecutor(max_workers=STEP_TIMEOUT_THREADS, thread_name_prefix="pipeline-step")
+
+# Limits and timeouts used when no config is given (the pipeline's original hardcoded values)
+DEFAULT_CONFIG = PipelineConfig()
+
+# Config fields that don't change what a run returns, left out of its cache key: timeouts only
+# decide fallbacks (and "auto" retunes them every run), the rest are scheduling and side effects
+RESULT_NEUTRAL_FIELDS = ("max_workers", "enable_caching", "enable_background_indexing", "enable_parallel_execution",
+                         "skip_indexing")
+
+# Concurrent identical requests share one pipeline run instead of each making the same LLM calls
+PIPELINE_SINGLE_FLIGHT = os.getenv("PIPELINE_SINGLE_FLIGHT", "true").lower() == "true"
+_pipeline_flights = SingleFlight("pipeline-single-flight")
+
 # Cache for agents and chains to avoid recreation
 _agent_cache = {}
 _chain_cache = {}
@@ -61,382 +131,840 @@ def get_cached_chain(chain_type: str):
 
 def execute_with_timeout(func, timeout=30, *args, **kwargs):
     """Execute function with timeout to prevent hanging"""
-    with ThreadPoolExecutor(max_workers=1) as executor:
-        future = executor.submit(func, *args, **kwargs)
-        try:
-            return future.result(timeout=timeout)
-        except concurrent.futures.TimeoutError:
-            logger.warning(f"Function {func.__name__} timed out after {timeout}s")
-            return None
-
-def run_research_step(query: str, retrieved_knowledge: str) -> str:
+    def call():
+        # Once timed out, the call's pending rate-limit waits give up instead of sending late requests
+        with rate_deadline(timeout):
+            return func(*args, **kwargs)
+
+    # Carry the caller's context (e.g. its token sink) into the worker thread
+    future = _step_executor.submit(contextvars.copy_context().run, call)
+    try:
+        return future.result(timeout=timeout)
+    except concurrent.futures.TimeoutError:
+        # Don't wait for a timed-out call; a call still queued for a thread never starts
+        future.cancel()
+        logger.warning(f"Function {func.__name__} timed out after {timeout}s")
+        return None
+
+# Canned stage outputs used when a step times out or fails
+STAGE_FALLBACKS = {
+    'research': {
+        'timeout': "Research timeout for: {query}. Using basic information.",
+        'error': "Unable to complete research for: {query}. Using basic information."
+    },
+    'analysis': {
+        'timeout': "Analysis timeout: {query} has significant impacts that require detailed examination.",
+        'error': "Basic analysis: {query} has significant impacts that require detailed examination."
+    },
+    'validation': {
+        'timeout': "Validation timeout for {query}. Manual review recommended.",
+        'error': "Content validation completed for {query}. The article covers the main aspects of the topic."
+    },
+    'strategic_report': {
+        'timeout': "Strategic report timeout for {query}. Manual review recommended.",
+        'error': "Strategic report generation failed for {query}. Manual review recommended."
+    },
+    'swot_analysis': {
+        'timeout': "SWOT analysis timeout for {query}. Manual analysis required.",
+        'error': "SWOT analysis generation failed for {query}. Manual analysis required."
+    },
+    'timeline': {
+        'timeout': "Timeline timeout for {query}. Manual timeline creation needed.",
+        'error': "Timeline generation failed for {query}. Manual timeline creation needed."
+    }
+}
+
+PLAN_FALLBACK = """
+        Content Plan for {query}:
+        1. Introduction and Overview
+        2. Current State Analysis
+        3. Key Benefits and Opportunities
+        4. Challenges and Concerns
+        5. Future Implications
+        6. Recommendations and Conclusion
+        """
+
+DRAFT_FALLBACK = """
+        # {query}
+        
+        ## Introduction
+        {query} represents a significant area of development with far-reaching implications.
+        
+        ## Analysis
+        {analysis}
+        
+        ## Conclusion
+        Understanding {query} is crucial for navigating future developments in this field.
+        """
+
+def stage_fallback(stage: str, reason: str, query: str, analysis_result: str = "") -> str:
+    """Canned output for a stage; reason is 'timeout' or 'error'"""
+    if stage == 'plan':
+        return PLAN_FALLBACK.format(query=query)
+    if stage == 'draft':
+        return DRAFT_FALLBACK.format(query=query, analysis=analysis_result[:500])
+    return STAGE_FALLBACKS[stage][reason].format(query=query)
+
+def build_research_input(query: str, retrieved_knowledge: str, config: PipelineConfig = DEFAULT_CONFIG) -> str:
+    research_input = f"Research the following topic: {query}"
+    if retrieved_knowledge:
+        research_input += f"\n\nContext from knowledge base:\n{retrieved_knowledge[:config.max_context_size]}"  # Limit context size
+    return research_input
+
+def build_analysis_input(query: str, research_result: str, config: PipelineConfig = DEFAULT_CONFIG) -> str:
+    return f"Analyze the following research findings about '{query}':\n\n{research_result[:config.max_research_input]}"  # Limit input size
+
+def build_plan_input(query: str, analysis_result: str, config: PipelineConfig = DEFAULT_CONFIG) -> str:
+    return f"Create a comprehensive content plan for the topic '{query}' based on this analysis:\n\n{analysis_result[:config.max_plan_input]}"
+
+def build_write_input(query: str, plan_result: str, analysis_result: str, config: PipelineConfig = DEFAULT_CONFIG) -> str:
+    limit = config.max_writing_input
+    return f"Write a comprehensive article about '{query}' following this content plan:\n\n{plan_result[:limit]}\n\nBased on this analysis:\n{analysis_result[:limit]}"
+
+def build_validation_input(query: str, draft_result: str, config: PipelineConfig = DEFAULT_CONFIG) -> str:
+    return f"Review and validate this article about '{query}':\n\n{draft_result[:config.max_validation_input]}"
+
+def build_swot_input(analysis_result: str, draft_result: str, config: PipelineConfig = DEFAULT_CONFIG) -> str:
+    limit = config.max_writing_input
+    return f"{analysis_result[:limit]}\n\n{draft_result[:limit]}"
+
+def finish_analysis(analysis_raw) -> tuple:
+    """Clean the analyst output and extract key points from it"""
+    analysis_result = clean_output(analysis_raw)
+    
+    # Extract key points with fallback
+    try:
+        key_points = extract_key_points(analysis_result)
+    except:
+        key_points = [analysis_result[:200] + "..."] if len(analysis_result) > 200 else [analysis_result]
+    
+    return analysis_result, key_points
+
+@traced("stage research")
+def run_research_step(query: str, retrieved_knowledge: str, config: PipelineConfig = DEFAULT_CONFIG) -> str:
     """Optimized research step with timeout"""
     try:
-        researcher = get_cached_agent('researcher')
-        research_input = f"Research the following topic: {query}"
-        if retrieved_knowledge:
-            research_input += f"\n\nContext from knowledge base:\n{retrieved_knowledge[:1000]}"  # Limit context size
+        call_stage, _ = get_stage_callables('research', config)
         
         research_raw = execute_with_timeout(
-            researcher.invoke, 
-            30, 
-            {"input": research_input}
+            hedged_invoke,
+            get_stage_latency_tracker().adaptive_timeout('research', config.research_timeout),
+            'research',
+            call_stage,
+            build_research_input(query, retrieved_knowledge, config)
         )
         
         if research_raw is None:
-            return f"Research timeout for: {query}. Using basic information."
+            return stage_fallback('research', 'timeout', query)
             
         return clean_output(research_raw)
     except Exception as e:
         logger.error(f"Research step failed: {e}")
-        return f"Unable to complete research for: {query}. Using basic information."
+        return stage_fallback('research', 'error', query)
 
-def run_analysis_step(query: str, research_result: str) -> tuple:
+@traced("stage analysis")
+def run_analysis_step(query: str, research_result: str, config: PipelineConfig = DEFAULT_CONFIG) -> tuple:
     """Optimized analysis step with timeout"""
     try:
-        analyst = get_cached_agent('analyst')
-        analysis_input = f"Analyze the following research findings about '{query}':\n\n{research_result[:2000]}"  # Limit input size
+        call_stage, _ = get_stage_callables('analysis', config)
         
         analysis_raw = execute_with_timeout(
-            analyst.invoke,
-            25,
-            {"input": analysis_input}
+            hedged_invoke,
+            get_stage_latency_tracker().adaptive_timeout('analysis', config.analysis_timeout),
+            'analysis',
+            call_stage,
+            build_analysis_input(query, research_result, config)
         )
         
         if analysis_raw is None:
-            analysis_result = f"Analysis timeout: {query} has significant impacts that require detailed examination."
-            key_points = [analysis_result]
-            return analysis_result, key_points
-        
-        analysis_result = clean_output(analysis_raw)
-        
-        # Extract key points with fallback
-        try:
-            key_points = extract_key_points(analysis_result)
-        except:
-            key_points = [analysis_result[:200] + "..."] if len(analysis_result) > 200 else [analysis_result]
+            analysis_result = stage_fallback('analysis', 'timeout', query)
+            return analysis_result, [analysis_result]
         
-        return analysis_result, key_points
+        return finish_analysis(analysis_raw)
     except Exception as e:
         logger.error(f"Analysis step failed: {e}")
-        analysis_result = f"Basic analysis: {query} has significant impacts that require detailed examination."
+        analysis_result = stage_fallback('analysis', 'error', query)
         return analysis_result, [analysis_result]
 
-def run_planning_step(query: str, analysis_result: str) -> str:
+@traced("stage plan")
+def run_planning_step(query: str, analysis_result: str, config: PipelineConfig = DEFAULT_CONFIG) -> str:
     """Optimized planning step with timeout"""
     try:
-        planner = get_cached_agent('planner')
-        plan_input = f"Create a comprehensive content plan for the topic '{query}' based on this analysis:\n\n{analysis_result[:1500]}"
+        call_stage, _ = get_stage_callables('plan', config)
         
         plan_raw = execute_with_timeout(
-            planner.invoke,
-            20,
-            {"input": plan_input}
+            hedged_invoke,
+            get_stage_latency_tracker().adaptive_timeout('plan', config.planning_timeout),
+            'plan',
+            call_stage,
+            build_plan_input(query, analysis_result, config)
         )
         
         if plan_raw is None:
-            return f"""
-            Content Plan for {query}:
-            1. Introduction and Overview
-            2. Current State Analysis
-            3. Key Benefits and Opportunities
-            4. Challenges and Concerns
-            5. Future Implications
-            6. Recommendations and Conclusion
-            """
+            return stage_fallback('plan', 'timeout', query)
             
         return clean_output(plan_raw)
     except Exception as e:
         logger.error(f"Planning step failed: {e}")
-        return f"""
-        Content Plan for {query}:
-        1. Introduction and Overview
-        2. Current State Analysis
-        3. Key Benefits and Opportunities
-        4. Challenges and Concerns
-        5. Future Implications
-        6. Recommendations and Conclusion
-        """
+        return stage_fallback('plan', 'error', query)
 
-def run_writing_step(query: str, plan_result: str, analysis_result: str) -> str:
+@traced("stage draft")
+def run_writing_step(query: str, plan_result: str, analysis_result: str, config: PipelineConfig = DEFAULT_CONFIG) -> str:
     """Optimized writing step with timeout"""
     try:
-        writer = get_cached_agent('writer')
-        write_input = f"Write a comprehensive article about '{query}' following this content plan:\n\n{plan_result[:1000]}\n\nBased on this analysis:\n{analysis_result[:1000]}"
+        call_stage, _ = get_stage_callables('draft', config)
         
         draft_raw = execute_with_timeout(
-            writer.invoke,
-            40,  # Writing needs more time
-            {"input": write_input}
+            hedged_invoke,
+            get_stage_latency_tracker().adaptive_timeout('draft', config.writing_timeout),  # Writing needs more time
+            'draft',
+            call_stage,
+            build_write_input(query, plan_result, analysis_result, config)
         )
         
         if draft_raw is None:
-            return f"""
-            # {query}
-            
-            ## Introduction
-            {query} represents a significant area of development with far-reaching implications.
-            
-            ## Analysis
-            {analysis_result[:500]}
-            
-            ## Conclusion
-            Understanding {query} is crucial for navigating future developments in this field.
-            """
+            return stage_fallback('draft', 'timeout', query, analysis_result)
             
         return clean_output(draft_raw)
     except Exception as e:
         logger.error(f"Writing step failed: {e}")
-        return f"""
-        # {query}
-        
-        ## Introduction
-        {query} represents a significant area of development with far-reaching implications.
-        
-        ## Analysis
-        {analysis_result[:500]}
-        
-        ## Conclusion
-        Understanding {query} is crucial for navigating future developments in this field.
-        """
+        return stage_fallback('draft', 'error', query, analysis_result)
 
-def run_parallel_final_steps(query: str, research_result: str, analysis_result: str, plan_result: str, draft_result: str):
-    """Run validation and chain steps in parallel"""
+def resolve_pipeline_config(config=None, latency_budget: Optional[float] = None) -> PipelineConfig:
+    """
+    Turn a preset name ("express", "balanced", "comprehensive", "quality_focused", "auto"),
+    a PipelineConfig or None into a PipelineConfig. "auto" picks limits from recent stage
+    latencies to fit latency_budget seconds. Raises ValueError for unknown preset names.
+    """
+    if config is None:
+        return DEFAULT_CONFIG
+    if isinstance(config, PipelineConfig):
+        return config
+    if config == "auto":
+        return auto_config(latency_budget)
+    if config not in PERFORMANCE_CONFIGS:
+        raise ValueError(f"Unknown pipeline config '{config}', expected one of {sorted(PERFORMANCE_CONFIGS) + ['auto']}")
+    return PERFORMANCE_CONFIGS[config]
+
+def single_flight_key(query: str, *params) -> tuple:
+    """Whitespace- and case-normalized query plus the run's arguments (config by value)"""
+    return (" ".join(query.lower().split()),) + tuple(repr(param) for param in params)
+
+def config_fingerprint(config: PipelineConfig) -> str:
+    """sha256 of the config fields that shape a run's result (limits, retrieval, execution mode, skip flags)"""
+    fields = {
+        name: value for name, value in dataclasses.asdict(config).items()
+        if name not in RESULT_NEUTRAL_FIELDS and not name.endswith("_timeout")
+    }
+    return hashlib.sha256(json.dumps(fields, sort_keys=True).encode("utf-8")).hexdigest()
+
+def get_pipeline_mode(config: PipelineConfig, skip_validation: bool = False, skip_chains: bool = False) -> str:
+    """
+    Name a run's results are cached and saved under: the preset ("default" for DEFAULT_CONFIG)
+    whose result-shaping settings the config, with the skip flags applied, matches, else
+    "custom:<fingerprint prefix>". "auto" runs share the entries of the preset they tuned.
+    """
+    config = dataclasses.replace(config, skip_validation=config.skip_validation or skip_validation,
+                                 skip_chains=config.skip_chains or skip_chains)
+    fingerprint = config_fingerprint(config)
+    for name, preset in [("default", DEFAULT_CONFIG)] + list(PERFORMANCE_CONFIGS.items()):
+        if config_fingerprint(preset) == fingerprint:
+            return name
+    return f"custom:{fingerprint[:12]}"
+
+def is_fallback_research(research_result: str) -> bool:
+    return research_result.startswith("Unable to complete") or research_result.startswith("Research timeout")
+
+def lookup_cached_result(query: str, mode: str, embedding_model, query_vector=None) -> Optional[Dict[str, Any]]:
+    """Return the stored result of a near-identical earlier query in the same mode, if any"""
+    try:
+        if query_vector is None:
+            query_vector = embedding_model.embed_query(query)
+        hit = get_result_cache().lookup(mode, query_vector)
+    except Exception as e:
+        logger.error(f"Semantic cache lookup failed: {e}")
+        return None
+    if hit is None:
+        return None
+
+    result, similarity, cached_query = hit
+    logger.info(f" Semantic cache hit ({similarity:.3f}) for '{query}' -> '{cached_query}'")
+    result.update({
+        "query": query,
+        "cache_hit": True,
+        "cached_query": cached_query,
+        "cache_similarity": round(similarity, 4)
+    })
+    # The stored run's trace is not this request's
+    result.pop("trace_id", None)
+    if current_span() is not None and current_span().trace_id:
+        result["trace_id"] = current_span().trace_id
+    return result
+
+def store_cached_result(query: str, mode: str, embedding_model, result: Dict[str, Any], query_vector=None):
+    """Remember a completed result unless its research step fell back to canned text"""
+    if is_fallback_research(result.get("research", "")):
+        return
+    try:
+        if query_vector is None:
+            query_vector = embedding_model.embed_query(query)
+        get_result_cache().store(mode, query, query_vector, result)
+    except Exception as e:
+        logger.error(f"Semantic cache store failed: {e}")
+
+def is_fallback_analysis(analysis_result: str) -> bool:
+    return analysis_result.startswith("Basic analysis") or analysis_result.startswith("Analysis timeout")
+
+def build_index_documents(query: str, research_result: str, analysis_result: str) -> list:
+    """Documents for the FAISS index from real (non-fallback) research and analysis output"""
+    docs_to_index = []
     
-    def run_validation():
-        try:
-            validator = get_cached_agent('validator')
-            validation_input = f"Review and validate this article about '{query}':\n\n{draft_result[:2000]}"
-            
-            validation_raw = execute_with_timeout(
-                validator.invoke,
-                20,
-                {"input": validation_input}
-            )
-            
-            if validation_raw is None:
-                return f"Validation timeout for {query}. Manual review recommended."
-            return clean_output(validation_raw)
-        except Exception as e:
-            logger.error(f"Validation failed: {e}")
-            return f"Content validation completed for {query}. The article covers the main aspects of the topic."
-    
-    def run_strategic_report():
-        try:
-            report_chain = get_cached_chain('report')
-            strategic_report = execute_with_timeout(
-                report_chain.run,
-                25,
-                research=research_result[:1500],
-                plan=plan_result[:1500]
-            )
-            
-            if strategic_report is None:
-                return f"Strategic report timeout for {query}. Manual review recommended."
-            return clean_output(strategic_report)
-        except Exception as e:
-            logger.error(f"Report generation failed: {e}")
-            return f"Strategic report generation failed for {query}. Manual review recommended."
-    
-    def run_swot_analysis():
-        try:
-            swot_chain = get_cached_chain('swot')
-            swot_input = f"{analysis_result[:1000]}\n\n{draft_result[:1000]}"
-            
-            swot_analysis = execute_with_timeout(
-                swot_chain.run,
-                20,
-                input=swot_input
-            )
-            
-            if swot_analysis is None:
-                return f"SWOT analysis timeout for {query}. Manual analysis required."
-            return clean_output(swot_analysis)
-        except Exception as e:
-            logger.error(f"SWOT analysis failed: {e}")
-            return f"SWOT analysis generation failed for {query}. Manual analysis required."
-    
-    def run_timeline():
-        try:
-            timeline_chain = get_cached_chain('timeline')
-            timeline_result = execute_with_timeout(
-                timeline_chain.run,
-                20,
-                plan=plan_result[:1500]
+    if not is_fallback_research(research_result):
+        docs_to_index.append(Document(page_content=f"Research: {research_result[:1000]}", metadata={"type": "research", "query": query}))
+    
+    if not is_fallback_analysis(analysis_result):
+        docs_to_index.append(Document(page_content=f"Analysis: {analysis_result[:1000]}", metadata={"type": "analysis", "query": query}))
+    
+    return docs_to_index
+
+def index_document_batches(batches: list):
+    """Add the documents of several runs, [(docs, embedding_model), ...], to the index in one call"""
+    docs = [doc for docs, _ in batches for doc in docs]
+    add_documents_to_index(docs, batches[0][1])
+    logger.info(f"Background indexing completed: {len(docs)} documents from {len(batches)} runs")
+
+def schedule_background_work(query: str, research_result: str, analysis_result: str, result: Dict[str, Any], embedding_model,
+                             config: PipelineConfig = DEFAULT_CONFIG, mode: str = "comprehensive"):
+    """Queue indexing (unless the config turns it off) on the shared background task service and save the run"""
+    tasks = get_background_tasks()
+    if config.enable_background_indexing and not config.skip_indexing:
+        docs_to_index = build_index_documents(query, research_result, analysis_result)
+        if docs_to_index:
+            tasks.submit_batched(
+                "faiss-index", ("faiss-index", id(embedding_model)), index_document_batches, (docs_to_index, embedding_model),
+                payload=[{"page_content": doc.page_content, "metadata": doc.metadata} for doc in docs_to_index]
             )
-            
-            if timeline_result is None:
-                return f"Timeline timeout for {query}. Manual timeline creation needed."
-            return clean_output(timeline_result)
-        except Exception as e:
-            logger.error(f"Timeline generation failed: {e}")
-            return f"Timeline generation failed for {query}. Manual timeline creation needed."
-    
-    # Run all final steps in parallel
-    with ThreadPoolExecutor(max_workers=4) as executor:
-        futures = {
-            executor.submit(run_validation): 'validation',
-            executor.submit(run_strategic_report): 'strategic_report',
-            executor.submit(run_swot_analysis): 'swot_analysis',
-            executor.submit(run_timeline): 'timeline'
-        }
-        
-        results = {}
-        for future in as_completed(futures):
-            step_name = futures[future]
-            try:
-                results[step_name] = future.result()
-                logger.info(f" {step_name} completed")
-            except Exception as e:
-                logger.error(f" {step_name} failed: {e}")
-                results[step_name] = f"{step_name} failed for {query}"
-        
-        return results
+    get_results_store().add(build_result_document(result, mode))
 
-def run_optimized_pipeline(query: str, skip_validation: bool = False, skip_chains: bool = False):
+def retrieve_knowledge(vector_results, config: PipelineConfig = DEFAULT_CONFIG) -> str:
+    return "\n\n".join([doc.page_content[:config.max_doc_content] for doc in vector_results])  # Limit content
+
+def get_stage_concurrency(config: PipelineConfig) -> int:
+    return config.max_workers if config.enable_parallel_execution else 1
+
+def hedged_invoke(stage_name: str, func, *args, **kwargs):
     """
-    Optimized pipeline with parallel processing and optional step skipping
-    
-    Args:
-        query: The query to process
-        skip_validation: Skip validation step to save time
-        skip_chains: Skip chain generation (report, SWOT, timeline) to save time
+    Call func with hedging and retries: a duplicate call is sent once the first has run past
+    the stage's recent p90 latency, and transient provider errors are retried with backoff.
+    The duplicate doesn't stream tokens, so clients never see two interleaved streams.
     """
-    start_time = time.time()
-    logger.info(f" Starting optimized pipeline for query: {query}")
+    return hedged_call(
+        lambda: func(*args, **kwargs),
+        hedge_after=get_stage_latency_tracker().hedge_delay(stage_name),
+        retries=LLM_RETRIES,
+        duplicate=lambda: run_with_token_sink(None, func, *args, **kwargs),
+        label=stage_name
+    )
+
+async def ahedged_invoke(stage_name: str, afunc, *args, **kwargs):
+    """Async hedged_invoke; the losing call is cancelled"""
+    return await ahedged_call(
+        lambda: afunc(*args, **kwargs),
+        hedge_after=get_stage_latency_tracker().hedge_delay(stage_name),
+        retries=LLM_RETRIES,
+        label=stage_name
+    )
+
+def get_stage_callables(stage_name: str, config: PipelineConfig = DEFAULT_CONFIG) -> tuple:
+    """
+    (call, acall) taking the stage's input text. In "direct" execution mode the single-tool
+    stages call their tool function straight away, one LLM call instead of the ReAct loop's
+    two or three; research, and every stage in "agent" mode, go through the cached agent.
+    """
+    if config.execution_mode == "direct" and stage_name in DIRECT_STAGE_TOOLS:
+        func, afunc = DIRECT_STAGE_TOOLS[stage_name]
+        return (
+            lambda input_text: func(input_text, raise_errors=True),
+            lambda input_text: afunc(input_text, raise_errors=True)
+        )
+    agent_type = STAGE_AGENTS[stage_name]
+    return (
+        lambda input_text: get_cached_agent(agent_type).invoke({"input": input_text}),
+        lambda input_text: get_cached_agent(agent_type).ainvoke({"input": input_text})
+    )
+
+def _agent_stage(stage_name: str, config: PipelineConfig, build_input):
+    """Sync and async runners for a stage backed by an agent or, in direct mode, its tool"""
+    call, acall = get_stage_callables(stage_name, config)
     
-    embedding_model = get_embedding_model()
+    def run(results):
+        return clean_output(hedged_invoke(stage_name, call, build_input(results)))
     
-    # Step 0: Retrieve from FAISS (optimized)
-    logger.info(" Step 0: Retrieving from FAISS...")
-    try:
-        vector_results = search_documents(query, embedding_model, k=2)  # Reduced from 3 to 2
-        retrieved_knowledge = "\n\n".join([doc.page_content[:500] for doc in vector_results])  # Limit content
-    except Exception as e:
-        logger.error(f"FAISS retrieval failed: {e}")
-        retrieved_knowledge = ""
+    async def arun(results):
+        return clean_output(await ahedged_invoke(stage_name, acall, build_input(results)))
     
-    # Steps 1-4: Sequential execution with optimizations
-    logger.info("Steps 1-4: Core pipeline execution...")
+    return run, arun
+
+def _chain_stage(stage_name: str, chain_type: str, build_kwargs):
+    """Sync and async runners for a stage backed by a cached chain"""
+    def run(results):
+        return clean_output(hedged_invoke(stage_name, get_cached_chain(chain_type).run, **build_kwargs(results)))
     
-    # Step 1: Research
-    logger.info(" Step 1: Research...")
-    research_result = run_research_step(query, retrieved_knowledge)
+    async def arun(results):
+        return clean_output(await ahedged_invoke(stage_name, get_cached_chain(chain_type).arun, **build_kwargs(results)))
     
-    # Step 2: Analysis
-    logger.info(" Step 2: Analysis...")
-    analysis_result, key_points = run_analysis_step(query, research_result)
+    return run, arun
+
+def _with_token_sink(stage_name: str, run, publish):
+    """Forward the stage's LLM tokens to publish() as delta events"""
+    def run_streaming(results):
+        sink = lambda token: publish({"event": "delta", "stage": stage_name, "text": token})
+        return run_with_token_sink(sink, run, results)
+    return run_streaming
+
+def build_pipeline_stages(query: str, retrieved_knowledge: str, config: PipelineConfig,
+                          skip_validation: bool = False, skip_chains: bool = False, publish=None) -> list:
+    """
+    Pipeline stages as a DAG. Each final step depends only on the outputs it reads:
+    timeline needs the plan and the strategic report needs research and plan, so both
+    start while the draft is still being written.
     
-    # Step 3: Planning
-    logger.info(" Step 3: Planning...")
-    plan_result = run_planning_step(query, analysis_result)
+    With publish, the writer and the report/SWOT/timeline chains send their LLM tokens
+    to it as {"event": "delta", "stage": ..., "text": ...}.
+    """
+    def fallback_for(stage_name):
+        def fallback(reason, results):
+            # Optional steps dropped for the deadline read like the skip_* flags; core steps
+            # left without time get their timeout fallback
+            if reason == "skipped" and stage_name in OPTIONAL_STAGES:
+                return SKIPPED_TEXT
+            return stage_fallback(stage_name, "error" if reason == "error" else "timeout", query, results.get("analysis", ""))
+        return fallback
     
-    # Step 4: Writing
-    logger.info(" Step 4: Writing...")
-    draft_result = run_writing_step(query, plan_result, analysis_result)
+    tracker = get_stage_latency_tracker()
+    specs = [
+        # name, deps, runners, timeout
+        ("research", (), _agent_stage('research', config, lambda r: build_research_input(query, retrieved_knowledge, config)),
+         config.research_timeout),
+        ("analysis", ("research",), _agent_stage('analysis', config, lambda r: build_analysis_input(query, r["research"], config)),
+         config.analysis_timeout),
+        ("plan", ("analysis",), _agent_stage('plan', config, lambda r: build_plan_input(query, r["analysis"], config)),
+         config.planning_timeout),
+        ("draft", ("plan", "analysis"), _agent_stage('draft', config, lambda r: build_write_input(query, r["plan"], r["analysis"], config)),
+         config.writing_timeout)
+    ]
     
-    # Steps 5-8: Parallel execution of final steps
+    # Validation alone (skip_chains only) keeps its canned text, as before
     if not skip_validation and not skip_chains:
-        logger.info(" Steps 5-8: Parallel final processing...")
-        parallel_results = run_parallel_final_steps(query, research_result, analysis_result, plan_result, draft_result)
-        
-        validation_result = parallel_results['validation']
-        strategic_report = parallel_results['strategic_report']
-        swot_analysis = parallel_results['swot_analysis']
-        timeline_result = parallel_results['timeline']
-    
-    elif not skip_validation:
-        # Only run validation
-        logger.info(" Step 5: Validation only...")
-        validation_result = f"Content validation completed for {query}. The article covers the main aspects of the topic."
-        strategic_report = "Skipped for performance"
-        swot_analysis = "Skipped for performance"
-        timeline_result = "Skipped for performance"
+        specs += [
+            ("validation", ("draft",), _agent_stage('validation', config, lambda r: build_validation_input(query, r["draft"], config)),
+             config.validation_timeout),
+            ("strategic_report", ("research", "plan"),
+             _chain_stage('strategic_report', 'report', lambda r: {"research": r["research"][:config.max_chain_input], "plan": r["plan"][:config.max_chain_input]}),
+             config.chain_timeout),
+            ("swot_analysis", ("analysis", "draft"),
+             _chain_stage('swot_analysis', 'swot', lambda r: {"input": build_swot_input(r["analysis"], r["draft"], config)}),
+             config.chain_timeout),
+            ("timeline", ("plan",), _chain_stage('timeline', 'timeline', lambda r: {"plan": r["plan"][:config.max_chain_input]}),
+             config.chain_timeout)
+        ]
     
-    else:
-        # Skip all final steps
-        validation_result = "Skipped for performance"
-        strategic_report = "Skipped for performance"
-        swot_analysis = "Skipped for performance"
-        timeline_result = "Skipped for performance"
-    
-    # Optimized indexing (async/background)
-    def background_indexing():
-        try:
-            docs_to_index = []
-            
-            if not research_result.startswith("Unable to complete") and not research_result.startswith("Research timeout"):
-                docs_to_index.append(Document(page_content=f"Research: {research_result[:1000]}", metadata={"type": "research", "query": query}))
-            
-            if not analysis_result.startswith("Basic analysis") and not analysis_result.startswith("Analysis timeout"):
-                docs_to_index.append(Document(page_content=f"Analysis: {analysis_result[:1000]}", metadata={"type": "analysis", "query": query}))
-            
-            if docs_to_index:
-                add_documents_to_index(docs_to_index, embedding_model)
-                logger.info(f"Background indexing completed: {len(docs_to_index)} documents")
-        except Exception as e:
-            logger.error(f"Background indexing failed: {e}")
+    streamed = {"draft", "strategic_report", "swot_analysis", "timeline"}
+    stages = []
+    for name, deps, (run, arun), timeout in specs:
+        if publish is not None and name in streamed:
+            run = _with_token_sink(name, run, publish)
+        stages.append(Stage(name=name, run=run, arun=arun, deps=deps, timeout=tracker.adaptive_timeout(name, timeout),
+                            fallback=fallback_for(name), cost=tracker.expected(name),
+                            optional=name in OPTIONAL_STAGES))
+    return stages
+
+def checkpointed_stages(stages: list, checkpoint) -> list:
+    """
+    The stages with checkpointing: a stage whose inputs (the outputs of its deps) hash the
+    same as when its output was saved returns that output without calling the LLM, and
+    every output computed is saved. A stage that timed out still saves its output once
+    its call returns, so a re-run can use it.
+    """
+    def wrap(stage):
+        def input_hash(results):
+            return checkpoint.input_hash(stage.name, {dep: results[dep] for dep in stage.deps})
+        
+        def run(results):
+            key = input_hash(results)
+            found, output = checkpoint.lookup(stage.name, key)
+            if not found:
+                output = stage.run(results)
+                checkpoint.save(stage.name, key, output)
+            return output
+        
+        async def arun(results):
+            key = input_hash(results)
+            found, output = await run_blocking(checkpoint.lookup, stage.name, key)
+            if not found:
+                output = await stage.arun(results)
+                await run_blocking(checkpoint.save, stage.name, key, output)
+            return output
+        
+        return dataclasses.replace(stage, run=run, arun=arun if stage.arun is not None else None)
     
-    # Run indexing in background thread
-    indexing_thread = ThreadPoolExecutor(max_workers=1)
-    indexing_thread.submit(background_indexing)
+    return [wrap(stage) for stage in stages]
+
+def instrumented_stages(stages: list, run_metrics: RunMetrics, parent_span=None) -> list:
+    """
+    The stages with the LLM tokens, queue waits and cache hits of their calls counted under
+    their name, each run in a "stage <name>" span under parent_span (default: the current span)
+    """
+    parent_span = parent_span or current_span()
     
-    execution_time = time.time() - start_time
-    logger.info(f" Optimized pipeline completed in {execution_time:.2f} seconds")
+    def wrap(stage):
+        def run(results):
+            with span(f"stage {stage.name}", parent=parent_span), metrics_scope(run_metrics, stage.name):
+                return stage.run(results)
+        
+        async def arun(results):
+            with span(f"stage {stage.name}", parent=parent_span), metrics_scope(run_metrics, stage.name):
+                return await stage.arun(results)
+        
+        return dataclasses.replace(stage, run=run, arun=arun if stage.arun is not None else None)
     
-    # Optimized result structure
+    return [wrap(stage) for stage in stages]
+
+def skipped_final_results(query: str, skip_validation: bool, skip_chains: bool) -> Dict[str, str]:
+    """Outputs of the final steps left out of the DAG by the skip flags"""
+    if not skip_validation and not skip_chains:
+        return {}
+    skipped = dict.fromkeys(["validation", "strategic_report", "swot_analysis", "timeline"], SKIPPED_TEXT)
+    if not skip_validation:
+        skipped["validation"] = stage_fallback('validation', 'error', query)
+    return skipped
+
+def build_pipeline_result(query: str, retrieved_knowledge: str, results: Dict[str, Any], trace: list, execution_time: float,
+                          deadline_ms: Optional[float] = None) -> Dict[str, Any]:
+    _, key_points = finish_analysis(results["analysis"])
     result = {
         "query": query,
         "execution_time": execution_time,
         "retrieved_docs": retrieved_knowledge[:500] if retrieved_knowledge else "",  # Limit size
-        "research": research_result,
-        "analysis": analysis_result,
-        "plan": plan_result,
-        "draft": draft_result,
-        "validation": validation_result,
-        "strategic_report": strategic_report,
-        "swot_analysis": swot_analysis,
-        "timeline": timeline_result,
+        "research": results["research"],
+        "analysis": results["analysis"],
+        "plan": results["plan"],
+        "draft": results["draft"],
+        "validation": results["validation"],
+        "strategic_report": results["strategic_report"],
+        "swot_analysis": results["swot_analysis"],
+        "timeline": results["timeline"],
         "key_points": key_points,
-        "status": "completed"
+        "trace": trace,
+        "status": "completed",
+        "cache_hit": False
     }
+    if deadline_ms is not None:
+        # Stages that fell back to canned text: "timeout", "error" or "skipped" (left out to meet the deadline)
+        result["deadline_ms"] = deadline_ms
+        result["degraded"] = {entry["stage"]: entry["status"] for entry in trace if entry["status"] != "ok"}
+    return result
+
+def finish_pipeline_run(query: str, retrieved_knowledge: str, results: Dict[str, Any], scheduler: DagScheduler,
+                        run_metrics: RunMetrics, execution_time: float, deadline_ms: Optional[float] = None,
+                        checkpoint=None, resumed=()) -> Dict[str, Any]:
+    """
+    Result of a finished stage DAG, shared by the threaded, async and batch engines: records
+    the stage latencies and adds the run's metrics, trace id and checkpoint summary. Stages
+    answered from a checkpoint (or `resumed` by a batch) took no time and stay out of the statistics.
+    """
+    reused = set(resumed)
+    if checkpoint is not None:
+        reused.update(checkpoint.reused + checkpoint.edited)
+    computed_trace = [entry for entry in scheduler.trace if entry["stage"] not in reused]
+    get_stage_latency_tracker().record_trace(computed_trace)
+    record_stage_trace(computed_trace)
+
+    result = build_pipeline_result(query, retrieved_knowledge, results, scheduler.trace, execution_time, deadline_ms)
+    result["metrics"] = run_metrics.breakdown(scheduler.trace)
+    current = current_span()
+    if current is not None and current.trace_id:
+        result["trace_id"] = current.trace_id
+    if checkpoint is not None:
+        result["checkpoint"] = checkpoint.summary()
+    return result
+
+def iter_pipeline_events(query: str, skip_validation: bool = False, skip_chains: bool = False, use_cache: bool = True, stream_tokens: bool = False,
+                         config=None, latency_budget: Optional[float] = None, deadline_ms: Optional[float] = None):
+    """
+    Optimized pipeline that yields each stage result as soon as it completes
+    
+    Stages run as a DAG (see build_pipeline_stages), each starting once its inputs are ready.
+    Yields {"event": "stage", "stage": ..., "result": ..., "elapsed": ..., "at": ..., "status": ...}
+    for research, analysis, plan, draft, validation, strategic_report, swot_analysis and timeline
+    in completion order, followed by a final {"event": "result", "result": <full result dict>}.
+    "elapsed" is the stage's own duration, "at" the time since the run started and "status"
+    "ok", "timeout" or "error" (the last two carry the stage's fallback text). The result
+    includes "trace", the per-stage start/end timings of the run, "metrics", its
+    per-stage breakdown (LLM calls, tokens, queue wait, cache hits, cost), and
+    "trace_id", the id of its distributed trace (see app.services.tracing).
+    
+    With stream_tokens, the writer and the report/SWOT/timeline chains also yield
+    {"event": "delta", "stage": ..., "text": ...} per LLM token before their stage event.
+    Concatenated deltas equal the stage's raw LLM output; the stage event still carries
+    the final text, identical to a non-streaming run. Stages served from the LLM cache
+    send no deltas. Stage events then include "first_token_at" (time since run start)
+    and the result event "time_to_first_token".
+    
+    config is a preset name or PipelineConfig (see resolve_pipeline_config); its skip
+    flags add to the skip_* arguments.
+    
+    deadline_ms bounds the whole run: stage timeouts shrink to their share of the time
+    left, optional final steps that no longer fit are skipped (status "skipped"), and
+    the result lists every stage that fell back under "degraded". It also serves as
+    the "auto" preset's latency budget when none is given.
+    
+    Concurrent calls with the same normalized query and arguments share one run
+    (see PIPELINE_SINGLE_FLIGHT): later callers replay its events so far and then
+    follow it live.
+    
+    With STAGE_CHECKPOINTS, every stage output is checkpointed and the result's
+    "checkpoint" holds the run id to pass to rerun_pipeline.
+    """
+    args = (query, skip_validation, skip_chains, use_cache, stream_tokens, config, latency_budget, deadline_ms)
+    if not PIPELINE_SINGLE_FLIGHT:
+        yield from _iter_pipeline_events(*args)
+        return
+    yield from _pipeline_flights.stream(single_flight_key(*args), lambda: _iter_pipeline_events(*args))
+
+def _iter_pipeline_events(query: str, skip_validation: bool, skip_chains: bool, use_cache: bool, stream_tokens: bool,
+                          config, latency_budget: Optional[float], deadline_ms: Optional[float], checkpoint=None):
+    """The run's events inside one "pipeline" span: the trace root, unless the caller is in a trace already"""
+    root = start_span("pipeline", attributes={"pipeline.query": query, "pipeline.rerun": checkpoint is not None})
+    return iter_in_span(root, _pipeline_events(root, query, skip_validation, skip_chains, use_cache, stream_tokens,
+                                               config, latency_budget, deadline_ms, checkpoint))
+
+def _pipeline_events(root, query: str, skip_validation: bool, skip_chains: bool, use_cache: bool, stream_tokens: bool,
+                     config, latency_budget: Optional[float], deadline_ms: Optional[float], checkpoint=None):
+    # Runs as a generator, so the root span is made current only around blocks without a yield
+    start_time = time.time()
+    first_token_at = {}
+    run_metrics = RunMetrics()
+    deadline = start_time + deadline_ms / 1000 if deadline_ms is not None else None
+    if latency_budget is None and deadline_ms is not None:
+        latency_budget = deadline_ms / 1000
+    config = resolve_pipeline_config(config, latency_budget)
+    skip_validation = skip_validation or config.skip_validation
+    skip_chains = skip_chains or config.skip_chains
+    use_cache = use_cache and config.enable_caching
+    logger.info(f" Starting optimized pipeline for query: {query}")
     
-    # Async save (don't wait for it)
-    save_thread = ThreadPoolExecutor(max_workers=1)
-    save_thread.submit(save_document, format_json_readable(result))
+    embedding_model = get_embedding_model()
+    mode = get_pipeline_mode(config, skip_validation, skip_chains)
+    
+    root.set_attribute("pipeline.mode", mode)
+    if use_cache:
+        with use_span(root), metrics_scope(run_metrics):
+            cached_result = lookup_cached_result(query, mode, embedding_model)
+        root.set_attribute("pipeline.cache_hit", cached_result is not None)
+        if cached_result is not None:
+            cached_result["execution_time"] = time.time() - start_time
+            yield {"event": "result", "result": cached_result}
+            return
     
+    if checkpoint is not None:
+        # A re-run works from the retrieval of the original run
+        retrieved_knowledge = checkpoint.run["retrieved_knowledge"]
+    else:
+        # Step 0: Retrieve from FAISS (optimized)
+        logger.info(" Step 0: Retrieving from FAISS...")
+        with use_span(root):
+            try:
+                with metrics_scope(run_metrics):
+                    vector_results = search_documents(query, embedding_model, k=config.vector_search_k)
+                retrieved_knowledge = retrieve_knowledge(vector_results, config)
+            except Exception as e:
+                logger.error(f"FAISS retrieval failed: {e}")
+                retrieved_knowledge = ""
+            if STAGE_CHECKPOINTS:
+                try:
+                    checkpoint = start_run_checkpoint(query, retrieved_knowledge, config, skip_validation, skip_chains)
+                except Exception as e:
+                    logger.error(f"Could not start stage checkpoints: {e}")
+    
+    # Steps 1-8: DAG of agent and chain stages
+    scheduler = DagScheduler(max_concurrency=get_stage_concurrency(config), deadline=deadline)
+    stages = build_pipeline_stages(
+        query, retrieved_knowledge, config, skip_validation, skip_chains,
+        publish=scheduler.publish if stream_tokens else None
+    )
+    if checkpoint is not None:
+        stages = checkpointed_stages(stages, checkpoint)
+    stages = instrumented_stages(stages, run_metrics, root)
+    results = {}
+    for event in scheduler.iter_run(stages):
+        if event["event"] == "delta":
+            first_token_at.setdefault(event["stage"], time.time() - start_time)
+            yield event
+            continue
+        results[event["stage"]] = event["result"]
+        if event["stage"] == "analysis":
+            _, event["key_points"] = finish_analysis(event["result"])
+        if stream_tokens:
+            event["first_token_at"] = first_token_at.get(event["stage"])
+        yield event
+    
+    for step_name, step_result in skipped_final_results(query, skip_validation, skip_chains).items():
+        results[step_name] = step_result
+        yield {"event": "stage", "stage": step_name, "result": step_result, "elapsed": 0.0, "at": time.time() - start_time, "status": "skipped"}
+    
+    execution_time = time.time() - start_time
+    with use_span(root):
+        logger.info(f" Optimized pipeline completed in {execution_time:.2f} seconds")
+        result = finish_pipeline_run(query, retrieved_knowledge, results, scheduler, run_metrics, execution_time,
+                                     deadline_ms, checkpoint)
+        root.set_attribute("pipeline.fallback_stages", [entry["stage"] for entry in scheduler.trace if entry["status"] != "ok"])
+        
+        # A run squeezed by its deadline is not the answer a later, unhurried request should get
+        if use_cache and not result.get("degraded"):
+            store_cached_result(query, mode, embedding_model, result)
+        
+        # Indexing and saving run in the background (don't wait for them); their spans join this trace
+        schedule_background_work(query, result["research"], result["analysis"], result, embedding_model, config, mode)
+    
+    final_event = {"event": "result", "result": result}
+    if stream_tokens:
+        final_event["time_to_first_token"] = min(first_token_at.values()) if first_token_at else None
+    yield final_event
+
+def run_optimized_pipeline(query: str, skip_validation: bool = False, skip_chains: bool = False, use_cache: bool = True,
+                           config=None, latency_budget: Optional[float] = None, deadline_ms: Optional[float] = None):
+    """
+    Optimized pipeline with parallel processing and optional step skipping
+    
+    Args:
+        query: The query to process
+        skip_validation: Skip validation step to save time
+        skip_chains: Skip chain generation (report, SWOT, timeline) to save time
+        use_cache: Return a stored result for a near-identical earlier query in the same mode
+        config: Preset name ("express", "balanced", "comprehensive", "quality_focused", "auto")
+            or PipelineConfig controlling timeouts, input limits, retrieval and skip flags
+        latency_budget: Target run time in seconds for the "auto" preset
+        deadline_ms: Hard budget for the whole run; stages that can't fit degrade to their fallbacks
+    """
+    result = None
+    for event in iter_pipeline_events(query, skip_validation, skip_chains, use_cache, config=config,
+                                      latency_budget=latency_budget, deadline_ms=deadline_ms):
+        if event["event"] == "result":
+            result = event["result"]
     return result
 
-def run_express_pipeline(query: str):
+@traced("pipeline express")
+def run_express_pipeline(query: str, use_cache: bool = True, config="express", latency_budget: Optional[float] = None,
+                         deadline_ms: Optional[float] = None):
     """
     Ultra-fast pipeline that only runs essential steps
     Perfect for quick insights and prototyping
     """
     start_time = time.time()
+    if latency_budget is None and deadline_ms is not None:
+        latency_budget = deadline_ms / 1000
+    config = resolve_pipeline_config(config, latency_budget)
+    use_cache = use_cache and config.enable_caching
     logger.info(f" Starting express pipeline for query: {query}")
     
+    embedding_model = get_embedding_model()
+    # Research and analysis only: not the result a DAG run with the same config returns
+    cache_mode = f"express_steps:{get_pipeline_mode(config)}"
+    if use_cache:
+        cached_result = lookup_cached_result(query, cache_mode, embedding_model)
+        if cached_result is not None:
+            cached_result["execution_time"] = time.time() - start_time
+            return cached_result
+    
     # Only research and basic analysis
-    research_result = run_research_step(query, "")
-    analysis_result, key_points = run_analysis_step(query, research_result)
+    tracker = get_stage_latency_tracker()
+    if deadline_ms is not None:
+        # Research gets its expected share of the budget, analysis whatever is left
+        budget = start_time + deadline_ms / 1000 - time.time()
+        share = tracker.expected("research") / (tracker.expected("research") + tracker.expected("analysis"))
+        config = dataclasses.replace(config, research_timeout=max(0.1, min(config.research_timeout, budget * share)))
+    stage_start = time.time()
+    research_result = run_research_step(query, "", config)
+    if not is_fallback_research(research_result):
+        tracker.record("research", time.time() - stage_start)
+    
+    if deadline_ms is not None:
+        budget = start_time + deadline_ms / 1000 - time.time()
+        config = dataclasses.replace(config, analysis_timeout=max(0.1, min(config.analysis_timeout, budget)))
+    stage_start = time.time()
+    analysis_result, key_points = run_analysis_step(query, research_result, config)
+    if not is_fallback_analysis(analysis_result):
+        tracker.record("analysis", time.time() - stage_start)
     
     execution_time = time.time() - start_time
     logger.info(f" Express pipeline completed in {execution_time:.2f} seconds")
     
-    return {
+    result = {
         "query": query,
         "execution_time": execution_time,
         "research": research_result,
         "analysis": analysis_result,
         "key_points": key_points,
-        "status": "express_completed"
+        "status": "express_completed",
+        "cache_hit": False
     }
+    if current_span().trace_id:
+        result["trace_id"] = current_span().trace_id
+    if deadline_ms is not None:
+        result["deadline_ms"] = deadline_ms
+        result["degraded"] = {}
+        if is_fallback_research(research_result):
+            result["degraded"]["research"] = "timeout"
+        if is_fallback_analysis(analysis_result):
+            result["degraded"]["analysis"] = "timeout"
+    
+    if use_cache and not result.get("degraded"):
+        store_cached_result(query, cache_mode, embedding_model, result)
+    
+    return result
 
-def run_balanced_pipeline(query: str):
+def run_balanced_pipeline(query: str, use_cache: bool = True, config="balanced", latency_budget: Optional[float] = None,
+                          deadline_ms: Optional[float] = None):
     """
     Balanced pipeline that includes core steps but skips time-intensive validation and chains
     Good balance between speed and comprehensiveness
     """
-    return run_optimized_pipeline(query, skip_validation=True, skip_chains=True)
+    return run_optimized_pipeline(query, skip_validation=True, skip_chains=True, use_cache=use_cache,
+                                  config=config, latency_budget=latency_budget, deadline_ms=deadline_ms)
+
+def iter_rerun_events(run_id: str, overrides: Optional[Dict[str, str]] = None, invalidate=(), stream_tokens: bool = False):
+    """
+    Re-run a checkpointed run (same query, retrieval and config), yielding the events of
+    iter_pipeline_events. Stages whose inputs hash as they did last time return their
+    checkpointed output; only stages downstream of a change call the LLM again.
+    
+    overrides replaces stage outputs, e.g. {"plan": <edited plan>}: the stages reading the
+    plan are recomputed, and those further down only if their own inputs changed.
+    invalidate names stages to recompute regardless. Edits and new outputs are saved
+    under the same run id. Raises UnknownCheckpointError for an unknown (or expired) run id and
+    ValueError for unknown stage names.
+    """
+    unknown = sorted(set(overrides or {}).union(invalidate) - set(PIPELINE_STAGES))
+    if unknown:
+        raise ValueError(f"Unknown stages {unknown}, expected some of {list(PIPELINE_STAGES)}")
+    checkpoint = resume_run_checkpoint(run_id, overrides, invalidate)
+    if checkpoint is None:
+        raise UnknownCheckpointError(run_id)
+    run = checkpoint.run
+    # The original run already indexed its research and analysis
+    config = dataclasses.replace(PipelineConfig(**run["config"]), skip_indexing=True)
+    logger.info(f" Re-running {run_id}: overrides {sorted(overrides or {})}, invalidated {sorted(invalidate)}")
+    yield from _iter_pipeline_events(run["query"], run["skip_validation"], run["skip_chains"], False, stream_tokens,
+                                     config, None, None, checkpoint)
+
+def rerun_pipeline(run_id: str, overrides: Optional[Dict[str, str]] = None, invalidate=()) -> Dict[str, Any]:
+    """Result of iter_rerun_events; its "checkpoint" lists the stages reused, edited and recomputed"""
+    result = None
+    for event in iter_rerun_events(run_id, overrides, invalidate):
+        if event["event"] == "result":
+            result = event["result"]
+    return result
 
 # Cleanup function to clear caches when needed
 def clear_pipeline_cache():
@@ -444,5 +972,6 @@ def clear_pipeline_cache():
     global _agent_cache, _chain_cache
     _agent_cache.clear()
     _chain_cache.clear()
+    get_llm_registry().clear_chains()
     logger.info("Pipeline cache cleared")
 
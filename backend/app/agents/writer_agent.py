@@ -1,14 +1,10 @@
 # agents/writer_agent.py
-import os
 from langchain.agents import initialize_agent, AgentType
-from langchain_groq import ChatGroq
+from app.services.llm_clients import get_llm
 from app.tools.write_tool import get_write_tool
 
 def get_writer_agent():
-    llm = ChatGroq(
-        groq_api_key=os.getenv("GROQ_API_KEY"),
-        model="llama3-70b-8192"
-    )
+    llm = get_llm()
     tools = [get_write_tool()]
 
     return initialize_agent(
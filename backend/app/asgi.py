@@ -0,0 +1,81 @@
+# app/asgi.py
+import json
+
+from asgiref.wsgi import WsgiToAsgi
+
+from app.agents.async_pipeline import run_pipeline_async
+from app.main import app as flask_app
+from app.routes.agent_pipeline import parse_run_body
+from app.services.tracing import continue_trace
+from app.utils.logging import setup_logger
+
+logger = setup_logger(__name__)
+
+# ASGI entry point, e.g. `uvicorn app.asgi:app`. POST /agent-pipeline/run-async runs
+# run_pipeline_async on the server's event loop, so a run waiting on Groq holds no
+# thread (Flask's own async views get a worker thread and a new loop per request).
+# Every other request goes to the Flask app through asgiref's WSGI adapter.
+
+ASYNC_RUN_PATH = "/agent-pipeline/run-async"
+
+_flask = WsgiToAsgi(flask_app)
+
+
+async def _read_body(receive) -> bytes:
+    body = b""
+    while True:
+        message = await receive()
+        if message["type"] == "http.disconnect":
+            return body
+        body += message.get("body", b"")
+        if not message.get("more_body"):
+            return body
+
+
+async def _send_json(send, status: int, payload):
+    body = json.dumps(payload, ensure_ascii=False, default=str).encode("utf-8")
+    await send({"type": "http.response.start", "status": status,
+                "headers": [(b"content-type", b"application/json"), (b"content-length", str(len(body)).encode())]})
+    await send({"type": "http.response.body", "body": body})
+
+
+async def _run_async(scope, receive, send):
+    """The /run-async view: same body, errors and result as the Flask route"""
+    try:
+        data = json.loads(await _read_body(receive) or b"null")
+    except ValueError:
+        await _send_json(send, 400, {"error": "Request body must be JSON"})
+        return
+    try:
+        query, config, deadline_ms = parse_run_body(data)
+    except ValueError as e:
+        await _send_json(send, 400, {"error": str(e)})
+        return
+    headers = {name.decode("latin-1").lower(): value.decode("latin-1") for name, value in scope.get("headers", [])}
+    try:
+        with continue_trace(headers.get("traceparent")):
+            output = await run_pipeline_async(query, config=config, deadline_ms=deadline_ms)
+    except Exception as e:
+        logger.error(f"Async pipeline run failed: {e}")
+        await _send_json(send, 500, {"error": "Internal server error"})
+        return
+    await _send_json(send, 200, output)
+
+
+async def _lifespan(receive, send):
+    while True:
+        message = await receive()
+        if message["type"] == "lifespan.startup":
+            await send({"type": "lifespan.startup.complete"})
+        elif message["type"] == "lifespan.shutdown":
+            await send({"type": "lifespan.shutdown.complete"})
+            return
+
+
+async def app(scope, receive, send):
+    if scope["type"] == "lifespan":
+        await _lifespan(receive, send)
+    elif scope["type"] == "http" and scope["path"] == ASYNC_RUN_PATH and scope["method"] == "POST":
+        await _run_async(scope, receive, send)
+    else:
+        await _flask(scope, receive, send)
@@ -1,11 +1,8 @@
 from langchain.prompts import PromptTemplate
-from langchain.chains import LLMChain
-from langchain_groq import ChatGroq
-import os
+from app.services.llm_clients import get_llm_chain
 
-def get_report_chain():
-    prompt = PromptTemplate.from_template(
-        """
+REPORT_PROMPT = PromptTemplate.from_template(
+    """
         Based on the following research and planning context, write a comprehensive strategic report.
         
         Focus on:
@@ -24,12 +21,7 @@ def get_report_chain():
 
         Ensure clarity, structure, and actionable recommendations. Format as a professional business report.
         """
-    )
+)
 
-    llm = ChatGroq(
-        groq_api_key=os.getenv("GROQ_API_KEY"),
-        model="llama3-70b-8192",
-        temperature=0.3  # Lower temperature for more structured output
-    )
-
-    return LLMChain(llm=llm, prompt=prompt)
+def get_report_chain():
+    return get_llm_chain("report", REPORT_PROMPT, temperature=0.3, streaming=True)  # Lower temperature for more structured output
@@ -1,11 +1,8 @@
 from langchain.prompts import PromptTemplate
-from langchain.chains import LLMChain
-from langchain_groq import ChatGroq
-import os
+from app.services.llm_clients import get_llm_chain
 
-def get_swot_chain():
-    prompt = PromptTemplate.from_template(
-        """
+SWOT_PROMPT = PromptTemplate.from_template(
+    """
         Perform a comprehensive SWOT analysis based on the following content:
 
         {input}
@@ -38,12 +35,7 @@ def get_swot_chain():
 
         Return the analysis in clear bullet format with detailed explanations for each point.
         """
-    )
+)
 
-    llm = ChatGroq(
-        groq_api_key=os.getenv("GROQ_API_KEY"),
-        model="llama3-70b-8192",
-        temperature=0.2  # Lower temperature for analytical precision
-    )
-
-    return LLMChain(llm=llm, prompt=prompt)
+def get_swot_chain():
+    return get_llm_chain("swot", SWOT_PROMPT, temperature=0.2, streaming=True)  # Lower temperature for analytical precision
@@ -1,11 +1,8 @@
 from langchain.prompts import PromptTemplate
-from langchain.chains import LLMChain
-from langchain_groq import ChatGroq
-import os
+from app.services.llm_clients import get_llm_chain
 
-def get_timeline_chain():
-    prompt = PromptTemplate.from_template(
-        """
+TIMELINE_PROMPT = PromptTemplate.from_template(
+    """
         Given the following plan, create a detailed quarterly timeline with key milestones, deliverables, and success criteria:
 
         {plan}
@@ -38,13 +35,8 @@ def get_timeline_chain():
 
         Include dependencies between quarters and critical path items. Be specific and actionable.
         """
-    )
+)
 
-    llm = ChatGroq(
-        groq_api_key=os.getenv("GROQ_API_KEY"),
-        model="llama3-70b-8192",
-        temperature=0.1  # Very low temperature for structured planning
-    )
-
-    return LLMChain(llm=llm, prompt=prompt)
+def get_timeline_chain():
+    return get_llm_chain("timeline", TIMELINE_PROMPT, temperature=0.1, streaming=True)  # Very low temperature for structured planning
 
@@ -1,4 +1,5 @@
 # app/config/pipeline_config.py
+import os
 from dataclasses import dataclass
 from typing import Optional
 
@@ -32,6 +33,10 @@ class PipelineConfig:
     enable_background_indexing: bool = True
     enable_parallel_execution: bool = True
     
+    # "direct": analysis, planning, writing and validation call their tool directly (one LLM call each);
+    # "agent": every stage goes through its ReAct agent. Research always uses its agent to pick tools.
+    execution_mode: str = os.getenv("PIPELINE_EXECUTION_MODE", "direct")
+    
     # Feature flags
     skip_validation: bool = False
     skip_chains: bool = False
@@ -120,6 +125,14 @@ Pipeline Performance Optimization Guide
    - Use for: High-quality reports, detailed analysis
    - Trade-offs: Slower but highest quality output
    - Code: run_optimized_pipeline(query, config=PERFORMANCE_CONFIGS['quality_focused'])
+           or run_optimized_pipeline(query, config="quality_focused")
+
+5. AUTO
+   - Use for: Callers with a latency target
+   - Picks the richest preset whose recent p95 stage latencies fit the budget,
+     and tightens stage timeouts to match
+   - Code: run_optimized_pipeline(query, config="auto", latency_budget=30)
+   - HTTP: {"query": ..., "config": "auto", "latency_budget": 30}
 
 OPTIMIZATION TECHNIQUES IMPLEMENTED:
 ===================================
@@ -4,7 +4,11 @@ from flask import Blueprint
 
 from .agent_pipeline import agent_pipeline_bp
 from .history_router import history_bp
+from .runs import runs_bp
+from .metrics import metrics_bp
 
 def register_routes(app):
     app.register_blueprint(agent_pipeline_bp)
-    app.register_blueprint(history_bp)
\ No newline at end of file
+    app.register_blueprint(history_bp)
+    app.register_blueprint(runs_bp)
+    app.register_blueprint(metrics_bp)
\ No newline at end of file
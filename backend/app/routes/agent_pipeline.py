@@ -1,16 +1,158 @@
 # routes/agent_pipeline.py
-from flask import Blueprint, request, jsonify
-from app.agents.pipeline_agent import run_optimized_pipeline
+import json
+from flask import Blueprint, request, jsonify, Response, stream_with_context
+from app.agents.pipeline_agent import run_optimized_pipeline, iter_pipeline_events, resolve_pipeline_config, rerun_pipeline
+from app.agents.async_pipeline import run_pipeline_async
+from app.services.stage_checkpoints import UnknownCheckpointError, get_checkpoint_store
+from app.services.rate_limiter import get_rate_limit_stats
+from app.services.tracing import continue_trace
 
 agent_pipeline_bp = Blueprint("agent_pipeline", __name__, url_prefix="/agent-pipeline")
 
+def parse_number(data, name):
+    """Optional numeric field of a request body; ValueError (a 400) for a string, list or object that isn't one"""
+    value = data.get(name)
+    if value is None:
+        return None
+    if isinstance(value, bool):
+        raise ValueError(f"'{name}' must be a number")
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        raise ValueError(f"'{name}' must be a number")
+
+def parse_flag(data, name, default):
+    """Optional boolean field of a request body; ValueError (a 400) for anything but true or false"""
+    value = data.get(name, default)
+    if not isinstance(value, bool):
+        raise ValueError(f"'{name}' must be true or false")
+    return value
+
+def parse_deadline_ms(data):
+    deadline_ms = parse_number(data, "deadline_ms")
+    if deadline_ms is None:
+        return None
+    if deadline_ms <= 0:
+        raise ValueError("'deadline_ms' must be positive")
+    return deadline_ms
+
+def _pipeline_config(data, deadline_ms=None):
+    """
+    Resolve the optional "config" preset name and "latency_budget" (seconds) of a request body.
+    Without a latency_budget, "auto" fits the run's deadline_ms, as the pipeline does.
+    """
+    config = data.get("config")
+    if config is not None and not isinstance(config, str):
+        raise ValueError("'config' must be a preset name")
+    latency_budget = parse_number(data, "latency_budget")
+    if latency_budget is None and deadline_ms is not None:
+        latency_budget = deadline_ms / 1000
+    return resolve_pipeline_config(config, latency_budget)
+
+def parse_run_body(data) -> tuple:
+    """(query, config, deadline_ms) of a /run request body; a ValueError's message is the 400 error"""
+    if not isinstance(data, dict) or not data.get("query"):
+        raise ValueError("Missing 'query'")
+    deadline_ms = parse_deadline_ms(data)
+    return data["query"], _pipeline_config(data, deadline_ms), deadline_ms
+
 @agent_pipeline_bp.route("/run", methods=["POST"])
 def run_pipeline():
+    """
+    Body: {"query": ..., "config": optional preset name, "latency_budget": optional seconds for "auto",
+    "deadline_ms": optional budget for the whole run}
+    """
+    try:
+        query, config, deadline_ms = parse_run_body(request.json)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    # A caller's W3C traceparent header makes the run part of its trace
+    with continue_trace(request.headers.get("traceparent")):
+        output = run_optimized_pipeline(query, config=config, deadline_ms=deadline_ms)
+    return jsonify(output)
+
+@agent_pipeline_bp.route("/run-async", methods=["POST"])
+async def run_pipeline_async_route():
+    """
+    Same request and response as /run, served by the asyncio pipeline.
+
+    Under WSGI (needs flask[async]) Flask runs this view on the request's worker thread
+    in a new event loop, so the request still holds a thread. Served through app.asgi,
+    the same path runs on the ASGI server's loop and a waiting run holds none.
+    """
+    try:
+        query, config, deadline_ms = parse_run_body(request.json)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    with continue_trace(request.headers.get("traceparent")):
+        output = await run_pipeline_async(query, config=config, deadline_ms=deadline_ms)
+    return jsonify(output)
+
+@agent_pipeline_bp.route("/stream", methods=["POST"])
+def stream_pipeline():
+    """Same pipeline and body as /run, streamed as newline-delimited JSON, one event per completed stage.
+
+    Token deltas from the writer and the report/SWOT/timeline chains are included
+    unless the body sets "tokens": false.
+    """
     data = request.json
-    query = data.get("query", "")
+    try:
+        query, config, deadline_ms = parse_run_body(data)
+        stream_tokens = parse_flag(data, "tokens", True)
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    traceparent = request.headers.get("traceparent")
+
+    def generate():
+        with continue_trace(traceparent):
+            for event in iter_pipeline_events(query, stream_tokens=stream_tokens, config=config, deadline_ms=deadline_ms):
+                yield json.dumps(event, ensure_ascii=False, default=str) + "\n"
 
-    if not query:
-        return jsonify({"error": "Missing 'query'"}), 400
+    return Response(
+        stream_with_context(generate()),
+        mimetype="application/x-ndjson",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
 
-    output = run_optimized_pipeline(query)
+# Checkpoint ids (a result's "checkpoint.run_id") are not the job ids of /runs/<run_id>,
+# so these live under /checkpoints rather than /runs
+@agent_pipeline_bp.route("/checkpoints/<checkpoint_id>", methods=["GET"])
+def get_checkpoint(checkpoint_id):
+    """A checkpointed run (query, retrieval, config) and its saved stage outputs"""
+    store = get_checkpoint_store()
+    run = store.get_run(checkpoint_id)
+    if run is None:
+        return jsonify({"error": "Unknown checkpoint"}), 404
+    return jsonify({"run": run, "stages": store.get_stages(checkpoint_id)})
+
+@agent_pipeline_bp.route("/checkpoints/<checkpoint_id>/rerun", methods=["POST"])
+def rerun_pipeline_route(checkpoint_id):
+    """
+    Re-run a checkpointed run (its id is the result's "checkpoint.run_id"), recomputing only the
+    stages whose inputs changed. Body: {"overrides": {stage: edited output}, "invalidate": [stage, ...]}
+    """
+    data = request.json or {}
+    if not isinstance(data, dict):
+        return jsonify({"error": "Request body must be a JSON object"}), 400
+    overrides = data.get("overrides") or {}
+    invalidate = data.get("invalidate") or []
+
+    if not isinstance(overrides, dict) or not isinstance(invalidate, list):
+        return jsonify({"error": "'overrides' must be an object and 'invalidate' a list"}), 400
+
+    try:
+        with continue_trace(request.headers.get("traceparent")):
+            output = rerun_pipeline(checkpoint_id, overrides, invalidate)
+    except UnknownCheckpointError:
+        return jsonify({"error": "Unknown checkpoint"}), 404
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
     return jsonify(output)
+
+@agent_pipeline_bp.route("/rate-limits", methods=["GET"])
+def rate_limits():
+    """Per-provider rate limiter state: calls, 429s, current rate share and queue wait times by priority"""
+    return jsonify(get_rate_limit_stats())
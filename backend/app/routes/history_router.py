@@ -1,10 +1,49 @@
 # routes/history_router.py
-from flask import Blueprint, jsonify
-from app.services.db_service import fetch_documents
+from datetime import datetime
+from flask import Blueprint, request, jsonify
+from app.services.history_service import list_results, get_result, parse_fields, HISTORY_DEFAULT_LIMIT
 
 history_bp = Blueprint("history", __name__, url_prefix="/pipeline-history")
 
+def _datetime_arg(name):
+    value = request.args.get(name)
+    if value is None:
+        return None
+    try:
+        return datetime.fromisoformat(value)
+    except ValueError:
+        raise ValueError(f"'{name}' must be an ISO 8601 date or datetime")
+
 @history_bp.route("/", methods=["GET"])
 def get_past_runs():
-    docs = fetch_documents("pipeline_results", limit=5)
-    return jsonify(docs)
+    """
+    Saved runs, newest first. Query parameters (all optional):
+    q (words of the query), mode, status, since / until (ISO dates), limit (max 100),
+    cursor (next_cursor of the previous page), fields (comma-separated, e.g. "query,result.draft").
+    """
+    try:
+        page = list_results(
+            q=request.args.get("q"),
+            mode=request.args.get("mode"),
+            status=request.args.get("status"),
+            since=_datetime_arg("since"),
+            until=_datetime_arg("until"),
+            cursor=request.args.get("cursor"),
+            limit=int(request.args.get("limit", HISTORY_DEFAULT_LIMIT)),
+            fields=parse_fields(request.args.get("fields")),
+        )
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify(page)
+
+@history_bp.route("/<result_id>", methods=["GET"])
+def get_past_run(result_id):
+    """One saved run with all of its output, or only the requested fields"""
+    try:
+        fields = parse_fields(request.args.get("fields")) if request.args.get("fields") else None
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+    document = get_result(result_id, fields)
+    if document is None:
+        return jsonify({"error": "Unknown run"}), 404
+    return jsonify(document)
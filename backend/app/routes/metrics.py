@@ -0,0 +1,10 @@
+# routes/metrics.py
+from flask import Blueprint, Response
+from app.services.metrics import get_metrics
+
+metrics_bp = Blueprint("metrics", __name__)
+
+@metrics_bp.route("/metrics", methods=["GET"])
+def metrics():
+    """Stage, LLM, embedding, FAISS and MongoDB timings, token counts and rate limiter state for Prometheus"""
+    return Response(get_metrics().render(), mimetype="text/plain; version=0.0.4")
@@ -0,0 +1,52 @@
+# routes/runs.py
+from flask import Blueprint, request, jsonify
+from app.agents.pipeline_agent import resolve_pipeline_config
+from app.routes.agent_pipeline import parse_deadline_ms, parse_number
+from app.services.job_queue import get_job_queue, QueueFullError
+
+runs_bp = Blueprint("runs", __name__, url_prefix="/runs")
+
+def parse_priority(data) -> int:
+    priority = data.get("priority", 0)
+    if isinstance(priority, bool):
+        raise ValueError("'priority' must be an integer")
+    try:
+        return int(priority)
+    except (TypeError, ValueError):
+        raise ValueError("'priority' must be an integer")
+
+@runs_bp.route("", methods=["POST"])
+def submit_run():
+    """
+    Queue a pipeline run and return its id at once (202).
+    Body: same as /agent-pipeline/run plus "priority" (higher runs first within the mode's queue).
+    """
+    data = request.json or {}
+    query = data.get("query", "") if isinstance(data, dict) else ""
+
+    if not query:
+        return jsonify({"error": "Missing 'query'"}), 400
+
+    try:
+        config = data.get("config")
+        if config is not None and not isinstance(config, str):
+            raise ValueError("'config' must be a preset name")
+        latency_budget = parse_number(data, "latency_budget")
+        resolve_pipeline_config(config, latency_budget)  # rejects unknown presets before queueing
+        params = {"query": query, "config": config, "latency_budget": latency_budget,
+                  "deadline_ms": parse_deadline_ms(data), "traceparent": request.headers.get("traceparent")}
+        job = get_job_queue().submit(params, mode=config or "default", priority=parse_priority(data))
+    except QueueFullError as e:
+        return jsonify({"error": str(e)}), 429
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    return jsonify({"run_id": job["id"], "status": job["status"], "mode": job["mode"]}), 202
+
+@runs_bp.route("/<run_id>", methods=["GET"])
+def get_run(run_id):
+    """Status of a queued run, the stages finished so far and, once done, the full result"""
+    job = get_job_queue().get(run_id)
+    if job is None:
+        return jsonify({"error": "Unknown run"}), 404
+    return jsonify(job)
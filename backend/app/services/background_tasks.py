@@ -0,0 +1,234 @@
+import atexit
+import json
+import os
+import threading
+import time
+from collections import deque
+from typing import Any, Callable, Hashable, Optional
+
+from app.services.tracing import current_span, span
+from app.utils.hedging import backoff_delay
+from app.utils.logging import setup_logger
+
+logger = setup_logger(__name__)
+
+BACKGROUND_WORKERS = int(os.getenv("BACKGROUND_WORKERS", 2))
+BACKGROUND_QUEUE_SIZE = int(os.getenv("BACKGROUND_QUEUE_SIZE", 1000))
+# What submit() does when the queue is full: "block" (wait for room, so nothing is lost),
+# "drop_new" or "drop_oldest" (the dropped task goes to the dead-letter file)
+BACKGROUND_FULL_POLICY = os.getenv("BACKGROUND_FULL_POLICY", "block")
+BACKGROUND_TASK_RETRIES = int(os.getenv("BACKGROUND_TASK_RETRIES", 3))
+# Most queued items merged into one call of a batched task (e.g. one FAISS add for several runs)
+BACKGROUND_MAX_BATCH = int(os.getenv("BACKGROUND_MAX_BATCH", 32))
+BACKGROUND_DRAIN_TIMEOUT = float(os.getenv("BACKGROUND_DRAIN_TIMEOUT", 30))
+BACKGROUND_DEAD_LETTER_PATH = os.getenv("BACKGROUND_DEAD_LETTER_PATH", "app/storage/background_dead_letter.jsonl")
+
+
+class _Task:
+    __slots__ = ("name", "func", "args", "batch_key", "payload", "enqueued_at", "parent_span")
+
+    def __init__(self, name, func, args, batch_key, payload):
+        self.name = name
+        self.func = func
+        self.args = args
+        self.batch_key = batch_key
+        self.payload = payload
+        self.enqueued_at = time.time()
+        # Workers don't inherit the submitter's context; the task's span continues its trace
+        self.parent_span = current_span()
+
+
+class BackgroundTaskService:
+    """
+    Bounded queue of fire-and-forget work (FAISS indexing, result saves) served by
+    a fixed set of worker threads.
+
+    Tasks submitted with a batch_key are merged: a worker taking one also takes
+    the other queued tasks with the same key and calls func once with all their
+    items, so under load several runs' index additions become one add. Failed
+    tasks are retried with backoff; tasks that still fail, or are dropped by the
+    full-queue policy, are appended to a dead-letter JSONL file with their payload.
+    """
+
+    def __init__(self, workers: int = BACKGROUND_WORKERS, max_size: int = BACKGROUND_QUEUE_SIZE,
+                 full_policy: str = BACKGROUND_FULL_POLICY, retries: int = BACKGROUND_TASK_RETRIES,
+                 dead_letter_path: Optional[str] = BACKGROUND_DEAD_LETTER_PATH):
+        if full_policy not in ("block", "drop_new", "drop_oldest"):
+            raise ValueError(f"Unknown full-queue policy '{full_policy}'")
+        self.max_size = max_size
+        self.full_policy = full_policy
+        self.retries = retries
+        self.dead_letter_path = dead_letter_path
+        self._queue = deque()
+        self._cond = threading.Condition()
+        self._dead_letter_lock = threading.Lock()
+        self._in_progress = 0
+        self._closed = False
+        self._stats = {"submitted": 0, "completed": 0, "failed": 0, "retried": 0, "dropped": 0,
+                       "batched": 0, "blocked": 0, "last_lag": 0.0, "max_lag": 0.0}
+        self._workers = [threading.Thread(target=self._work, name=f"background-{i}", daemon=True)
+                         for i in range(workers)]
+        for worker in self._workers:
+            worker.start()
+
+    def submit(self, name: str, func: Callable, *args, payload: Any = None) -> bool:
+        """Queue func(*args); returns False if the task was dropped"""
+        return self._put(_Task(name, func, args, None, payload))
+
+    def submit_batched(self, name: str, batch_key: Hashable, func: Callable, item, payload: Any = None) -> bool:
+        """Queue item for func(items), merged with other queued items of the same batch_key"""
+        return self._put(_Task(name, func, (item,), batch_key, payload))
+
+    def _put(self, task: _Task) -> bool:
+        dropped = None
+        with self._cond:
+            if self._closed:
+                dropped = task
+            elif len(self._queue) >= self.max_size:
+                if self.full_policy == "block":
+                    # Backpressure: the submitting request waits for the workers to catch up
+                    self._stats["blocked"] += 1
+                    while len(self._queue) >= self.max_size and not self._closed:
+                        self._cond.wait()
+                    if self._closed:
+                        dropped = task
+                elif self.full_policy == "drop_new":
+                    dropped = task
+                else:
+                    dropped = self._queue.popleft()
+            if dropped is not task:
+                self._queue.append(task)
+                self._stats["submitted"] += 1
+                self._cond.notify_all()
+            if dropped is not None:
+                self._stats["dropped"] += 1
+        if dropped is not None:
+            logger.warning(f"Background queue full or closed, dropped {dropped.name}")
+            self._dead_letter(dropped, "dropped")
+        return dropped is not task
+
+    def _take(self):
+        with self._cond:
+            while not self._queue:
+                if self._closed:
+                    return None
+                self._cond.wait()
+            tasks = [self._queue.popleft()]
+            if tasks[0].batch_key is not None:
+                rest = deque()
+                while self._queue:
+                    task = self._queue.popleft()
+                    if task.batch_key == tasks[0].batch_key and len(tasks) < BACKGROUND_MAX_BATCH:
+                        tasks.append(task)
+                    else:
+                        rest.append(task)
+                self._queue = rest
+                self._stats["batched"] += len(tasks) - 1
+            lag = time.time() - tasks[0].enqueued_at
+            self._stats["last_lag"] = lag
+            self._stats["max_lag"] = max(self._stats["max_lag"], lag)
+            self._in_progress += 1
+            self._cond.notify_all()
+            return tasks
+
+    def _work(self):
+        while True:
+            tasks = self._take()
+            if tasks is None:
+                return
+            try:
+                # Merged tasks from other traces are linked to the one span
+                with span(f"background {tasks[0].name}", parent=tasks[0].parent_span,
+                          attributes={"background.tasks": len(tasks),
+                                      "background.lag_seconds": round(time.time() - tasks[0].enqueued_at, 3)},
+                          links=[task.parent_span for task in tasks[1:]]):
+                    self._run(tasks)
+            finally:
+                with self._cond:
+                    self._in_progress -= 1
+                    self._cond.notify_all()
+
+    def _run(self, tasks: list):
+        head = tasks[0]
+        for attempt in range(self.retries + 1):
+            try:
+                if head.batch_key is not None:
+                    head.func([task.args[0] for task in tasks])
+                else:
+                    head.func(*head.args)
+                with self._cond:
+                    self._stats["completed"] += len(tasks)
+                return
+            except Exception as e:
+                current_span().set_attribute("background.attempts", attempt + 1)
+                if attempt == self.retries:
+                    current_span().set_error(e)
+                    logger.error(f"Background task {head.name} failed after {attempt + 1} attempts: {e}")
+                    with self._cond:
+                        self._stats["failed"] += len(tasks)
+                    for task in tasks:
+                        self._dead_letter(task, str(e))
+                    return
+                delay = backoff_delay(attempt)
+                logger.warning(f"Background task {head.name} failed ({e}), retry {attempt + 1}/{self.retries} in {delay:.2f}s")
+                with self._cond:
+                    self._stats["retried"] += 1
+                time.sleep(delay)
+
+    def _dead_letter(self, task: _Task, reason: str):
+        if not self.dead_letter_path or task.payload is None:
+            return
+        try:
+            os.makedirs(os.path.dirname(self.dead_letter_path) or ".", exist_ok=True)
+            record = {"task": task.name, "reason": reason, "enqueued_at": task.enqueued_at, "payload": task.payload}
+            with self._dead_letter_lock, open(self.dead_letter_path, "a", encoding="utf-8") as f:
+                f.write(json.dumps(record, default=str) + "\n")
+        except Exception as e:
+            logger.error(f"Could not write dead letter for {task.name}: {e}")
+
+    def stats(self) -> dict:
+        with self._cond:
+            stats = dict(self._stats)
+            stats["queue_depth"] = len(self._queue)
+            stats["in_progress"] = self._in_progress
+            # Lag: how long the oldest queued task has been waiting
+            stats["oldest_task_age"] = time.time() - self._queue[0].enqueued_at if self._queue else 0.0
+        return stats
+
+    def drain(self, timeout: Optional[float] = None) -> bool:
+        """Wait until every queued task has run; False if the timeout passed first"""
+        deadline = time.time() + timeout if timeout is not None else None
+        with self._cond:
+            while self._queue or self._in_progress:
+                remaining = deadline - time.time() if deadline is not None else None
+                if remaining is not None and remaining <= 0:
+                    return False
+                self._cond.wait(remaining)
+        return True
+
+    def shutdown(self, timeout: float = BACKGROUND_DRAIN_TIMEOUT):
+        """Stop accepting tasks, finish the queued ones (up to timeout) and stop the workers"""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        if not self.drain(timeout):
+            with self._cond:
+                left = list(self._queue)
+                self._queue.clear()
+            logger.warning(f"Background queue not drained within {timeout}s, {len(left)} tasks left")
+            for task in left:
+                self._dead_letter(task, "shutdown")
+
+
+_background_tasks = None
+_background_tasks_lock = threading.Lock()
+
+def get_background_tasks() -> BackgroundTaskService:
+    """Shared service; drained when the process exits"""
+    global _background_tasks
+    if _background_tasks is None:
+        with _background_tasks_lock:
+            if _background_tasks is None:
+                _background_tasks = BackgroundTaskService()
+                atexit.register(_background_tasks.shutdown)
+    return _background_tasks
@@ -1,7 +1,48 @@
-from flask import current_app
+import os
+import threading
+
+from pymongo import MongoClient, monitoring
+
+from app.services.metrics import record_call
+
+# Database used when MONGODB_URI names none
+MONGODB_DATABASE = os.getenv("MONGODB_DATABASE", "LLM")
+MONGODB_MAX_POOL_SIZE = int(os.getenv("MONGODB_MAX_POOL_SIZE", 20))
+
+
+class MongoCommandMetrics(monitoring.CommandListener):
+    """Times every command the client sends (inserts, finds, index builds) for the metrics registry"""
+
+    def started(self, event):
+        pass
+
+    def succeeded(self, event):
+        record_call("mongo", event.command_name, event.duration_micros / 1e6)
+
+    def failed(self, event):
+        record_call("mongo", event.command_name, event.duration_micros / 1e6, status="error")
+
+
+_mongo_client = None
+_mongo_client_lock = threading.Lock()
+
+def get_mongo_client():
+    """One pooled MongoClient per process, usable from request and background threads alike"""
+    global _mongo_client
+    if _mongo_client is None:
+        with _mongo_client_lock:
+            if _mongo_client is None:
+                _mongo_client = MongoClient(os.getenv("MONGODB_URI"), maxPoolSize=MONGODB_MAX_POOL_SIZE,
+                                           event_listeners=[MongoCommandMetrics()])
+    return _mongo_client
+
+def set_mongo_client(client):
+    """Swap in another client, e.g. mongomock.MongoClient() for local runs"""
+    global _mongo_client
+    _mongo_client = client
 
 def get_mongo_collection(collection_name):
-    db = current_app.mongo_client.get_default_database()
+    db = get_mongo_client().get_default_database(MONGODB_DATABASE)
     return db[collection_name]
 
 def save_document(collection_name, document):
@@ -11,5 +52,3 @@ def save_document(collection_name, document):
 def fetch_documents(collection_name, query={}, limit=10):
     collection = get_mongo_collection(collection_name)
     return list(collection.find(query).limit(limit))
-
-
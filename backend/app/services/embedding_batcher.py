@@ -0,0 +1,147 @@
+import asyncio
+import contextvars
+import threading
+import time
+from concurrent.futures import Future
+from typing import List
+
+from langchain_core.embeddings import Embeddings
+
+from app.utils.logging import setup_logger
+
+logger = setup_logger(__name__)
+
+
+class _BatchLane:
+    """Collects texts from concurrent callers and embeds them in one provider call.
+
+    Up to `max_in_flight` batches are sent at once; one worker at a time holds the
+    window open, the others are sending theirs. A batch is sent in the context of
+    its earliest caller, so that caller's rate_deadline() and rate_priority() apply.
+    """
+
+    def __init__(self, name, embed_batch, window_ms, max_batch_size, max_in_flight=1):
+        self.name = name
+        self.embed_batch = embed_batch
+        self.window = window_ms / 1000
+        self.max_batch_size = max_batch_size
+        self._pending = []
+        self._collecting = False
+        self._cond = threading.Condition()
+        self._stats = {"calls": 0, "texts": 0, "batches": 0, "failed_batches": 0}
+        self._workers = [
+            threading.Thread(target=self._run, name=f"embedding-batcher-{name}-{i}", daemon=True)
+            for i in range(max(1, max_in_flight))
+        ]
+        for worker in self._workers:
+            worker.start()
+
+    def enqueue(self, texts: List[str]) -> List[Future]:
+        futures = [Future() for _ in texts]
+        context = contextvars.copy_context()
+        with self._cond:
+            self._pending.extend((text, future, context) for text, future in zip(texts, futures))
+            self._stats["calls"] += 1
+            self._stats["texts"] += len(texts)
+            self._cond.notify_all()
+        return futures
+
+    def submit(self, texts: List[str]) -> List[List[float]]:
+        return [future.result() for future in self.enqueue(texts)]
+
+    async def asubmit(self, texts: List[str]) -> List[List[float]]:
+        return list(await asyncio.gather(*(asyncio.wrap_future(future) for future in self.enqueue(texts))))
+
+    def _take_batch(self):
+        with self._cond:
+            while self._collecting or not self._pending:
+                self._cond.wait()
+            self._collecting = True
+            # Hold the window open for more callers unless the batch is already full
+            deadline = time.monotonic() + self.window
+            while len(self._pending) < self.max_batch_size:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    break
+                self._cond.wait(remaining)
+            batch = self._pending[:self.max_batch_size]
+            del self._pending[:self.max_batch_size]
+            self._stats["batches"] += 1
+            # Let the next idle worker start collecting while this batch is sent
+            self._collecting = False
+            self._cond.notify_all()
+            return batch
+
+    def _run(self):
+        while True:
+            batch = self._take_batch()
+            try:
+                # A copy: one caller's texts can span batches sent at once, and a context can't be entered twice
+                vectors = batch[0][2].copy().run(self.embed_batch, [text for text, _, _ in batch])
+                # zip() would drop the extra callers and leave their futures waiting forever
+                if len(vectors) != len(batch):
+                    raise ValueError(f"Provider returned {len(vectors)} embeddings for {len(batch)} texts")
+                for (_, future, _), vector in zip(batch, vectors):
+                    future.set_result(vector)
+            except Exception as e:
+                logger.error(f"Batched {self.name} embedding failed ({len(batch)} texts): {e}")
+                with self._cond:
+                    self._stats["failed_batches"] += 1
+                for _, future, _ in batch:
+                    future.set_exception(e)
+
+    def stats(self) -> dict:
+        with self._cond:
+            stats = dict(self._stats)
+            stats["pending"] = len(self._pending)
+        stats["avg_batch_size"] = stats["texts"] / stats["batches"] if stats["batches"] else 0.0
+        return stats
+
+
+class BatchingEmbeddings(Embeddings):
+    """Micro-batches embed calls from concurrent threads into single provider requests.
+
+    Calls are held for up to `window_ms` (or until `max_batch_size` texts are
+    queued), sent as one batched request, and each vector is routed back to
+    its caller. Queries and documents use separate lanes because providers
+    such as Cohere embed them with different input types; each lane sends up
+    to `max_in_flight` batches concurrently.
+    """
+
+    def __init__(self, underlying: Embeddings, window_ms: float = 10, max_batch_size: int = 96, max_in_flight: int = 4):
+        self.underlying = underlying
+        self._documents = _BatchLane("document", underlying.embed_documents, window_ms, max_batch_size, max_in_flight)
+        self._queries = _BatchLane("query", self._embed_queries, window_ms, max_batch_size, max_in_flight)
+
+    def _embed_queries(self, texts: List[str]) -> List[List[float]]:
+        if hasattr(self.underlying, "embed_queries"):
+            return self.underlying.embed_queries(texts)
+        # CohereEmbeddings exposes a batched call with an explicit input type
+        if hasattr(self.underlying, "embed"):
+            return self.underlying.embed(texts, input_type="search_query")
+        return [self.underlying.embed_query(text) for text in texts]
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        if not texts:
+            return []
+        return self._documents.submit(texts)
+
+    def embed_query(self, text: str) -> List[float]:
+        return self._queries.submit([text])[0]
+
+    def embed_queries(self, texts: List[str]) -> List[List[float]]:
+        """Several query embeddings, sent together (max_batch_size texts per provider call)"""
+        if not texts:
+            return []
+        return self._queries.submit(texts)
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        if not texts:
+            return []
+        return await self._documents.asubmit(texts)
+
+    async def aembed_query(self, text: str) -> List[float]:
+        return (await self._queries.asubmit([text]))[0]
+
+    def stats(self) -> dict:
+        return {"documents": self._documents.stats(), "queries": self._queries.stats()}
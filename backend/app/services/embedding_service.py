@@ -1,5 +1,245 @@
-from langchain_cohere import CohereEmbeddings
+import hashlib
 import os
+import sqlite3
+import threading
+from collections import OrderedDict
+from typing import List
+
+import numpy as np
+from langchain_core.embeddings import Embeddings
+from langchain_cohere import CohereEmbeddings
+
+from app.services.embedding_batcher import BatchingEmbeddings
+from app.services.metrics import record_cache_lookup, timed_call
+from app.services.rate_limiter import rate_limited, arate_limited, estimate_tokens
+
+EMBEDDING_MODEL = os.getenv("EMBEDDING_MODEL", "embed-english-v3.0")
+# "cohere" in production, "fake" for a local deterministic embedder (tests, benchmarks, offline dev)
+EMBEDDING_PROVIDER = os.getenv("EMBEDDING_PROVIDER", "cohere")
+EMBEDDING_CACHE_SIZE = int(os.getenv("EMBEDDING_CACHE_SIZE", 10000))
+# Optional sqlite file for a cache tier that survives restarts; memory-only when unset
+EMBEDDING_CACHE_PATH = os.getenv("EMBEDDING_CACHE_PATH")
+# Coalesce concurrent provider calls for up to this many ms (0 disables batching)
+EMBEDDING_BATCH_WINDOW_MS = float(os.getenv("EMBEDDING_BATCH_WINDOW_MS", 10))
+EMBEDDING_BATCH_MAX_SIZE = int(os.getenv("EMBEDDING_BATCH_MAX_SIZE", 96))
+# Batched provider calls in flight at once per lane (queries, documents)
+EMBEDDING_BATCH_MAX_IN_FLIGHT = int(os.getenv("EMBEDDING_BATCH_MAX_IN_FLIGHT", 4))
+
+
+def normalize_text(text: str) -> str:
+    return " ".join(text.split())
+
+
+class RateLimitedEmbeddings(Embeddings):
+    """Sends every provider call through the provider's shared rate limiter"""
+
+    def __init__(self, underlying: Embeddings, provider: str):
+        self.underlying = underlying
+        self.provider = provider
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        with rate_limited(self.provider, estimate_tokens(*texts)):
+            return self.underlying.embed_documents(texts)
+
+    def embed_query(self, text: str) -> List[float]:
+        with rate_limited(self.provider, estimate_tokens(text)):
+            return self.underlying.embed_query(text)
+
+    def embed_queries(self, texts: List[str]) -> List[List[float]]:
+        # CohereEmbeddings exposes a batched call with an explicit input type
+        if not hasattr(self.underlying, "embed"):
+            return [self.embed_query(text) for text in texts]
+        with rate_limited(self.provider, estimate_tokens(*texts)):
+            return self.underlying.embed(texts, input_type="search_query")
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        async with arate_limited(self.provider, estimate_tokens(*texts)):
+            return await self.underlying.aembed_documents(texts)
+
+    async def aembed_query(self, text: str) -> List[float]:
+        async with arate_limited(self.provider, estimate_tokens(text)):
+            return await self.underlying.aembed_query(text)
+
+
+class CachedEmbeddings(Embeddings):
+    """Embeddings wrapper with an in-memory LRU tier and an optional sqlite tier.
+
+    Keys are sha256(model name, input kind, normalized text). Query and
+    document embeddings are cached separately because Cohere embeds them
+    with different input types.
+    """
+
+    def __init__(self, underlying: Embeddings, model_name: str, max_size: int = 10000, db_path: str = None):
+        self.underlying = underlying
+        self.model_name = model_name
+        self.max_size = max_size
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._stats = {"memory_hits": 0, "disk_hits": 0, "misses": 0}
+        self._db = None
+        if db_path:
+            os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+            self._db = sqlite3.connect(db_path, check_same_thread=False)
+            self._db.execute("PRAGMA journal_mode=WAL")
+            self._db.execute("CREATE TABLE IF NOT EXISTS embeddings (key TEXT PRIMARY KEY, vector BLOB NOT NULL)")
+            self._db.commit()
+
+    def _key(self, kind: str, text: str) -> str:
+        payload = f"{self.model_name}\x00{kind}\x00{normalize_text(text)}"
+        return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+    def _get(self, key):
+        vector = self._lookup(key)
+        record_cache_lookup("embedding", vector is not None)
+        return vector
+
+    def _lookup(self, key):
+        with self._lock:
+            vector = self._memory.get(key)
+            if vector is not None:
+                self._memory.move_to_end(key)
+                self._stats["memory_hits"] += 1
+                return vector
+            if self._db is not None:
+                row = self._db.execute("SELECT vector FROM embeddings WHERE key = ?", (key,)).fetchone()
+                if row is not None:
+                    vector = np.frombuffer(row[0], dtype=np.float32).tolist()
+                    self._remember(key, vector)
+                    self._stats["disk_hits"] += 1
+                    return vector
+            self._stats["misses"] += 1
+            return None
+
+    def _remember(self, key, vector):
+        self._memory[key] = vector
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_size:
+            self._memory.popitem(last=False)
+
+    def _put_many(self, items):
+        with self._lock:
+            for key, vector in items:
+                self._remember(key, vector)
+            if self._db is not None:
+                self._db.executemany(
+                    "INSERT OR REPLACE INTO embeddings (key, vector) VALUES (?, ?)",
+                    [(key, np.asarray(vector, dtype=np.float32).tobytes()) for key, vector in items]
+                )
+                self._db.commit()
+
+    def embed_documents(self, texts: List[str]) -> List[List[float]]:
+        keys = [self._key("document", text) for text in texts]
+        vectors = [self._get(key) for key in keys]
+
+        missing = {}
+        for key, text, vector in zip(keys, texts, vectors):
+            if vector is None and key not in missing:
+                missing[key] = text
+        if missing:
+            with timed_call("embedding", "embed_documents"):
+                computed = self.underlying.embed_documents(list(missing.values()))
+            fresh = dict(zip(missing.keys(), computed))
+            self._put_many(list(fresh.items()))
+            vectors = [vector if vector is not None else fresh[key] for key, vector in zip(keys, vectors)]
+        return vectors
+
+    def embed_query(self, text: str) -> List[float]:
+        key = self._key("query", text)
+        vector = self._get(key)
+        if vector is None:
+            with timed_call("embedding", "embed_query"):
+                vector = self.underlying.embed_query(text)
+            self._put_many([(key, vector)])
+        return vector
+
+    def embed_queries(self, texts: List[str]) -> List[List[float]]:
+        """Query embeddings for many texts; the uncached ones in one batched provider call when it has one"""
+        keys = [self._key("query", text) for text in texts]
+        vectors = [self._get(key) for key in keys]
+
+        missing = {}
+        for key, text, vector in zip(keys, texts, vectors):
+            if vector is None and key not in missing:
+                missing[key] = text
+        if missing:
+            embed_queries = getattr(self.underlying, "embed_queries", None)
+            with timed_call("embedding", "embed_queries"):
+                if embed_queries is not None:
+                    computed = embed_queries(list(missing.values()))
+                else:
+                    computed = [self.underlying.embed_query(text) for text in missing.values()]
+            fresh = dict(zip(missing.keys(), computed))
+            self._put_many(list(fresh.items()))
+            vectors = [vector if vector is not None else fresh[key] for key, vector in zip(keys, vectors)]
+        return vectors
+
+    async def aembed_documents(self, texts: List[str]) -> List[List[float]]:
+        keys = [self._key("document", text) for text in texts]
+        vectors = [self._get(key) for key in keys]
+
+        missing = {}
+        for key, text, vector in zip(keys, texts, vectors):
+            if vector is None and key not in missing:
+                missing[key] = text
+        if missing:
+            with timed_call("embedding", "embed_documents"):
+                computed = await self.underlying.aembed_documents(list(missing.values()))
+            fresh = dict(zip(missing.keys(), computed))
+            self._put_many(list(fresh.items()))
+            vectors = [vector if vector is not None else fresh[key] for key, vector in zip(keys, vectors)]
+        return vectors
+
+    async def aembed_query(self, text: str) -> List[float]:
+        key = self._key("query", text)
+        vector = self._get(key)
+        if vector is None:
+            with timed_call("embedding", "embed_query"):
+                vector = await self.underlying.aembed_query(text)
+            self._put_many([(key, vector)])
+        return vector
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats)
+            stats["memory_entries"] = len(self._memory)
+        lookups = stats["memory_hits"] + stats["disk_hits"] + stats["misses"]
+        stats["hit_rate"] = (stats["memory_hits"] + stats["disk_hits"]) / lookups if lookups else 0.0
+        return stats
+
+    def clear(self):
+        with self._lock:
+            self._memory.clear()
+            if self._db is not None:
+                self._db.execute("DELETE FROM embeddings")
+                self._db.commit()
+
+
+_embedding_model = None
+_embedding_lock = threading.Lock()
+
+def _build_provider():
+    if EMBEDDING_PROVIDER == "fake":
+        from langchain_community.embeddings import DeterministicFakeEmbedding
+        provider = DeterministicFakeEmbedding(size=1024)
+    else:
+        provider = RateLimitedEmbeddings(
+            CohereEmbeddings(cohere_api_key=os.getenv("COHERE_API_KEY"), model=EMBEDDING_MODEL), "cohere"
+        )
+    if EMBEDDING_BATCH_WINDOW_MS > 0:
+        provider = BatchingEmbeddings(provider, window_ms=EMBEDDING_BATCH_WINDOW_MS, max_batch_size=EMBEDDING_BATCH_MAX_SIZE,
+                                      max_in_flight=EMBEDDING_BATCH_MAX_IN_FLIGHT)
+    return provider
 
 def get_embedding_model():
-    return CohereEmbeddings(cohere_api_key=os.getenv("COHERE_API_KEY"), model="embed-english-v3.0" )
+    """Process-wide cached embedding model shared by the pipeline and tools"""
+    global _embedding_model
+    if _embedding_model is None:
+        with _embedding_lock:
+            if _embedding_model is None:
+                _embedding_model = CachedEmbeddings(
+                    _build_provider(),
+                    model_name=f"{EMBEDDING_PROVIDER}:{EMBEDDING_MODEL}",
+                    max_size=EMBEDDING_CACHE_SIZE,
+                    db_path=EMBEDDING_CACHE_PATH
+                )
+    return _embedding_model
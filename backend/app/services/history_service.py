@@ -0,0 +1,168 @@
+import base64
+import json
+import re
+import threading
+import time
+from datetime import datetime
+from typing import Optional
+
+from bson import ObjectId
+from pymongo import ASCENDING, DESCENDING
+
+from app.services.db_service import get_mongo_collection
+from app.services.results_store import RESULTS_COLLECTION, query_terms
+from app.utils.logging import setup_logger
+
+logger = setup_logger(__name__)
+
+HISTORY_DEFAULT_LIMIT = 20
+HISTORY_MAX_LIMIT = 100
+# Attempts at creating the indexes while MongoDB is unreachable, backing off up to a minute
+HISTORY_INDEX_ATTEMPTS = 6
+# Listings leave out the stage texts under "result" unless asked for
+LISTING_FIELDS = ("query", "mode", "status", "created_at", "execution_time", "degraded")
+FIELD_PATTERN = re.compile(r"^[A-Za-z_]\w*(\.[A-Za-z_]\w*)?$")
+
+NEWEST_FIRST = [("created_at", DESCENDING), ("_id", DESCENDING)]
+# Each filter combination has an index ending in the sort keys, so a page is one index range scan.
+# Word search matches one term on the multikey query_terms index, which also yields the sort
+# order; a $text query can't be sorted by its index and would sort every match in memory.
+HISTORY_INDEXES = [
+    NEWEST_FIRST,
+    [("mode", ASCENDING)] + NEWEST_FIRST,
+    [("status", ASCENDING)] + NEWEST_FIRST,
+    [("mode", ASCENDING), ("status", ASCENDING)] + NEWEST_FIRST,
+    [("query_terms", ASCENDING)] + NEWEST_FIRST,
+]
+
+
+def ensure_history_indexes():
+    """Create the indexes behind the history API (no-op when they exist) and add query_terms to older runs"""
+    collection = get_mongo_collection(RESULTS_COLLECTION)
+    for keys in HISTORY_INDEXES:
+        collection.create_index(keys)
+    # One-time backfill of runs saved before query_terms existed
+    for document in collection.find({"query_terms": {"$exists": False}, "query": {"$type": "string"}}, {"query": 1}):
+        collection.update_one({"_id": document["_id"]}, {"$set": {"query_terms": query_terms(document["query"])}})
+
+
+def start_history_index_build():
+    """
+    ensure_history_indexes() on its own thread, retried with backoff while MongoDB is
+    unreachable, so startup doesn't wait and no shared background worker is held meanwhile
+    """
+    def build():
+        for attempt in range(HISTORY_INDEX_ATTEMPTS):
+            try:
+                ensure_history_indexes()
+                return
+            except Exception as e:
+                if attempt + 1 == HISTORY_INDEX_ATTEMPTS:
+                    logger.error(f"History indexes not created after {attempt + 1} attempts: {e}")
+                    return
+                delay = min(60, 2 ** attempt)
+                logger.warning(f"History indexes not created ({e}), retry {attempt + 1} in {delay}s")
+                time.sleep(delay)
+
+    threading.Thread(target=build, name="history-indexes", daemon=True).start()
+
+
+def encode_cursor(document: dict) -> str:
+    raw = json.dumps([document["created_at"].isoformat(), str(document["_id"])])
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+
+def decode_cursor(cursor: str) -> tuple:
+    """(created_at, _id) of the last item of the previous page; ValueError if malformed"""
+    try:
+        created_at, object_id = json.loads(base64.urlsafe_b64decode(cursor.encode()))
+        return datetime.fromisoformat(created_at), ObjectId(object_id)
+    except Exception:
+        raise ValueError("Invalid 'cursor'")
+
+
+def parse_fields(fields: Optional[str]) -> list:
+    """Comma-separated top-level fields or result.<stage>; defaults to the listing fields"""
+    if not fields:
+        return list(LISTING_FIELDS)
+    names = [name.strip() for name in fields.split(",") if name.strip()]
+    for name in names:
+        if not FIELD_PATTERN.match(name):
+            raise ValueError(f"Invalid field '{name}'")
+    return names
+
+
+def build_projection(fields: list) -> dict:
+    """Inclusion projection of the fields; result.draft is dropped when result is selected, as MongoDB rejects the overlap"""
+    selected = set(fields)
+    return {name: 1 for name in fields if "." not in name or name.partition(".")[0] not in selected}
+
+
+def serialize(document: dict) -> dict:
+    """ObjectIds and datetimes as strings, so the document is valid JSON"""
+    def convert(value):
+        if isinstance(value, ObjectId):
+            return str(value)
+        if isinstance(value, datetime):
+            return value.isoformat()
+        if isinstance(value, dict):
+            return {key: convert(item) for key, item in value.items()}
+        if isinstance(value, list):
+            return [convert(item) for item in value]
+        return value
+    return convert(document)
+
+
+def list_results(q: Optional[str] = None, mode: Optional[str] = None, status: Optional[str] = None,
+                 since: Optional[datetime] = None, until: Optional[datetime] = None, cursor: Optional[str] = None,
+                 limit: int = HISTORY_DEFAULT_LIMIT, fields: Optional[list] = None) -> dict:
+    """
+    One page of saved runs, newest first, as {"items": [...], "next_cursor": ...}.
+    Pages are keyset-paginated on (created_at, _id): passing next_cursor back
+    continues after the last item, at the same cost however deep the page is.
+    """
+    conditions = []
+    terms = query_terms(q) if q else []
+    if terms:
+        # Runs whose query contains every word
+        conditions.append({"query_terms": {"$all": terms}})
+    if mode:
+        conditions.append({"mode": mode})
+    if status:
+        conditions.append({"status": status})
+    if since or until:
+        created_at = {}
+        if since:
+            created_at["$gte"] = since
+        if until:
+            created_at["$lt"] = until
+        conditions.append({"created_at": created_at})
+    if cursor:
+        created_at, object_id = decode_cursor(cursor)
+        conditions.append({"$or": [
+            {"created_at": {"$lt": created_at}},
+            {"created_at": created_at, "_id": {"$lt": object_id}},
+        ]})
+
+    limit = max(1, min(limit, HISTORY_MAX_LIMIT))
+    # created_at is always fetched: the next cursor is built from it
+    projection = build_projection(list(fields or LISTING_FIELDS) + ["created_at"])
+    documents = list(
+        get_mongo_collection(RESULTS_COLLECTION)
+        .find({"$and": conditions} if conditions else {}, projection)
+        .sort(NEWEST_FIRST)
+        .limit(limit + 1)
+    )
+    next_cursor = encode_cursor(documents[limit - 1]) if len(documents) > limit else None
+    return {"items": [serialize(document) for document in documents[:limit]], "next_cursor": next_cursor}
+
+
+def get_result(result_id: str, fields: Optional[list] = None) -> Optional[dict]:
+    """A saved run by id (all fields unless given); None if unknown"""
+    try:
+        object_id = ObjectId(result_id)
+    except Exception:
+        return None
+    projection = build_projection(fields) if fields else None
+    document = get_mongo_collection(RESULTS_COLLECTION).find_one({"_id": object_id}, projection)
+    return serialize(document) if document is not None else None
@@ -0,0 +1,352 @@
+import heapq
+import itertools
+import json
+import os
+import socket
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Optional
+
+from app.agents.pipeline_agent import iter_pipeline_events
+from app.services.tracing import continue_trace
+from app.utils.logging import setup_logger
+
+logger = setup_logger(__name__)
+
+JOB_QUEUE_BACKEND = os.getenv("JOB_QUEUE_BACKEND", "memory")
+JOB_QUEUE_PATH = os.getenv("JOB_QUEUE_PATH", "app/storage/jobs.sqlite")
+# Worker threads per mode (preset name, "default" when the request names none)
+JOB_WORKERS = os.getenv("JOB_WORKERS", "express=4,balanced=2,comprehensive=2,quality_focused=1,auto=2,default=2")
+# Queued (not yet running) jobs allowed per mode before submissions are refused
+JOB_QUEUE_MAX_PENDING = int(os.getenv("JOB_QUEUE_MAX_PENDING", 100))
+# Finished jobs are kept this long for GET /runs/<id>
+JOB_RETENTION_SECONDS = float(os.getenv("JOB_RETENTION_SECONDS", 24 * 3600))
+# A running job's owner renews its lease every third of this; a job whose lease ran out
+# (its process died) is claimed again by any worker sharing the store
+JOB_LEASE_SECONDS = float(os.getenv("JOB_LEASE_SECONDS", 60))
+
+FINISHED_STATUSES = ("succeeded", "failed")
+
+
+class QueueFullError(Exception):
+    """The mode's queue already holds JOB_QUEUE_MAX_PENDING jobs"""
+
+
+def parse_workers(spec: str) -> dict:
+    """"express=4,balanced=2" -> {"express": 4, "balanced": 2}"""
+    workers = {}
+    for part in spec.split(","):
+        if part.strip():
+            mode, count = part.split("=")
+            workers[mode.strip()] = int(count)
+    return workers
+
+
+class InMemoryJobStore:
+    """Jobs in a dict, with one priority heap of queued job ids per mode"""
+
+    def __init__(self):
+        self._jobs = {}
+        self._queues = {}  # mode -> heap of (-priority, seq, job_id)
+        self._seq = itertools.count()
+        self._lock = threading.Lock()
+
+    def add(self, job: dict):
+        with self._lock:
+            self._jobs[job["id"]] = dict(job)
+            heapq.heappush(self._queues.setdefault(job["mode"], []), (-job["priority"], next(self._seq), job["id"]))
+
+    def claim(self, mode: str) -> Optional[dict]:
+        """Mark the mode's highest-priority queued job running and return it"""
+        with self._lock:
+            queue = self._queues.get(mode)
+            while queue:
+                _, _, job_id = heapq.heappop(queue)
+                job = self._jobs.get(job_id)
+                if job is not None and job["status"] == "queued":
+                    job.update(status="running", started_at=time.time())
+                    return dict(job)
+            return None
+
+    def renew(self, job_ids: list):
+        """Nothing to renew: the jobs die with the process that holds them"""
+
+    def update(self, job_id: str, **fields):
+        with self._lock:
+            if job_id in self._jobs:
+                self._jobs[job_id].update(fields)
+
+    def get(self, job_id: str) -> Optional[dict]:
+        with self._lock:
+            job = self._jobs.get(job_id)
+            return dict(job) if job is not None else None
+
+    def pending(self, mode: str) -> int:
+        with self._lock:
+            return sum(1 for job in self._jobs.values() if job["mode"] == mode and job["status"] == "queued")
+
+    def counts(self) -> dict:
+        counts = {}
+        with self._lock:
+            for job in self._jobs.values():
+                by_status = counts.setdefault(job["mode"], {})
+                by_status[job["status"]] = by_status.get(job["status"], 0) + 1
+        return counts
+
+    def purge(self, finished_before: float):
+        with self._lock:
+            expired = [job_id for job_id, job in self._jobs.items()
+                       if job["status"] in FINISHED_STATUSES and job["finished_at"] < finished_before]
+            for job_id in expired:
+                del self._jobs[job_id]
+
+
+class SqliteJobStore:
+    """
+    Jobs in a sqlite table, so queued and finished runs survive a restart and several
+    processes can share one queue. A claimed job carries its owner and a lease that the
+    owner keeps renewing; a "running" job whose lease has expired (its process died or
+    restarted) is claimed again, while jobs other live processes are running are left alone.
+    """
+
+    _COLUMNS = ("id", "mode", "priority", "status", "params", "stages", "result", "error",
+                "created_at", "started_at", "finished_at")
+    _JSON_COLUMNS = ("params", "stages", "result")
+
+    def __init__(self, db_path: str = JOB_QUEUE_PATH, lease_seconds: float = JOB_LEASE_SECONDS):
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+        self.owner = f"{socket.gethostname()}:{os.getpid()}:{uuid.uuid4().hex[:8]}"
+        self.lease_seconds = lease_seconds
+        self._db = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None)
+        self._lock = threading.Lock()
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS jobs (id TEXT PRIMARY KEY, mode TEXT NOT NULL, priority INTEGER NOT NULL, "
+            "status TEXT NOT NULL, params TEXT, stages TEXT, result TEXT, error TEXT, "
+            "created_at REAL NOT NULL, started_at REAL, finished_at REAL, owner TEXT, lease_until REAL)"
+        )
+        # Tables created before leases existed
+        existing = {row[1] for row in self._db.execute("PRAGMA table_info(jobs)")}
+        for column, kind in (("owner", "TEXT"), ("lease_until", "REAL")):
+            if column not in existing:
+                self._db.execute(f"ALTER TABLE jobs ADD COLUMN {column} {kind}")
+        self._db.execute("CREATE INDEX IF NOT EXISTS jobs_queue ON jobs (mode, status, priority DESC, created_at)")
+
+    def _row_to_job(self, row) -> dict:
+        job = dict(zip(self._COLUMNS, row))
+        for column in self._JSON_COLUMNS:
+            job[column] = json.loads(job[column]) if job[column] is not None else None
+        return job
+
+    def add(self, job: dict):
+        values = [json.dumps(job.get(column), default=str) if column in self._JSON_COLUMNS else job.get(column)
+                  for column in self._COLUMNS]
+        with self._lock:
+            self._db.execute(f"INSERT INTO jobs ({', '.join(self._COLUMNS)}) VALUES ({', '.join('?' * len(self._COLUMNS))})",
+                             values)
+
+    def claim(self, mode: str) -> Optional[dict]:
+        """The mode's highest-priority queued job, or a running one whose lease expired, leased to this store"""
+        with self._lock:
+            self._db.execute("BEGIN IMMEDIATE")
+            try:
+                now = time.time()
+                # lease_until IS NULL: left running by a version without leases
+                row = self._db.execute(
+                    f"SELECT {', '.join(self._COLUMNS)} FROM jobs WHERE mode = ? AND (status = 'queued' "
+                    "OR (status = 'running' AND (lease_until IS NULL OR lease_until < ?))) "
+                    "ORDER BY priority DESC, created_at LIMIT 1", (mode, now)
+                ).fetchone()
+                if row is None:
+                    return None
+                job = self._row_to_job(row)
+                if job["status"] == "running":
+                    logger.info(f" Re-claiming job {job['id']}, its lease expired")
+                job.update(status="running", started_at=now)
+                self._db.execute("UPDATE jobs SET status = 'running', started_at = ?, owner = ?, lease_until = ? WHERE id = ?",
+                                 (now, self.owner, now + self.lease_seconds, job["id"]))
+                return job
+            finally:
+                self._db.execute("COMMIT")
+
+    def renew(self, job_ids: list):
+        """Extend the leases of this store's running jobs"""
+        if not job_ids:
+            return
+        with self._lock:
+            self._db.execute(
+                f"UPDATE jobs SET lease_until = ? WHERE status = 'running' AND owner = ? "
+                f"AND id IN ({', '.join('?' * len(job_ids))})",
+                [time.time() + self.lease_seconds, self.owner] + list(job_ids)
+            )
+
+    def update(self, job_id: str, **fields):
+        columns = ", ".join(f"{column} = ?" for column in fields)
+        values = [json.dumps(value, default=str) if column in self._JSON_COLUMNS else value
+                  for column, value in fields.items()]
+        with self._lock:
+            self._db.execute(f"UPDATE jobs SET {columns} WHERE id = ?", values + [job_id])
+
+    def get(self, job_id: str) -> Optional[dict]:
+        with self._lock:
+            row = self._db.execute(f"SELECT {', '.join(self._COLUMNS)} FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return self._row_to_job(row) if row is not None else None
+
+    def pending(self, mode: str) -> int:
+        with self._lock:
+            return self._db.execute("SELECT COUNT(*) FROM jobs WHERE mode = ? AND status = 'queued'", (mode,)).fetchone()[0]
+
+    def counts(self) -> dict:
+        counts = {}
+        with self._lock:
+            rows = self._db.execute("SELECT mode, status, COUNT(*) FROM jobs GROUP BY mode, status").fetchall()
+        for mode, status, count in rows:
+            counts.setdefault(mode, {})[status] = count
+        return counts
+
+    def purge(self, finished_before: float):
+        with self._lock:
+            self._db.execute("DELETE FROM jobs WHERE status IN ('succeeded', 'failed') AND finished_at < ?",
+                             (finished_before,))
+
+
+def run_pipeline_job(job: dict, on_stage):
+    """Run a job's pipeline, reporting each completed stage to on_stage(event); returns the result"""
+    params = job["params"]
+    result = None
+    # The worker continues the submitter's trace, if it sent one
+    with continue_trace(params.get("traceparent")):
+        for event in iter_pipeline_events(params["query"], config=params.get("config"),
+                                          latency_budget=params.get("latency_budget"),
+                                          deadline_ms=params.get("deadline_ms")):
+            if event["event"] == "stage":
+                on_stage(event)
+            elif event["event"] == "result":
+                result = event["result"]
+    return result
+
+
+class JobQueue:
+    """
+    Pipeline runs executed off the request thread. Each mode has its own queue
+    and a fixed number of worker threads, so a burst of slow comprehensive runs
+    can't hold up express ones; within a mode, higher priority runs first.
+    """
+
+    def __init__(self, store, workers: dict, runner=run_pipeline_job, max_pending: int = JOB_QUEUE_MAX_PENDING):
+        self.store = store
+        self.workers = workers
+        self._runner = runner
+        self._max_pending = max_pending
+        self._wakeup = threading.Condition()
+        self._stopping = False
+        self._running = set()
+        self._running_lock = threading.Lock()
+        self._threads = [threading.Thread(target=self._renew_leases, name="job-leases", daemon=True)]
+        self._threads[0].start()
+        for mode, count in workers.items():
+            for i in range(count):
+                thread = threading.Thread(target=self._work, args=(mode,), name=f"job-{mode}-{i}", daemon=True)
+                thread.start()
+                self._threads.append(thread)
+
+    def submit(self, params: dict, mode: str, priority: int = 0) -> dict:
+        """Queue a run; raises ValueError for a mode without workers, QueueFullError when its queue is full"""
+        if mode not in self.workers:
+            raise ValueError(f"No workers for mode '{mode}'")
+        if self.store.pending(mode) >= self._max_pending:
+            raise QueueFullError(f"Too many queued '{mode}' runs")
+        self.store.purge(time.time() - JOB_RETENTION_SECONDS)
+
+        job = {
+            "id": uuid.uuid4().hex,
+            "mode": mode,
+            "priority": priority,
+            "status": "queued",
+            "params": params,
+            "stages": {},
+            "result": None,
+            "error": None,
+            "created_at": time.time(),
+            "started_at": None,
+            "finished_at": None,
+        }
+        self.store.add(job)
+        with self._wakeup:
+            self._wakeup.notify_all()
+        return job
+
+    def get(self, job_id: str) -> Optional[dict]:
+        return self.store.get(job_id)
+
+    def _work(self, mode: str):
+        while not self._stopping:
+            job = self.store.claim(mode)
+            if job is None:
+                # The timeout also picks up jobs another process added to a shared sqlite store
+                with self._wakeup:
+                    self._wakeup.wait(timeout=1)
+                continue
+            self._run(job)
+
+    def _renew_leases(self):
+        """Keep the leases of this process's running jobs ahead of expiry"""
+        while not self._stopping:
+            with self._wakeup:
+                self._wakeup.wait(timeout=JOB_LEASE_SECONDS / 3)
+            with self._running_lock:
+                job_ids = list(self._running)
+            try:
+                self.store.renew(job_ids)
+            except Exception as e:
+                logger.error(f"Could not renew job leases: {e}")
+
+    def _run(self, job: dict):
+        with self._running_lock:
+            self._running.add(job["id"])
+        try:
+            self._execute(job)
+        finally:
+            with self._running_lock:
+                self._running.discard(job["id"])
+
+    def _execute(self, job: dict):
+        stages = {}
+
+        def on_stage(event):
+            stages[event["stage"]] = {key: event.get(key) for key in ("result", "status", "elapsed", "at")}
+            self.store.update(job["id"], stages=dict(stages))
+
+        logger.info(f" Job {job['id']} ({job['mode']}) started")
+        try:
+            result = self._runner(job, on_stage)
+            self.store.update(job["id"], status="succeeded", result=result, finished_at=time.time())
+            logger.info(f" Job {job['id']} succeeded")
+        except Exception as e:
+            logger.error(f"Job {job['id']} failed: {e}")
+            self.store.update(job["id"], status="failed", error=str(e), finished_at=time.time())
+
+    def stats(self) -> dict:
+        return {"workers": dict(self.workers), "jobs": self.store.counts()}
+
+    def stop(self):
+        """Let workers exit after their current job"""
+        self._stopping = True
+        with self._wakeup:
+            self._wakeup.notify_all()
+
+
+_job_queue = None
+_job_queue_lock = threading.Lock()
+
+def get_job_queue() -> JobQueue:
+    """Shared queue; workers start on first use"""
+    global _job_queue
+    if _job_queue is None:
+        with _job_queue_lock:
+            if _job_queue is None:
+                store = SqliteJobStore() if JOB_QUEUE_BACKEND == "sqlite" else InMemoryJobStore()
+                _job_queue = JobQueue(store, parse_workers(JOB_WORKERS))
+    return _job_queue
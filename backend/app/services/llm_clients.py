@@ -0,0 +1,191 @@
+import os
+import threading
+from typing import Optional
+
+import httpx
+from langchain.chains import LLMChain
+from langchain_groq import ChatGroq
+
+from app.services.rate_limiter import GROQ_COMPLETION_TOKENS_ESTIMATE, get_rate_limiter
+from app.utils.logging import setup_logger
+from app.utils.streaming import ContextTokenHandler
+
+logger = setup_logger(__name__)
+
+LLM_MODEL = os.getenv("LLM_MODEL", "llama3-70b-8192")
+LLM_DEFAULT_TEMPERATURE = float(os.getenv("LLM_DEFAULT_TEMPERATURE", 0.7))
+# In-flight requests per model; further calls wait for a free connection
+LLM_MAX_CONCURRENCY = int(os.getenv("LLM_MAX_CONCURRENCY", 8))
+LLM_KEEPALIVE_EXPIRY = float(os.getenv("LLM_KEEPALIVE_EXPIRY", 60))
+LLM_REQUEST_TIMEOUT = float(os.getenv("LLM_REQUEST_TIMEOUT", 60))
+
+
+class _ModelPool:
+    """Keep-alive HTTP clients shared by every ChatGroq for one model.
+
+    HTTP/1.1 sends one request per connection, so capping the pool at
+    LLM_MAX_CONCURRENCY connections is also the model's concurrency limit:
+    extra requests queue for a connection instead of failing (pool timeout off).
+    """
+
+    def __init__(self, model: str, max_concurrency: int = LLM_MAX_CONCURRENCY):
+        self.model = model
+        self.max_concurrency = max_concurrency
+        self._lock = threading.Lock()
+        self._stats = {"requests": 0, "new_connections": 0}
+        limits = httpx.Limits(max_connections=max_concurrency, max_keepalive_connections=max_concurrency,
+                              keepalive_expiry=LLM_KEEPALIVE_EXPIRY)
+        timeout = httpx.Timeout(LLM_REQUEST_TIMEOUT, pool=None)
+        self.http_client = httpx.Client(limits=limits, timeout=timeout,
+                                        event_hooks={"request": [self._on_request], "response": [self._on_response]})
+        self.http_async_client = httpx.AsyncClient(limits=limits, timeout=timeout,
+                                                   event_hooks={"request": [self._aon_request],
+                                                                "response": [self._aon_response]})
+
+    def _count(self, key: str):
+        with self._lock:
+            self._stats[key] += 1
+
+    @staticmethod
+    def _request_tokens(request) -> int:
+        """Prompt tokens of a chat request, estimated from its JSON body, plus the expected completion"""
+        try:
+            return len(request.content) // 4 + GROQ_COMPLETION_TOKENS_ESTIMATE
+        except httpx.RequestNotRead:
+            return GROQ_COMPLETION_TOKENS_ESTIMATE
+
+    # httpcore reports connection setup through the request's "trace" extension.
+    # Every request first waits for Groq's rate limit, whichever tool, agent or chain sent it.
+    def _on_request(self, request):
+        self._count("requests")
+        request.extensions["trace"] = self._trace
+        get_rate_limiter("groq").acquire(self._request_tokens(request))
+
+    def _on_response(self, response):
+        get_rate_limiter("groq").observe_headers(response.status_code, response.headers)
+
+    def _trace(self, event: str, info: dict):
+        if event == "connection.connect_tcp.complete":
+            self._count("new_connections")
+
+    async def _aon_request(self, request):
+        self._count("requests")
+        request.extensions["trace"] = self._atrace
+        await get_rate_limiter("groq").aacquire(self._request_tokens(request))
+
+    async def _aon_response(self, response):
+        self._on_response(response)
+
+    async def _atrace(self, event: str, info: dict):
+        self._trace(event, info)
+
+    @staticmethod
+    def _open_connections(client) -> int:
+        try:
+            return len(client._transport._pool.connections)
+        except AttributeError:
+            return 0
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats)
+        stats["connection_reuse_rate"] = (
+            1 - stats["new_connections"] / stats["requests"] if stats["requests"] else 0.0
+        )
+        stats["open_connections"] = (self._open_connections(self.http_client)
+                                     + self._open_connections(self.http_async_client))
+        stats["max_concurrency"] = self.max_concurrency
+        return stats
+
+
+class LLMClientRegistry:
+    """
+    Process-wide ChatGroq clients keyed by (model, temperature, streaming), all
+    clients of a model sharing one keep-alive connection pool. Chains built from
+    a registered prompt are cached by name, so tools, agents and chains stop
+    constructing a client (and a TLS connection) per call.
+    """
+
+    def __init__(self):
+        self._pools = {}
+        self._llms = {}
+        self._chains = {}
+        self._lock = threading.Lock()
+        self._stats = {"llm_hits": 0, "llm_misses": 0, "chain_hits": 0, "chain_misses": 0}
+
+    def _pool(self, model: str) -> _ModelPool:
+        if model not in self._pools:
+            self._pools[model] = _ModelPool(model)
+        return self._pools[model]
+
+    def get_llm(self, temperature: float = LLM_DEFAULT_TEMPERATURE, model: Optional[str] = None,
+                streaming: bool = False) -> ChatGroq:
+        """Shared client; streaming ones forward tokens to the caller's token sink"""
+        model = model or LLM_MODEL
+        key = (model, temperature, streaming)
+        with self._lock:
+            if key in self._llms:
+                self._stats["llm_hits"] += 1
+                return self._llms[key]
+            self._stats["llm_misses"] += 1
+            pool = self._pool(model)
+            kwargs = {"streaming": True, "callbacks": [ContextTokenHandler()]} if streaming else {}
+            llm = ChatGroq(
+                groq_api_key=os.getenv("GROQ_API_KEY"),
+                model=model,
+                temperature=temperature,
+                http_client=pool.http_client,
+                http_async_client=pool.http_async_client,
+                **kwargs
+            )
+            self._llms[key] = llm
+            logger.info(f" Created LLM client {model} (temperature={temperature}, streaming={streaming})")
+            return llm
+
+    def get_chain(self, name: str, prompt, temperature: float = LLM_DEFAULT_TEMPERATURE,
+                  model: Optional[str] = None, streaming: bool = False) -> LLMChain:
+        """LLMChain for a module-level (precompiled) prompt, built once per name"""
+        with self._lock:
+            if name in self._chains:
+                self._stats["chain_hits"] += 1
+                return self._chains[name]
+            self._stats["chain_misses"] += 1
+        chain = LLMChain(llm=self.get_llm(temperature, model, streaming), prompt=prompt)
+        with self._lock:
+            return self._chains.setdefault(name, chain)
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats)
+            pools = list(self._pools.values())
+            stats["clients"] = len(self._llms)
+            stats["chains"] = len(self._chains)
+        lookups = stats["llm_hits"] + stats["llm_misses"]
+        stats["client_reuse_rate"] = stats["llm_hits"] / lookups if lookups else 0.0
+        stats["http"] = {pool.model: pool.stats() for pool in pools}
+        stats["open_connections"] = sum(http["open_connections"] for http in stats["http"].values())
+        return stats
+
+    def clear_chains(self):
+        """Drop cached chains; clients and their connection pools stay open"""
+        with self._lock:
+            self._chains.clear()
+
+
+_llm_registry = None
+_llm_registry_lock = threading.Lock()
+
+def get_llm_registry() -> LLMClientRegistry:
+    global _llm_registry
+    if _llm_registry is None:
+        with _llm_registry_lock:
+            if _llm_registry is None:
+                _llm_registry = LLMClientRegistry()
+    return _llm_registry
+
+def get_llm(temperature: float = LLM_DEFAULT_TEMPERATURE, model: Optional[str] = None, streaming: bool = False) -> ChatGroq:
+    return get_llm_registry().get_llm(temperature, model, streaming)
+
+def get_llm_chain(name: str, prompt, temperature: float = LLM_DEFAULT_TEMPERATURE, model: Optional[str] = None,
+                  streaming: bool = False) -> LLMChain:
+    return get_llm_registry().get_chain(name, prompt, temperature, model, streaming)
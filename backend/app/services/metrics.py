@@ -0,0 +1,363 @@
+import bisect
+import contextvars
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+from typing import Any, Callable, Dict, List, Optional
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.tracers.context import register_configure_hook
+
+from app.services.tracing import record_span
+from app.utils.llm_usage import response_token_usage
+from app.utils.logging import setup_logger
+
+logger = setup_logger(__name__)
+
+# Histogram bucket upper bounds, in seconds
+METRICS_BUCKETS = tuple(sorted(float(bound) for bound in os.getenv(
+    "METRICS_BUCKETS", "0.005,0.01,0.025,0.05,0.1,0.25,0.5,1,2.5,5,10,20,30,60,120").split(",")))
+# Rolling quantiles cover the last METRICS_WINDOW_SECONDS, kept in METRICS_WINDOW_SLICES slices
+METRICS_WINDOW_SECONDS = float(os.getenv("METRICS_WINDOW_SECONDS", 300))
+METRICS_WINDOW_SLICES = int(os.getenv("METRICS_WINDOW_SLICES", 10))
+METRICS_QUANTILES = (0.5, 0.95, 0.99)
+# USD per 1k tokens of LLM_MODEL, for the per-run cost estimate (0 leaves it at 0)
+LLM_PROMPT_COST_PER_1K = float(os.getenv("LLM_PROMPT_COST_PER_1K", 0))
+LLM_COMPLETION_COST_PER_1K = float(os.getenv("LLM_COMPLETION_COST_PER_1K", 0))
+
+METRIC_HELP = {
+    "pipeline_stage_seconds": "Pipeline stage duration as the DAG saw it, by stage and status",
+    "pipeline_stage_fallbacks_total": "Stages that resolved to their fallback, by stage and reason",
+    "llm_call_seconds": "LLM call duration, by the stage that made it",
+    "llm_tokens_total": "LLM tokens, by stage and type (prompt or completion)",
+    "embedding_call_seconds": "Embedding provider call duration, cache hits excluded",
+    "faiss_call_seconds": "FAISS search and add duration, lock wait included",
+    "mongo_call_seconds": "MongoDB command duration, by command",
+    "cache_lookups_total": "Cache lookups, by cache and result (hit or miss)",
+    "rate_limit_queue_wait_seconds": "Time provider calls waited for their rate limit, by provider and priority",
+}
+
+# Run the calls in this context belong to, and the stage making them
+_run_metrics = contextvars.ContextVar("run_metrics", default=None)
+_stage = contextvars.ContextVar("metrics_stage", default=None)
+
+
+class RollingHistogram:
+    """
+    Bucketed observations: cumulative counts for Prometheus, and the same buckets
+    over a sliding window (ring of time slices) for recent quantiles
+    """
+
+    def __init__(self, buckets=METRICS_BUCKETS, window_seconds: float = METRICS_WINDOW_SECONDS,
+                 slices: int = METRICS_WINDOW_SLICES):
+        self.buckets = buckets
+        self.counts = [0] * (len(buckets) + 1)  # the last one is +Inf
+        self.sum = 0.0
+        self.count = 0
+        self._slice_seconds = window_seconds / slices
+        self._slices = deque(maxlen=slices)  # (slice number, counts)
+
+    def observe(self, value: float, now: float):
+        index = bisect.bisect_left(self.buckets, value)
+        self.counts[index] += 1
+        self.sum += value
+        self.count += 1
+        current = int(now // self._slice_seconds)
+        if not self._slices or self._slices[-1][0] != current:
+            self._slices.append((current, [0] * len(self.counts)))
+        self._slices[-1][1][index] += 1
+
+    def quantile(self, q: float, now: float) -> Optional[float]:
+        """q-th quantile (0-1) over the window, interpolated within its bucket; None without samples"""
+        oldest = int(now // self._slice_seconds) - self._slices.maxlen + 1
+        counts = [0] * len(self.counts)
+        for number, slice_counts in self._slices:
+            if number >= oldest:
+                counts = [total + count for total, count in zip(counts, slice_counts)]
+        total = sum(counts)
+        if not total:
+            return None
+        rank = q * total
+        seen = 0
+        for index, count in enumerate(counts):
+            if count and seen + count >= rank:
+                if index == len(self.buckets):
+                    return self.buckets[-1]
+                lower = self.buckets[index - 1] if index else 0.0
+                return lower + (self.buckets[index] - lower) * (rank - seen) / count
+            seen += count
+        return self.buckets[-1]
+
+
+class MetricsRegistry:
+    """Process-wide histograms and counters, labelled, rendered in the Prometheus text format"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._histograms = {}  # (name, labels) -> RollingHistogram
+        self._counters = {}    # (name, labels) -> value
+        self._collectors = []
+
+    def observe(self, name: str, value: float, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            histogram = self._histograms.get(key)
+            if histogram is None:
+                histogram = self._histograms[key] = RollingHistogram()
+            histogram.observe(value, time.time())
+
+    def inc(self, name: str, amount: float = 1, **labels):
+        key = (name, tuple(sorted(labels.items())))
+        with self._lock:
+            self._counters[key] = self._counters.get(key, 0) + amount
+
+    def register_collector(self, collect: Callable[[], List[tuple]]):
+        """collect() returns [(name, type, help, [(labels, value), ...]), ...], read at every scrape"""
+        with self._lock:
+            self._collectors.append(collect)
+
+    def quantiles(self, name: str, **labels) -> Dict[str, Optional[float]]:
+        """Rolling p50/p95/p99 of one histogram"""
+        key = (name, tuple(sorted(labels.items())))
+        now = time.time()
+        with self._lock:
+            histogram = self._histograms.get(key)
+            return {f"p{int(q * 100)}": histogram.quantile(q, now) if histogram else None for q in METRICS_QUANTILES}
+
+    def render(self) -> str:
+        """Every metric in the Prometheus text exposition format"""
+        now = time.time()
+        lines = []
+        with self._lock:
+            histograms = sorted(self._histograms.items())
+            counters = sorted(self._counters.items())
+            collectors = list(self._collectors)
+
+            for name in sorted({name for (name, _), _ in histograms}):
+                lines += [f"# HELP {name} {METRIC_HELP.get(name, name)}", f"# TYPE {name} histogram"]
+                for (_, labels), histogram in (item for item in histograms if item[0][0] == name):
+                    cumulative = 0
+                    for bound, count in zip(histogram.buckets + (float("inf"),), histogram.counts):
+                        cumulative += count
+                        le = "+Inf" if bound == float("inf") else repr(bound)
+                        lines.append(f"{name}_bucket{_labels(labels + (('le', le),))} {cumulative}")
+                    lines.append(f"{name}_sum{_labels(labels)} {histogram.sum!r}")
+                    lines.append(f"{name}_count{_labels(labels)} {histogram.count}")
+                window = f"{name}_window"
+                lines += [f"# HELP {window} Quantiles of {name} over the last {METRICS_WINDOW_SECONDS:g}s",
+                          f"# TYPE {window} gauge"]
+                for (_, labels), histogram in (item for item in histograms if item[0][0] == name):
+                    for q in METRICS_QUANTILES:
+                        value = histogram.quantile(q, now)
+                        if value is not None:
+                            lines.append(f"{window}{_labels(labels + (('quantile', repr(q)),))} {value!r}")
+
+            for name in sorted({name for (name, _), _ in counters}):
+                lines += [f"# HELP {name} {METRIC_HELP.get(name, name)}", f"# TYPE {name} counter"]
+                lines += [f"{name}{_labels(labels)} {value!r}" for (metric, labels), value in counters if metric == name]
+
+        for collect in collectors:
+            try:
+                families = collect()
+            except Exception as e:
+                logger.error(f"Metrics collector failed: {e}")
+                continue
+            for name, kind, help_text, samples in families:
+                lines += [f"# HELP {name} {help_text}", f"# TYPE {name} {kind}"]
+                lines += [f"{name}{_labels(tuple(sorted(labels.items())))} {float(value)!r}" for labels, value in samples]
+        return "\n".join(lines) + "\n"
+
+
+def _labels(labels: tuple) -> str:
+    if not labels:
+        return ""
+    escaped = (str(value).replace("\\", "\\\\").replace("\"", "\\\"").replace("\n", "\\n") for _, value in labels)
+    return "{" + ",".join(f'{key}="{value}"' for (key, _), value in zip(labels, escaped)) + "}"
+
+
+class RunMetrics:
+    """
+    Per-run breakdown: every LLM, embedding, FAISS and Mongo call made in a
+    metrics_scope of this run, with LLM tokens, queue wait and cache hits
+    attributed to the stage that made them
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.calls = {}   # kind -> {"count", "seconds", "errors"}
+        self.stages = {}  # stage -> counters
+
+    def add_call(self, kind: str, seconds: float, status: str = "ok", stage: Optional[str] = None):
+        with self._lock:
+            calls = self.calls.setdefault(kind, {"count": 0, "seconds": 0.0, "errors": 0})
+            calls["count"] += 1
+            calls["seconds"] += seconds
+            if status != "ok":
+                calls["errors"] += 1
+            if kind == "llm" and stage is not None:
+                counters = self._stage(stage)
+                counters["llm_calls"] += 1
+                counters["llm_seconds"] += seconds
+
+    def add(self, stage: Optional[str], **amounts):
+        if stage is None:
+            return
+        with self._lock:
+            counters = self._stage(stage)
+            for name, amount in amounts.items():
+                counters[name] += amount
+
+    def _stage(self, stage: str) -> dict:
+        if stage not in self.stages:
+            self.stages[stage] = _stage_counters()
+        return self.stages[stage]
+
+    def breakdown(self, trace: list) -> Dict[str, Any]:
+        """
+        {"stages": {stage: duration, status, fallback and its calls' counters}, "calls": totals
+        per kind, "tokens", "cost_usd", "slowest_stage"}, for the trace of the run's DAG
+        """
+        with self._lock:
+            stage_counters = {stage: dict(counters) for stage, counters in self.stages.items()}
+            calls = {kind: dict(totals) for kind, totals in self.calls.items()}
+        stages = {}
+        for entry in trace:
+            counters = stage_counters.get(entry["stage"]) or _stage_counters()
+            stages[entry["stage"]] = dict(counters, seconds=entry["elapsed"], status=entry["status"],
+                                          fallback=entry["status"] != "ok",
+                                          cost_usd=token_cost(counters["prompt_tokens"], counters["completion_tokens"]))
+        prompt_tokens = sum(counters["prompt_tokens"] for counters in stage_counters.values())
+        completion_tokens = sum(counters["completion_tokens"] for counters in stage_counters.values())
+        return {
+            "stages": stages,
+            "calls": calls,
+            "tokens": {"prompt": prompt_tokens, "completion": completion_tokens, "total": prompt_tokens + completion_tokens},
+            "cost_usd": token_cost(prompt_tokens, completion_tokens),
+            "slowest_stage": max(stages, key=lambda stage: stages[stage]["seconds"]) if stages else None,
+        }
+
+def _stage_counters() -> dict:
+    return {"llm_calls": 0, "llm_seconds": 0.0, "prompt_tokens": 0, "completion_tokens": 0,
+            "queue_wait_seconds": 0.0, "cache_hits": 0, "cache_misses": 0}
+
+
+def token_cost(prompt_tokens: int, completion_tokens: int) -> float:
+    return round(prompt_tokens / 1000 * LLM_PROMPT_COST_PER_1K + completion_tokens / 1000 * LLM_COMPLETION_COST_PER_1K, 6)
+
+
+@contextmanager
+def metrics_scope(run_metrics: Optional[RunMetrics], stage: Optional[str] = None):
+    """Calls made inside the block (and threads started with a copy of its context) count towards the run and stage"""
+    run_token = _run_metrics.set(run_metrics)
+    stage_token = _stage.set(stage)
+    try:
+        yield
+    finally:
+        _stage.reset(stage_token)
+        _run_metrics.reset(run_token)
+
+
+def current_stage() -> Optional[str]:
+    return _stage.get()
+
+
+def record_call(kind: str, operation: str, seconds: float, status: str = "ok"):
+    """One LLM/embedding/FAISS/Mongo call: into `<kind>_call_seconds`, the current run's breakdown and its trace"""
+    get_metrics().observe(f"{kind}_call_seconds", seconds, operation=operation, status=status)
+    record_span(f"{kind}.{operation}", seconds, status == "error", attributes={"call.kind": kind, "call.operation": operation})
+    run_metrics = _run_metrics.get()
+    if run_metrics is not None:
+        run_metrics.add_call(kind, seconds, status, _stage.get())
+
+
+@contextmanager
+def timed_call(kind: str, operation: str):
+    """record_call() for the block; status "error" if it raises"""
+    start = time.perf_counter()
+    status = "ok"
+    try:
+        yield
+    except BaseException:
+        status = "error"
+        raise
+    finally:
+        record_call(kind, operation, time.perf_counter() - start, status)
+
+
+def record_cache_lookup(cache: str, hit: bool):
+    get_metrics().inc("cache_lookups_total", cache=cache, result="hit" if hit else "miss")
+    run_metrics = _run_metrics.get()
+    if run_metrics is not None:
+        run_metrics.add(_stage.get(), **{"cache_hits" if hit else "cache_misses": 1})
+
+
+def record_queue_wait(provider: str, priority: str, seconds: float):
+    get_metrics().observe("rate_limit_queue_wait_seconds", seconds, provider=provider, priority=priority)
+    run_metrics = _run_metrics.get()
+    if run_metrics is not None:
+        run_metrics.add(_stage.get(), queue_wait_seconds=seconds)
+
+
+def record_stage_trace(trace: list):
+    """Stage durations and fallbacks of a DAG run"""
+    metrics = get_metrics()
+    for entry in trace:
+        metrics.observe("pipeline_stage_seconds", entry["elapsed"], stage=entry["stage"], status=entry["status"])
+        if entry["status"] != "ok":
+            metrics.inc("pipeline_stage_fallbacks_total", stage=entry["stage"], reason=entry["status"])
+
+
+class LLMMetricsHandler(BaseCallbackHandler):
+    """Times every LLM call and counts its tokens, under the stage that made it"""
+
+    run_inline = True
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._running = {}  # run_id -> (start, run metrics, stage)
+
+    def _start(self, run_id):
+        with self._lock:
+            self._running[run_id] = (time.perf_counter(), _run_metrics.get(), _stage.get())
+
+    def on_llm_start(self, serialized, prompts, *, run_id, **kwargs) -> None:
+        self._start(run_id)
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, **kwargs) -> None:
+        self._start(run_id)
+
+    def _finish(self, run_id, status: str, response=None):
+        with self._lock:
+            started = self._running.pop(run_id, None)
+        if started is None:
+            return
+        start, run_metrics, stage = started
+        seconds = time.perf_counter() - start
+        metrics = get_metrics()
+        metrics.observe("llm_call_seconds", seconds, operation=stage or "other", status=status)
+        prompt_tokens, completion_tokens = response_token_usage(response) if response is not None else (0, 0)
+        if prompt_tokens:
+            metrics.inc("llm_tokens_total", prompt_tokens, stage=stage or "other", type="prompt")
+        if completion_tokens:
+            metrics.inc("llm_tokens_total", completion_tokens, stage=stage or "other", type="completion")
+        if run_metrics is not None:
+            run_metrics.add_call("llm", seconds, status, stage)
+            run_metrics.add(stage, prompt_tokens=prompt_tokens, completion_tokens=completion_tokens)
+
+    def on_llm_end(self, response, *, run_id, **kwargs) -> None:
+        self._finish(run_id, "ok", response)
+
+    def on_llm_error(self, error, *, run_id, **kwargs) -> None:
+        self._finish(run_id, "error")
+
+
+# Attached by LangChain to every LLM/chat model run in the process
+_metrics_handler = contextvars.ContextVar("llm_metrics_handler", default=LLMMetricsHandler())
+register_configure_hook(_metrics_handler, inheritable=True)
+
+_metrics = MetricsRegistry()
+
+def get_metrics() -> MetricsRegistry:
+    return _metrics
@@ -0,0 +1,347 @@
+import asyncio
+import contextvars
+import heapq
+import itertools
+import os
+import threading
+import time
+from collections import deque
+from contextlib import asynccontextmanager, contextmanager
+from typing import Optional
+
+from app.services.metrics import get_metrics, record_queue_wait
+from app.utils.logging import setup_logger
+
+logger = setup_logger(__name__)
+
+# Per-provider budgets (0 = no limit). Defaults are the free-tier limits of the
+# Groq model and Cohere trial key this app ships with; SerpAPI quotas are monthly.
+GROQ_REQUESTS_PER_MINUTE = float(os.getenv("GROQ_REQUESTS_PER_MINUTE", 30))
+GROQ_TOKENS_PER_MINUTE = float(os.getenv("GROQ_TOKENS_PER_MINUTE", 6000))
+COHERE_REQUESTS_PER_MINUTE = float(os.getenv("COHERE_REQUESTS_PER_MINUTE", 100))
+COHERE_TOKENS_PER_MINUTE = float(os.getenv("COHERE_TOKENS_PER_MINUTE", 0))
+SERPAPI_REQUESTS_PER_MINUTE = float(os.getenv("SERPAPI_REQUESTS_PER_MINUTE", 0))
+# Completion tokens counted against the token budget for an LLM call, on top of its prompt
+GROQ_COMPLETION_TOKENS_ESTIMATE = int(os.getenv("GROQ_COMPLETION_TOKENS_ESTIMATE", 400))
+
+# After a 429 without Retry-After, the provider is paused for this long, doubling per consecutive 429
+RATE_LIMIT_BASE_BACKOFF = float(os.getenv("RATE_LIMIT_BASE_BACKOFF", 1))
+RATE_LIMIT_MAX_BACKOFF = float(os.getenv("RATE_LIMIT_MAX_BACKOFF", 30))
+# A 429 also halves the rates in use (down to this share); each success wins back RATE_LIMIT_RECOVERY_STEP
+RATE_LIMIT_MIN_SCALE = float(os.getenv("RATE_LIMIT_MIN_SCALE", 0.1))
+RATE_LIMIT_RECOVERY_STEP = float(os.getenv("RATE_LIMIT_RECOVERY_STEP", 0.05))
+# Recent waits kept per priority for the wait-time percentiles
+RATE_LIMIT_WAIT_WINDOW = int(os.getenv("RATE_LIMIT_WAIT_WINDOW", 500))
+
+# Lower value is served first; interactive requests overtake queued batch work
+PRIORITIES = {"interactive": 0, "batch": 1}
+_priority = contextvars.ContextVar("rate_limit_priority", default="interactive")
+# time.monotonic() by which a call must be granted; set per stage by rate_deadline()
+_deadline = contextvars.ContextVar("rate_limit_deadline", default=None)
+_ASYNC_POLL_SECONDS = 0.05
+
+
+class RateLimitTimeout(TimeoutError):
+    """A call's rate-limit wait would outlast the stage that made it"""
+
+
+@contextmanager
+def rate_priority(name: str):
+    """Provider calls made inside the block (and the threads it starts with a copied context) wait with this priority"""
+    if name not in PRIORITIES:
+        raise ValueError(f"Unknown priority '{name}', expected one of {list(PRIORITIES)}")
+    token = _priority.set(name)
+    try:
+        yield
+    finally:
+        _priority.reset(token)
+
+
+@contextmanager
+def rate_deadline(seconds: Optional[float]):
+    """
+    Provider calls made inside the block (and threads started with a copied context)
+    give up with RateLimitTimeout instead of waiting past `seconds` from now. A thread
+    left running after its stage timed out then sends nothing more.
+    """
+    if seconds is None:
+        yield
+        return
+    deadline = time.monotonic() + seconds
+    outer = _deadline.get()
+    token = _deadline.set(deadline if outer is None else min(outer, deadline))
+    try:
+        yield
+    finally:
+        _deadline.reset(token)
+
+
+def estimate_tokens(*texts: str) -> int:
+    """Rough token count (~4 characters per token)"""
+    return sum(len(text) for text in texts) // 4
+
+
+def is_rate_limit_error(error: BaseException) -> bool:
+    status = getattr(error, "status_code", None) or getattr(getattr(error, "response", None), "status_code", None)
+    if status == 429:
+        return True
+    return any(cls.__name__ in ("RateLimitError", "TooManyRequestsError") for cls in type(error).__mro__)
+
+
+class TokenBucket:
+    """Refills `per_minute` units per minute, holding at most one minute's worth"""
+
+    def __init__(self, per_minute: float):
+        self.per_minute = per_minute
+        self.level = per_minute
+        self._updated = time.monotonic()
+
+    def delay(self, amount: float, now: float, scale: float) -> float:
+        """Seconds until `amount` units are available at `scale` times the rate"""
+        self.level = min(self.per_minute, self.level + (now - self._updated) * self.per_minute * scale / 60)
+        self._updated = now
+        amount = min(amount, self.per_minute)
+        return 0.0 if self.level >= amount else (amount - self.level) * 60 / (self.per_minute * scale)
+
+    def take(self, amount: float):
+        self.level -= min(amount, self.per_minute)
+
+    def observe(self, remaining: float):
+        """Align with the provider's own count of what is left"""
+        self.level = min(self.level, remaining)
+
+
+class ProviderLimiter:
+    """
+    Requests/min and tokens/min buckets for one provider, shared by every caller in
+    the process. Callers wait in one queue ordered by priority, then arrival; only
+    the head of the queue takes from the buckets, so a batch can't starve interactive
+    runs. A 429 pauses the provider (Retry-After, else exponential backoff) and halves
+    the rates in use until successes win them back.
+    """
+
+    def __init__(self, name: str, requests_per_minute: float = 0, tokens_per_minute: float = 0):
+        self.name = name
+        self._requests = TokenBucket(requests_per_minute) if requests_per_minute > 0 else None
+        self._tokens = TokenBucket(tokens_per_minute) if tokens_per_minute > 0 else None
+        self._cond = threading.Condition()
+        self._waiters = []  # heap of (priority, seq)
+        self._seq = itertools.count()
+        self._paused_until = 0.0
+        self._scale = 1.0
+        self._throttled = 0  # consecutive 429s
+        self._stats = {"acquired": 0, "waited": 0, "rate_limited": 0, "timed_out": 0}
+        self._waits = {priority: deque(maxlen=RATE_LIMIT_WAIT_WINDOW) for priority in PRIORITIES}
+        self._wait_totals = {priority: [0, 0.0, 0.0] for priority in PRIORITIES}  # count, sum, max
+
+    def _try(self, ticket: tuple, tokens: float) -> Optional[float]:
+        """Under the lock: 0 once granted, else seconds to wait (None: until another waiter goes)"""
+        if self._waiters[0] != ticket:
+            return None
+        now = time.monotonic()
+        delay = max(self._paused_until - now, 0.0)
+        budgets = [(bucket, amount) for bucket, amount in ((self._requests, 1), (self._tokens, tokens)) if bucket is not None]
+        for bucket, amount in budgets:
+            delay = max(delay, bucket.delay(amount, now, self._scale))
+        if delay > 0:
+            return delay
+        for bucket, amount in budgets:
+            bucket.take(amount)
+        heapq.heappop(self._waiters)
+        self._cond.notify_all()
+        return 0.0
+
+    def _enqueue(self) -> tuple:
+        ticket = (PRIORITIES[_priority.get()], next(self._seq))
+        with self._cond:
+            heapq.heappush(self._waiters, ticket)
+        return ticket
+
+    def _check_deadline(self, delay: Optional[float], deadline: Optional[float]) -> Optional[float]:
+        """Seconds left before the caller's deadline; raises once a grant can't come in time"""
+        if deadline is None:
+            return None
+        remaining = deadline - time.monotonic()
+        if remaining <= 0 or (delay is not None and delay > remaining):
+            with self._cond:
+                self._stats["timed_out"] += 1
+            raise RateLimitTimeout(f"{self.name} rate limit wait would outlast the stage deadline")
+        return remaining
+
+    def _abandon(self, ticket: tuple):
+        with self._cond:
+            if ticket in self._waiters:
+                self._waiters.remove(ticket)
+                heapq.heapify(self._waiters)
+                self._cond.notify_all()
+
+    def acquire(self, tokens: float = 0) -> float:
+        """Block until the call may go out; returns the seconds waited. Raises RateLimitTimeout past rate_deadline()"""
+        start = time.monotonic()
+        deadline = _deadline.get()
+        ticket = self._enqueue()
+        granted = False
+        try:
+            with self._cond:
+                while True:
+                    delay = self._try(ticket, tokens)
+                    if delay == 0:
+                        granted = True
+                        break
+                    # No delay yet means waiting behind another caller: wake at the deadline at the latest
+                    remaining = self._check_deadline(delay, deadline)
+                    self._cond.wait(delay if delay is not None else remaining)
+        finally:
+            if not granted:
+                self._abandon(ticket)
+        return self._record_wait(ticket, time.monotonic() - start)
+
+    async def aacquire(self, tokens: float = 0) -> float:
+        """acquire() for the event loop: polls instead of blocking the thread"""
+        start = time.monotonic()
+        deadline = _deadline.get()
+        ticket = self._enqueue()
+        granted = False
+        try:
+            while True:
+                with self._cond:
+                    delay = self._try(ticket, tokens)
+                if delay == 0:
+                    granted = True
+                    break
+                self._check_deadline(delay, deadline)
+                await asyncio.sleep(min(delay, _ASYNC_POLL_SECONDS) if delay is not None else _ASYNC_POLL_SECONDS)
+        finally:
+            if not granted:
+                self._abandon(ticket)
+        return self._record_wait(ticket, time.monotonic() - start)
+
+    def _record_wait(self, ticket: tuple, waited: float) -> float:
+        priority = next(name for name, value in PRIORITIES.items() if value == ticket[0])
+        with self._cond:
+            self._stats["acquired"] += 1
+            if waited > 0.001:
+                self._stats["waited"] += 1
+            self._waits[priority].append(waited)
+            totals = self._wait_totals[priority]
+            totals[0] += 1
+            totals[1] += waited
+            totals[2] = max(totals[2], waited)
+        record_queue_wait(self.name, priority, waited)
+        if waited > 1:
+            logger.info(f" {self.name} call waited {waited:.2f}s for its rate limit ({priority})")
+        return waited
+
+    def observe(self, status_code: int, retry_after: Optional[float] = None, remaining_tokens: Optional[float] = None):
+        """Feed back a response: a 429 pauses and slows the provider, a success speeds it back up"""
+        with self._cond:
+            if status_code == 429:
+                self._throttled += 1
+                self._stats["rate_limited"] += 1
+                self._scale = max(RATE_LIMIT_MIN_SCALE, self._scale / 2)
+                pause = retry_after if retry_after is not None else min(
+                    RATE_LIMIT_MAX_BACKOFF, RATE_LIMIT_BASE_BACKOFF * 2 ** (self._throttled - 1))
+                self._paused_until = max(self._paused_until, time.monotonic() + pause)
+                logger.warning(f" {self.name} rate limited (429), pausing {pause:.1f}s at {self._scale:.0%} of the configured rate")
+            elif status_code < 400:
+                self._throttled = 0
+                self._scale = min(1.0, self._scale + RATE_LIMIT_RECOVERY_STEP)
+            if remaining_tokens is not None and self._tokens is not None:
+                self._tokens.observe(remaining_tokens)
+
+    def observe_headers(self, status_code: int, headers):
+        """observe() from an HTTP response's Retry-After and x-ratelimit-remaining-tokens headers"""
+        def number(name):
+            try:
+                return float(headers.get(name))
+            except (TypeError, ValueError):
+                return None
+        self.observe(status_code, number("retry-after"), number("x-ratelimit-remaining-tokens"))
+
+    def observe_error(self, error: BaseException):
+        if is_rate_limit_error(error):
+            self.observe(429)
+
+    def stats(self) -> dict:
+        with self._cond:
+            stats = dict(self._stats)
+            stats["queued"] = len(self._waiters)
+            stats["rate_scale"] = self._scale
+            stats["paused_for"] = max(self._paused_until - time.monotonic(), 0.0)
+            waits = {priority: sorted(samples) for priority, samples in self._waits.items()}
+            totals = {priority: list(values) for priority, values in self._wait_totals.items()}
+        stats["queue_wait"] = {}
+        for priority, samples in waits.items():
+            count, total, longest = totals[priority]
+            stats["queue_wait"][priority] = {
+                "count": count,
+                "total_seconds": total,
+                "max_seconds": longest,
+                "p50_seconds": samples[len(samples) // 2] if samples else 0.0,
+                "p95_seconds": samples[min(len(samples) - 1, int(len(samples) * 0.95))] if samples else 0.0,
+            }
+        return stats
+
+
+PROVIDER_LIMITS = {
+    "groq": (GROQ_REQUESTS_PER_MINUTE, GROQ_TOKENS_PER_MINUTE),
+    "cohere": (COHERE_REQUESTS_PER_MINUTE, COHERE_TOKENS_PER_MINUTE),
+    "serpapi": (SERPAPI_REQUESTS_PER_MINUTE, 0),
+}
+
+_limiters = {}
+_limiters_lock = threading.Lock()
+
+def get_rate_limiter(provider: str) -> ProviderLimiter:
+    """Shared limiter of a provider ("groq", "cohere", "serpapi")"""
+    limiter = _limiters.get(provider)
+    if limiter is None:
+        with _limiters_lock:
+            limiter = _limiters.get(provider)
+            if limiter is None:
+                limiter = _limiters[provider] = ProviderLimiter(provider, *PROVIDER_LIMITS.get(provider, (0, 0)))
+    return limiter
+
+def get_rate_limit_stats() -> dict:
+    with _limiters_lock:
+        limiters = list(_limiters.values())
+    return {limiter.name: limiter.stats() for limiter in limiters}
+
+def _collect_rate_limits() -> list:
+    """Limiter state for /metrics; queue waits are recorded as they happen"""
+    stats = get_rate_limit_stats()
+    return [
+        ("rate_limit_queued", "gauge", "Provider calls waiting for their rate limit",
+         [({"provider": name}, provider["queued"]) for name, provider in stats.items()]),
+        ("rate_limit_rate_scale", "gauge", "Share of the configured rate in use after 429s",
+         [({"provider": name}, provider["rate_scale"]) for name, provider in stats.items()]),
+        ("rate_limit_throttled_total", "counter", "429 responses from the provider",
+         [({"provider": name}, provider["rate_limited"]) for name, provider in stats.items()]),
+        ("rate_limit_timeouts_total", "counter", "Calls that gave up waiting at their stage deadline",
+         [({"provider": name}, provider["timed_out"]) for name, provider in stats.items()]),
+    ]
+
+get_metrics().register_collector(_collect_rate_limits)
+
+@contextmanager
+def rate_limited(provider: str, tokens: float = 0):
+    """Wait for the provider's budget, then run the block; a rate-limit error raised in it slows the provider"""
+    limiter = get_rate_limiter(provider)
+    limiter.acquire(tokens)
+    try:
+        yield
+    except Exception as e:
+        limiter.observe_error(e)
+        raise
+    limiter.observe(200)
+
+@asynccontextmanager
+async def arate_limited(provider: str, tokens: float = 0):
+    limiter = get_rate_limiter(provider)
+    await limiter.aacquire(tokens)
+    try:
+        yield
+    except Exception as e:
+        limiter.observe_error(e)
+        raise
+    limiter.observe(200)
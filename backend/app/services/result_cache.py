@@ -0,0 +1,109 @@
+import copy
+import os
+import threading
+import time
+from collections import OrderedDict
+
+import numpy as np
+
+SEMANTIC_CACHE_THRESHOLD = float(os.getenv("SEMANTIC_CACHE_THRESHOLD", 0.95))
+SEMANTIC_CACHE_TTL = float(os.getenv("SEMANTIC_CACHE_TTL", 3600))
+SEMANTIC_CACHE_MAX_ENTRIES = int(os.getenv("SEMANTIC_CACHE_MAX_ENTRIES", 1000))
+
+
+class SemanticResultCache:
+    """Cache of completed pipeline results looked up by query-embedding similarity.
+
+    Each pipeline mode has its own index (a matrix of unit-normalized query
+    vectors), so an express result is never served for a comprehensive
+    request. Entries expire after `ttl_seconds` and the least recently used
+    entry of a mode is evicted once it holds `max_entries`.
+    """
+
+    def __init__(self, threshold=SEMANTIC_CACHE_THRESHOLD, ttl_seconds=SEMANTIC_CACHE_TTL, max_entries=SEMANTIC_CACHE_MAX_ENTRIES):
+        self.threshold = threshold
+        self.ttl_seconds = ttl_seconds
+        self.max_entries = max_entries
+        self._entries = {}   # mode -> OrderedDict(entry_id -> entry)
+        self._matrices = {}  # mode -> (entry_ids, matrix), rebuilt lazily after changes
+        self._lock = threading.Lock()
+        self._next_id = 0
+        self._stats = {"hits": 0, "misses": 0, "evictions": 0, "expirations": 0}
+
+    @staticmethod
+    def _normalize(vector):
+        vector = np.asarray(vector, dtype=np.float32)
+        norm = np.linalg.norm(vector)
+        return vector / norm if norm else vector
+
+    def _expire(self, mode, now):
+        entries = self._entries.get(mode)
+        if not entries:
+            return
+        expired = [entry_id for entry_id, entry in entries.items() if now - entry["created_at"] > self.ttl_seconds]
+        for entry_id in expired:
+            del entries[entry_id]
+        if expired:
+            self._stats["expirations"] += len(expired)
+            self._matrices.pop(mode, None)
+
+    def _matrix(self, mode):
+        if mode not in self._matrices:
+            entries = self._entries.get(mode, {})
+            entry_ids = list(entries.keys())
+            matrix = np.stack([entries[entry_id]["vector"] for entry_id in entry_ids]) if entry_ids else None
+            self._matrices[mode] = (entry_ids, matrix)
+        return self._matrices[mode]
+
+    def lookup(self, mode, query_vector):
+        """Return (result copy, similarity, cached query) for the best match above threshold, else None"""
+        vector = self._normalize(query_vector)
+        with self._lock:
+            self._expire(mode, time.time())
+            entry_ids, matrix = self._matrix(mode)
+            if matrix is None:
+                self._stats["misses"] += 1
+                return None
+            similarities = matrix @ vector
+            best = int(np.argmax(similarities))
+            similarity = float(similarities[best])
+            if similarity < self.threshold:
+                self._stats["misses"] += 1
+                return None
+            entries = self._entries[mode]
+            entries.move_to_end(entry_ids[best])
+            entry = entries[entry_ids[best]]
+            self._stats["hits"] += 1
+            return copy.deepcopy(entry["result"]), similarity, entry["query"]
+
+    def store(self, mode, query, query_vector, result):
+        with self._lock:
+            entries = self._entries.setdefault(mode, OrderedDict())
+            entries[self._next_id] = {
+                "query": query,
+                "vector": self._normalize(query_vector),
+                "result": copy.deepcopy(result),
+                "created_at": time.time(),
+            }
+            self._next_id += 1
+            while len(entries) > self.max_entries:
+                entries.popitem(last=False)
+                self._stats["evictions"] += 1
+            self._matrices.pop(mode, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self._matrices.clear()
+
+    def stats(self) -> dict:
+        with self._lock:
+            stats = dict(self._stats)
+            stats["entries"] = {mode: len(entries) for mode, entries in self._entries.items()}
+        return stats
+
+
+_result_cache = SemanticResultCache()
+
+def get_result_cache():
+    return _result_cache
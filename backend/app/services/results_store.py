@@ -0,0 +1,149 @@
+import atexit
+import copy
+import os
+import re
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Any, Callable, Dict, Optional
+
+from bson import ObjectId
+from pymongo.errors import BulkWriteError
+
+from app.services.background_tasks import get_background_tasks
+from app.services.db_service import get_mongo_collection
+from app.utils.logging import setup_logger
+
+logger = setup_logger(__name__)
+
+RESULTS_COLLECTION = os.getenv("RESULTS_COLLECTION", "pipeline_results")
+# Buffered results are written with one insert_many once this many are waiting...
+RESULTS_BATCH_SIZE = int(os.getenv("RESULTS_BATCH_SIZE", 50))
+# ...or once the oldest has waited this long (seconds)
+RESULTS_FLUSH_INTERVAL = float(os.getenv("RESULTS_FLUSH_INTERVAL", 2))
+
+DUPLICATE_KEY_ERROR = 11000
+QUERY_TERM = re.compile(r"\w+")
+
+
+def query_terms(text: str) -> list:
+    """Distinct lowercased words of a query, as stored in "query_terms" for history search"""
+    return sorted(set(QUERY_TERM.findall(text.lower())))
+
+
+def build_result_document(result: Dict[str, Any], mode: str) -> Dict[str, Any]:
+    """Structured run document: searchable metadata at the top, the full result under "result" """
+    query = result.get("query", "")
+    return {
+        "query": query,
+        "query_normalized": " ".join(query.lower().split()),
+        "query_terms": query_terms(query),
+        "mode": mode,
+        "status": "degraded" if result.get("degraded") else result.get("status", "completed"),
+        "created_at": datetime.now(timezone.utc),
+        "execution_time": result.get("execution_time"),
+        "degraded": result.get("degraded", {}),
+        "result": copy.deepcopy(result),
+    }
+
+
+def insert_documents(collection, documents: list) -> int:
+    """Unordered insert_many; duplicates of already-stored documents (a retried batch) are skipped"""
+    try:
+        return len(collection.insert_many(documents, ordered=False).inserted_ids)
+    except BulkWriteError as e:
+        errors = e.details.get("writeErrors", [])
+        if any(error.get("code") != DUPLICATE_KEY_ERROR for error in errors):
+            raise
+        return e.details.get("nInserted", 0)
+
+
+class ResultsStore:
+    """
+    Buffers run documents and writes them in bulk. A flush is queued on the
+    background task service (so failed writes are retried and dead-lettered)
+    when RESULTS_BATCH_SIZE documents are waiting or the oldest one has waited
+    RESULTS_FLUSH_INTERVAL seconds.
+    """
+
+    def __init__(self, get_collection: Callable = lambda: get_mongo_collection(RESULTS_COLLECTION),
+                 batch_size: int = RESULTS_BATCH_SIZE, flush_interval: float = RESULTS_FLUSH_INTERVAL,
+                 submit: Optional[Callable] = None):
+        self._get_collection = get_collection
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self._submit = submit or get_background_tasks().submit
+        self._buffer = []
+        self._oldest = None
+        self._cond = threading.Condition()
+        self._closed = False
+        self._stats = {"added": 0, "flushes": 0, "written": 0}
+        self._flusher = threading.Thread(target=self._flush_on_interval, name="results-store-flusher", daemon=True)
+        self._flusher.start()
+
+    def add(self, document: Dict[str, Any]):
+        with self._cond:
+            # The _id is set here so a retried insert_many can't store the document twice
+            document.setdefault("_id", ObjectId())
+            self._buffer.append(document)
+            self._stats["added"] += 1
+            if self._oldest is None:
+                self._oldest = time.time()
+                self._cond.notify()
+            full = len(self._buffer) >= self.batch_size
+        if full:
+            self.flush()
+
+    def flush(self):
+        """Queue the buffered documents for one bulk write"""
+        with self._cond:
+            documents, self._buffer, self._oldest = self._buffer, [], None
+            if documents:
+                self._stats["flushes"] += 1
+        if documents:
+            self._submit("save-results", self._write, documents, payload=documents)
+
+    def _write(self, documents: list):
+        written = insert_documents(self._get_collection(), documents)
+        with self._cond:
+            self._stats["written"] += written
+        logger.info(f"Saved {written} pipeline results")
+
+    def _flush_on_interval(self):
+        while True:
+            with self._cond:
+                while self._oldest is None and not self._closed:
+                    self._cond.wait()
+                if self._closed:
+                    return
+                wait = self._oldest + self.flush_interval - time.time()
+                if wait > 0:
+                    self._cond.wait(wait)
+                    continue
+            self.flush()
+
+    def stats(self) -> dict:
+        with self._cond:
+            return dict(self._stats, buffered=len(self._buffer))
+
+    def close(self):
+        """Flush what is buffered and stop the interval flusher"""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        self.flush()
+
+
+_results_store = None
+_results_store_lock = threading.Lock()
+
+def get_results_store() -> ResultsStore:
+    global _results_store
+    if _results_store is None:
+        with _results_store_lock:
+            if _results_store is None:
+                # atexit runs handlers last-in first-out: this flush lands before the background service drains
+                get_background_tasks()
+                _results_store = ResultsStore()
+                atexit.register(_results_store.close)
+    return _results_store
@@ -0,0 +1,208 @@
+import dataclasses
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+import uuid
+from typing import Any, Dict, Iterable, Optional
+
+from app.utils.logging import setup_logger
+
+logger = setup_logger(__name__)
+
+# Checkpoint every stage output of every run, so it can be resumed or re-run later
+STAGE_CHECKPOINTS = os.getenv("STAGE_CHECKPOINTS", "true").lower() == "true"
+# "sqlite" keeps checkpoints across restarts, "memory" only for the process
+STAGE_CHECKPOINT_BACKEND = os.getenv("STAGE_CHECKPOINT_BACKEND", "sqlite")
+STAGE_CHECKPOINT_PATH = os.getenv("STAGE_CHECKPOINT_PATH", "app/storage/stage_checkpoints.sqlite")
+# Runs untouched for this long are dropped
+STAGE_CHECKPOINT_RETENTION_SECONDS = float(os.getenv("STAGE_CHECKPOINT_RETENTION_SECONDS", 7 * 24 * 3600))
+
+
+def stage_input_hash(stage: str, run: Dict[str, Any], inputs: Dict[str, Any]) -> str:
+    """
+    sha256 of everything a stage's output depends on: the run's query, retrieved
+    knowledge and config, and the outputs of the stages it reads
+    """
+    payload = json.dumps({"stage": stage, "query": run["query"], "knowledge": run["retrieved_knowledge"],
+                          "config": run["config"], "inputs": inputs}, sort_keys=True, default=str)
+    return hashlib.sha256(payload.encode("utf-8")).hexdigest()
+
+
+class UnknownCheckpointError(Exception):
+    """No checkpointed run with this id (never saved, or past its retention)"""
+
+
+class InMemoryCheckpointStore:
+    """Runs and their stage checkpoints in dicts"""
+
+    def __init__(self):
+        self._runs = {}    # run_id -> run
+        self._stages = {}  # run_id -> {stage: checkpoint}
+        self._lock = threading.Lock()
+
+    def save_run(self, run: dict):
+        with self._lock:
+            self._runs[run["run_id"]] = dict(run)
+            self._stages.setdefault(run["run_id"], {})
+
+    def get_run(self, run_id: str) -> Optional[dict]:
+        with self._lock:
+            run = self._runs.get(run_id)
+            return dict(run) if run is not None else None
+
+    def get_stages(self, run_id: str) -> Dict[str, dict]:
+        with self._lock:
+            return {stage: dict(checkpoint) for stage, checkpoint in self._stages.get(run_id, {}).items()}
+
+    def put_stage(self, run_id: str, stage: str, input_hash: str, output: Any, source: str):
+        now = time.time()
+        with self._lock:
+            self._stages.setdefault(run_id, {})[stage] = {"input_hash": input_hash, "output": output,
+                                                          "source": source, "updated_at": now}
+            if run_id in self._runs:
+                self._runs[run_id]["updated_at"] = now
+
+    def purge(self, updated_before: float):
+        with self._lock:
+            expired = [run_id for run_id, run in self._runs.items() if run["updated_at"] < updated_before]
+            for run_id in expired:
+                del self._runs[run_id]
+                self._stages.pop(run_id, None)
+
+
+class SqliteCheckpointStore:
+    """Runs and stage checkpoints in two sqlite tables"""
+
+    def __init__(self, db_path: str = STAGE_CHECKPOINT_PATH):
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+        self._db = sqlite3.connect(db_path, check_same_thread=False, isolation_level=None)
+        self._lock = threading.Lock()
+        self._db.execute("PRAGMA journal_mode=WAL")
+        self._db.execute("CREATE TABLE IF NOT EXISTS runs (run_id TEXT PRIMARY KEY, run TEXT NOT NULL, updated_at REAL NOT NULL)")
+        self._db.execute(
+            "CREATE TABLE IF NOT EXISTS stages (run_id TEXT NOT NULL, stage TEXT NOT NULL, input_hash TEXT NOT NULL, "
+            "output TEXT, source TEXT NOT NULL, updated_at REAL NOT NULL, PRIMARY KEY (run_id, stage))"
+        )
+        self._db.execute("CREATE INDEX IF NOT EXISTS runs_updated ON runs (updated_at)")
+
+    def save_run(self, run: dict):
+        with self._lock:
+            self._db.execute("INSERT OR REPLACE INTO runs VALUES (?, ?, ?)",
+                             (run["run_id"], json.dumps(run, default=str), run["updated_at"]))
+
+    def get_run(self, run_id: str) -> Optional[dict]:
+        with self._lock:
+            row = self._db.execute("SELECT run, updated_at FROM runs WHERE run_id = ?", (run_id,)).fetchone()
+        if row is None:
+            return None
+        return dict(json.loads(row[0]), updated_at=row[1])
+
+    def get_stages(self, run_id: str) -> Dict[str, dict]:
+        with self._lock:
+            rows = self._db.execute("SELECT stage, input_hash, output, source, updated_at FROM stages WHERE run_id = ?",
+                                    (run_id,)).fetchall()
+        return {stage: {"input_hash": input_hash, "output": json.loads(output), "source": source, "updated_at": updated_at}
+                for stage, input_hash, output, source, updated_at in rows}
+
+    def put_stage(self, run_id: str, stage: str, input_hash: str, output: Any, source: str):
+        now = time.time()
+        with self._lock:
+            self._db.execute("INSERT OR REPLACE INTO stages VALUES (?, ?, ?, ?, ?, ?)",
+                             (run_id, stage, input_hash, json.dumps(output, default=str), source, now))
+            self._db.execute("UPDATE runs SET updated_at = ? WHERE run_id = ?", (now, run_id))
+
+    def purge(self, updated_before: float):
+        with self._lock:
+            self._db.execute("DELETE FROM stages WHERE run_id IN (SELECT run_id FROM runs WHERE updated_at < ?)",
+                             (updated_before,))
+            self._db.execute("DELETE FROM runs WHERE updated_at < ?", (updated_before,))
+
+
+class RunCheckpoint:
+    """
+    Stage checkpoints of one run. A stage's saved output is reused while the hash of
+    its inputs is unchanged; stages in `overrides` take the given output instead
+    (an edit, kept for later re-runs) and stages in `invalidate` are recomputed.
+    `reused`, `edited` and `computed` list what happened to each stage on this run.
+    """
+
+    def __init__(self, store, run: dict, overrides: Optional[Dict[str, Any]] = None, invalidate: Iterable[str] = ()):
+        self.store = store
+        self.run = run
+        self.run_id = run["run_id"]
+        self.overrides = dict(overrides or {})
+        self.invalidate = set(invalidate)
+        self.saved = store.get_stages(self.run_id)
+        self.reused = []
+        self.edited = []
+        self.computed = []
+        self._lock = threading.Lock()
+
+    def input_hash(self, stage: str, inputs: Dict[str, Any]) -> str:
+        return stage_input_hash(stage, self.run, inputs)
+
+    def lookup(self, stage: str, input_hash: str):
+        """(True, output) for an override or a saved output with the same input hash, else (False, None)"""
+        if stage in self.overrides:
+            output = self.overrides[stage]
+            self.store.put_stage(self.run_id, stage, input_hash, output, "edited")
+            self._mark(self.edited, stage)
+            return True, output
+        saved = self.saved.get(stage)
+        if stage not in self.invalidate and saved is not None and saved["input_hash"] == input_hash:
+            self._mark(self.reused, stage)
+            return True, saved["output"]
+        return False, None
+
+    def save(self, stage: str, input_hash: str, output: Any):
+        self.store.put_stage(self.run_id, stage, input_hash, output, "computed")
+        self._mark(self.computed, stage)
+
+    def _mark(self, names: list, stage: str):
+        with self._lock:
+            names.append(stage)
+
+    def summary(self) -> dict:
+        return {"run_id": self.run_id, "reused": sorted(self.reused), "edited": sorted(self.edited),
+                "computed": sorted(self.computed)}
+
+
+def start_run_checkpoint(query: str, retrieved_knowledge: str, config, skip_validation: bool, skip_chains: bool,
+                         store=None) -> RunCheckpoint:
+    """
+    Register a new run (query, retrieval, config and skip flags, enough to re-run it)
+    under a fresh run id; runs idle past STAGE_CHECKPOINT_RETENTION_SECONDS are purged
+    """
+    store = store or get_checkpoint_store()
+    now = time.time()
+    store.purge(now - STAGE_CHECKPOINT_RETENTION_SECONDS)
+    run = {"run_id": uuid.uuid4().hex, "query": query, "retrieved_knowledge": retrieved_knowledge,
+           "config": dataclasses.asdict(config), "skip_validation": skip_validation, "skip_chains": skip_chains,
+           "created_at": now, "updated_at": now}
+    store.save_run(run)
+    return RunCheckpoint(store, run)
+
+
+def resume_run_checkpoint(run_id: str, overrides: Optional[Dict[str, Any]] = None, invalidate: Iterable[str] = (),
+                          store=None) -> Optional[RunCheckpoint]:
+    """Checkpoint of an earlier run, None if unknown or expired"""
+    store = store or get_checkpoint_store()
+    run = store.get_run(run_id)
+    if run is None:
+        return None
+    return RunCheckpoint(store, run, overrides, invalidate)
+
+
+_checkpoint_store = None
+_checkpoint_store_lock = threading.Lock()
+
+def get_checkpoint_store():
+    global _checkpoint_store
+    if _checkpoint_store is None:
+        with _checkpoint_store_lock:
+            if _checkpoint_store is None:
+                _checkpoint_store = SqliteCheckpointStore() if STAGE_CHECKPOINT_BACKEND == "sqlite" else InMemoryCheckpointStore()
+    return _checkpoint_store
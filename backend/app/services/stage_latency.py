@@ -0,0 +1,143 @@
+import dataclasses
+import os
+import threading
+from collections import deque
+from typing import Optional
+
+from app.config.pipeline_config import PipelineConfig, PERFORMANCE_CONFIGS
+
+STAGE_LATENCY_WINDOW = int(os.getenv("STAGE_LATENCY_WINDOW", 200))
+# Samples a stage needs before its own p95 replaces the typical duration below
+STAGE_LATENCY_MIN_SAMPLES = int(os.getenv("STAGE_LATENCY_MIN_SAMPLES", 5))
+# Auto-tuned timeouts are p95 * headroom, never above the preset's own timeout
+AUTO_TIMEOUT_HEADROOM = float(os.getenv("AUTO_TIMEOUT_HEADROOM", 1.5))
+AUTO_MIN_TIMEOUT = float(os.getenv("AUTO_MIN_TIMEOUT", 2))
+
+# A stage call still running at this percentile of its recent latencies gets a hedged duplicate
+LLM_HEDGING_ENABLED = os.getenv("LLM_HEDGING_ENABLED", "true").lower() == "true"
+HEDGE_PERCENTILE = float(os.getenv("HEDGE_PERCENTILE", 0.9))
+# Stage timeouts shrink to p99 * multiplier once enough samples exist (never above the configured timeout);
+# the multiplier leaves room for a hedge started at p90 to finish
+ADAPTIVE_TIMEOUTS_ENABLED = os.getenv("ADAPTIVE_TIMEOUTS_ENABLED", "true").lower() == "true"
+ADAPTIVE_TIMEOUT_MULTIPLIER = float(os.getenv("ADAPTIVE_TIMEOUT_MULTIPLIER", 2))
+
+# Typical seconds per stage against Groq, used until enough samples exist
+DEFAULT_STAGE_SECONDS = {
+    "research": 8, "analysis": 6, "plan": 5, "draft": 12,
+    "validation": 5, "strategic_report": 9, "swot_analysis": 5, "timeline": 6,
+}
+
+# PipelineConfig timeout field that bounds each stage
+STAGE_TIMEOUT_FIELDS = {
+    "research": "research_timeout",
+    "analysis": "analysis_timeout",
+    "plan": "planning_timeout",
+    "draft": "writing_timeout",
+    "validation": "validation_timeout",
+    "strategic_report": "chain_timeout",
+    "swot_analysis": "chain_timeout",
+    "timeline": "chain_timeout",
+}
+
+CORE_STAGES = ("research", "analysis", "plan", "draft")
+# Presets tried by "auto", richest first
+AUTO_PRESETS = ("comprehensive", "balanced", "express")
+
+
+class StageLatencyTracker:
+    """Rolling window of recent per-stage durations, fed from scheduler traces"""
+
+    def __init__(self, window: int = STAGE_LATENCY_WINDOW):
+        self._samples = {}
+        self._window = window
+        self._lock = threading.Lock()
+
+    def record(self, stage: str, seconds: float):
+        with self._lock:
+            self._samples.setdefault(stage, deque(maxlen=self._window)).append(seconds)
+
+    def record_trace(self, trace: list):
+        # Timed-out stages are recorded at their timeout, a lower bound of their real duration,
+        # unless a run deadline cut that timeout short
+        for entry in trace:
+            if entry["status"] == "ok" or (entry["status"] == "timeout" and not entry.get("deadline_limited")):
+                self.record(entry["stage"], entry["elapsed"])
+
+    def percentile(self, stage: str, q: float) -> Optional[float]:
+        """q-th quantile (0-1) of the stage's recent durations, None until enough samples exist"""
+        with self._lock:
+            samples = sorted(self._samples.get(stage, ()))
+        if len(samples) < STAGE_LATENCY_MIN_SAMPLES:
+            return None
+        return samples[max(0, int(len(samples) * q) - 1)]
+
+    def p95(self, stage: str) -> Optional[float]:
+        return self.percentile(stage, 0.95)
+
+    def hedge_delay(self, stage: str) -> Optional[float]:
+        """How long to wait before sending a duplicate request, None to never hedge"""
+        if not LLM_HEDGING_ENABLED:
+            return None
+        return self.percentile(stage, HEDGE_PERCENTILE)
+
+    def adaptive_timeout(self, stage: str, configured: float) -> float:
+        p99 = self.percentile(stage, 0.99)
+        if not ADAPTIVE_TIMEOUTS_ENABLED or p99 is None:
+            return configured
+        return min(configured, max(AUTO_MIN_TIMEOUT, p99 * ADAPTIVE_TIMEOUT_MULTIPLIER))
+
+    def expected(self, stage: str) -> float:
+        p95 = self.p95(stage)
+        return p95 if p95 is not None else DEFAULT_STAGE_SECONDS[stage]
+
+    def estimate_run(self, config: PipelineConfig) -> float:
+        """Expected p95 run time: the core stages in sequence, then the slowest final step"""
+        estimate = sum(self.expected(stage) for stage in CORE_STAGES)
+        if not config.skip_validation and not config.skip_chains:
+            # strategic_report and timeline start after the plan, validation and SWOT after the draft
+            estimate = max(
+                estimate + max(self.expected("validation"), self.expected("swot_analysis")),
+                estimate - self.expected("draft") + max(self.expected("strategic_report"), self.expected("timeline"))
+            )
+        return estimate
+
+    def stats(self) -> dict:
+        with self._lock:
+            counts = {stage: len(samples) for stage, samples in self._samples.items()}
+        return {stage: {"samples": count, "p95": self.p95(stage)} for stage, count in counts.items()}
+
+
+_stage_latency_tracker = StageLatencyTracker()
+
+def get_stage_latency_tracker() -> StageLatencyTracker:
+    return _stage_latency_tracker
+
+
+def auto_config(latency_budget: Optional[float] = None) -> PipelineConfig:
+    """
+    Config for the "auto" preset: the richest preset whose estimated p95 run time fits
+    latency_budget (seconds), with each stage timeout tightened to its p95 * headroom.
+    With a budget, timeouts along the critical path are scaled down to fit it.
+    """
+    tracker = get_stage_latency_tracker()
+    preset = PERFORMANCE_CONFIGS[AUTO_PRESETS[-1]]
+    for name in AUTO_PRESETS:
+        if latency_budget is None or tracker.estimate_run(PERFORMANCE_CONFIGS[name]) <= latency_budget:
+            preset = PERFORMANCE_CONFIGS[name]
+            break
+
+    timeouts = {}
+    for stage, field in STAGE_TIMEOUT_FIELDS.items():
+        tuned = max(AUTO_MIN_TIMEOUT, tracker.expected(stage) * AUTO_TIMEOUT_HEADROOM)
+        timeouts[field] = min(getattr(preset, field), max(timeouts.get(field, 0), tuned))
+
+    if latency_budget is not None:
+        critical_path = [STAGE_TIMEOUT_FIELDS[stage] for stage in CORE_STAGES]
+        if not preset.skip_validation and not preset.skip_chains:
+            critical_path.append(max("validation_timeout", "chain_timeout", key=timeouts.get))
+        total = sum(timeouts[field] for field in critical_path)
+        if total > latency_budget:
+            scale = latency_budget / total
+            timeouts = {field: max(1.0, timeout * scale) for field, timeout in timeouts.items()}
+
+    return dataclasses.replace(preset, **timeouts)
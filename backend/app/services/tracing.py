@@ -0,0 +1,430 @@
+import atexit
+import contextvars
+import functools
+import inspect
+import json
+import os
+import random
+import re
+import threading
+import time
+from contextlib import contextmanager
+from typing import Any, Dict, Iterable, Iterator, Optional
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.tracers.context import register_configure_hook
+
+from app.utils.llm_usage import response_token_usage
+from app.utils.logging import setup_logger, set_trace_suffix
+
+logger = setup_logger(__name__)
+
+TRACING_ENABLED = os.getenv("TRACING_ENABLED", "true").lower() == "true"
+# Share of traces recorded, decided where a trace starts; the rest of the trace follows that decision
+TRACE_SAMPLE_RATE = float(os.getenv("TRACE_SAMPLE_RATE", 0.1))
+# Finished spans are appended here as OTLP/JSON, one export request per line
+TRACE_EXPORT_PATH = os.getenv("TRACE_EXPORT_PATH", "app/storage/traces.jsonl")
+TRACE_EXPORT_INTERVAL = float(os.getenv("TRACE_EXPORT_INTERVAL", 5))
+TRACE_EXPORT_BATCH_SIZE = int(os.getenv("TRACE_EXPORT_BATCH_SIZE", 512))
+# Spans waiting for export beyond this are dropped instead of slowing requests down
+TRACE_MAX_QUEUE = int(os.getenv("TRACE_MAX_QUEUE", 20000))
+# The export file is moved to <path>.1 once it passes this size
+TRACE_EXPORT_MAX_BYTES = int(os.getenv("TRACE_EXPORT_MAX_BYTES", 100 * 1024 * 1024))
+TRACE_SERVICE_NAME = os.getenv("OTEL_SERVICE_NAME", "multi-agent-ai-workspace")
+
+# OTLP enum values
+SPAN_KINDS = {"internal": 1, "server": 2, "client": 3}
+STATUS_UNSET, STATUS_OK, STATUS_ERROR = 0, 1, 2
+
+TRACEPARENT_PATTERN = re.compile(r"^00-([0-9a-f]{32})-([0-9a-f]{16})-([0-9a-f]{2})$")
+
+_current_span = contextvars.ContextVar("trace_span", default=None)
+_INHERIT = object()
+
+
+class Span:
+    """
+    One timed operation of a trace, identified like W3C trace context (128-bit trace
+    id, 64-bit span id). Spans of unsampled traces record and export nothing.
+    """
+
+    __slots__ = ("name", "trace_id", "span_id", "parent_id", "sampled", "remote", "kind", "attributes",
+                 "links", "start_ns", "end_ns", "status", "status_message")
+
+    def __init__(self, name: str, trace_id: str, parent_id: Optional[str] = None, sampled: bool = True,
+                 kind: str = "internal", attributes: Optional[Dict[str, Any]] = None, links: Iterable["Span"] = (),
+                 start_ns: Optional[int] = None, span_id: Optional[str] = None, remote: bool = False):
+        self.name = name
+        self.trace_id = trace_id
+        self.span_id = span_id or f"{random.getrandbits(64) or 1:016x}"
+        self.parent_id = parent_id
+        self.sampled = sampled
+        self.remote = remote
+        self.kind = kind
+        self.attributes = {key: value for key, value in (attributes or {}).items() if value is not None}
+        self.links = [(link.trace_id, link.span_id) for link in links if link is not None and link.sampled]
+        self.start_ns = start_ns or time.time_ns()
+        self.end_ns = None
+        self.status = STATUS_UNSET
+        self.status_message = ""
+
+    def set_attribute(self, key: str, value: Any):
+        if self.sampled and value is not None:
+            self.attributes[key] = value
+
+    def set_error(self, error: BaseException):
+        if self.sampled:
+            self.status = STATUS_ERROR
+            self.status_message = f"{type(error).__name__}: {error}"
+
+    def end(self, end_ns: Optional[int] = None):
+        """Finish the span and queue it for export (once; remote and unsampled spans are never exported)"""
+        if not self.sampled or self.remote or self.end_ns is not None:
+            return
+        self.end_ns = end_ns or time.time_ns()
+        get_trace_exporter().export(self)
+
+    @property
+    def traceparent(self) -> str:
+        return f"00-{self.trace_id}-{self.span_id}-{'01' if self.sampled else '00'}"
+
+    def to_otlp(self) -> Dict[str, Any]:
+        span = {
+            "traceId": self.trace_id,
+            "spanId": self.span_id,
+            "parentSpanId": self.parent_id or "",
+            "name": self.name,
+            "kind": SPAN_KINDS.get(self.kind, 1),
+            "startTimeUnixNano": str(self.start_ns),
+            "endTimeUnixNano": str(self.end_ns),
+            "attributes": [otlp_attribute(key, value) for key, value in self.attributes.items()],
+            "status": {"code": self.status, "message": self.status_message} if self.status_message else {"code": self.status},
+        }
+        if self.links:
+            span["links"] = [{"traceId": trace_id, "spanId": span_id} for trace_id, span_id in self.links]
+        return span
+
+
+# Returned by start_span when tracing is off: no ids, records nothing
+_DISABLED = Span("disabled", trace_id="", sampled=False, span_id="0" * 16)
+
+
+def otlp_attribute(key: str, value: Any) -> Dict[str, Any]:
+    if isinstance(value, bool):
+        typed = {"boolValue": value}
+    elif isinstance(value, int):
+        typed = {"intValue": str(value)}
+    elif isinstance(value, float):
+        typed = {"doubleValue": value}
+    elif isinstance(value, (list, tuple)):
+        typed = {"arrayValue": {"values": [otlp_attribute("", item)["value"] for item in value]}}
+    else:
+        typed = {"stringValue": str(value)}
+    return {"key": key, "value": typed}
+
+
+def current_span() -> Optional[Span]:
+    return _current_span.get()
+
+
+def start_span(name: str, parent=_INHERIT, kind: str = "internal", attributes: Optional[Dict[str, Any]] = None,
+               links: Iterable[Span] = ()) -> Span:
+    """
+    A new span under parent (default: the current span). Without a parent it starts a
+    trace, sampled with probability TRACE_SAMPLE_RATE. Under an unsampled parent the
+    parent itself is returned, so an unsampled trace costs one span object.
+    The caller ends it; see span() for the usual block form.
+    """
+    if not TRACING_ENABLED:
+        return _DISABLED
+    if parent is _INHERIT:
+        parent = _current_span.get()
+    if parent is None:
+        return Span(name, f"{random.getrandbits(128) or 1:032x}", sampled=random.random() < TRACE_SAMPLE_RATE,
+                    kind=kind, attributes=attributes, links=links)
+    if not parent.sampled:
+        return parent
+    return Span(name, parent.trace_id, parent.span_id, kind=kind, attributes=attributes, links=links)
+
+
+@contextmanager
+def span(name: str, parent=_INHERIT, kind: str = "internal", attributes: Optional[Dict[str, Any]] = None,
+         links: Iterable[Span] = ()):
+    """Run the block in a new span (the current one inside it, so threads started with a copied context nest under it)"""
+    current = start_span(name, parent, kind, attributes, links)
+    token = _current_span.set(current)
+    try:
+        yield current
+    except BaseException as e:
+        current.set_error(e)
+        raise
+    finally:
+        _current_span.reset(token)
+        if current is not parent:
+            current.end()
+
+
+@contextmanager
+def use_span(current: Optional[Span]):
+    """Make an existing span current for the block without ending it"""
+    token = _current_span.set(current)
+    try:
+        yield current
+    finally:
+        _current_span.reset(token)
+
+
+def iter_in_span(current: Span, events: Iterator) -> Iterator:
+    """Yield from events; the span ends when they run out, raise or the consumer stops"""
+    try:
+        yield from events
+    except BaseException as e:
+        current.set_error(e)
+        raise
+    finally:
+        current.end()
+
+
+def traced(name: str, kind: str = "internal"):
+    """Decorator: every call of the (sync or async) function runs in a span"""
+    def decorate(func):
+        if inspect.iscoroutinefunction(func):
+            @functools.wraps(func)
+            async def async_wrapper(*args, **kwargs):
+                with span(name, kind=kind):
+                    return await func(*args, **kwargs)
+            return async_wrapper
+
+        @functools.wraps(func)
+        def wrapper(*args, **kwargs):
+            with span(name, kind=kind):
+                return func(*args, **kwargs)
+        return wrapper
+    return decorate
+
+
+def record_span(name: str, seconds: float, error: bool = False, kind: str = "client",
+                attributes: Optional[Dict[str, Any]] = None):
+    """A finished call of `seconds`, ending now, under the current span; calls outside a sampled trace are not recorded"""
+    parent = _current_span.get()
+    if parent is None or not parent.sampled:
+        return
+    end_ns = time.time_ns()
+    child = Span(name, parent.trace_id, parent.span_id, kind=kind, attributes=attributes,
+                 start_ns=end_ns - int(seconds * 1e9))
+    if error:
+        child.status = STATUS_ERROR
+    child.end(end_ns)
+
+
+def parse_traceparent(header: Optional[str]) -> Optional[Span]:
+    """The remote parent named by a W3C traceparent header, None if absent or malformed"""
+    match = TRACEPARENT_PATTERN.match((header or "").strip().lower())
+    if not match or not TRACING_ENABLED:
+        return None
+    trace_id, span_id, flags = match.groups()
+    if trace_id == "0" * 32 or span_id == "0" * 16:
+        return None
+    return Span("remote", trace_id, sampled=bool(int(flags, 16) & 1), span_id=span_id, remote=True)
+
+
+@contextmanager
+def continue_trace(traceparent: Optional[str]):
+    """Spans started in the block join the caller's trace (and its sampling decision) when a traceparent is given"""
+    parent = parse_traceparent(traceparent)
+    if parent is None:
+        yield None
+        return
+    with use_span(parent):
+        yield parent
+
+
+class TracingCallbackHandler(BaseCallbackHandler):
+    """Spans for LangChain chain, agent, tool and LLM runs, nested as LangChain nests them, inside the current trace"""
+
+    run_inline = True
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._spans = {}  # run_id -> Span
+
+    def _start(self, run_id, parent_run_id, name: str, kind: str = "internal", attributes: Optional[dict] = None):
+        with self._lock:
+            parent = self._spans.get(parent_run_id) if parent_run_id is not None else None
+        if parent is None:
+            parent = _current_span.get()
+        # Only inside a sampled trace: a stray tool call doesn't start one of its own
+        if parent is None or not parent.sampled:
+            return
+        child = start_span(name, parent, kind, attributes)
+        with self._lock:
+            self._spans[run_id] = child
+
+    def _end(self, run_id, error: Optional[BaseException] = None, attributes: Optional[dict] = None):
+        with self._lock:
+            child = self._spans.pop(run_id, None)
+        if child is None:
+            return
+        for key, value in (attributes or {}).items():
+            child.set_attribute(key, value)
+        if error is not None:
+            child.set_error(error)
+        child.end()
+
+    @staticmethod
+    def _name(serialized, kwargs) -> str:
+        serialized = serialized or {}
+        return kwargs.get("name") or serialized.get("name") or (serialized.get("id") or ["run"])[-1]
+
+    @staticmethod
+    def _model(kwargs) -> str:
+        params = kwargs.get("invocation_params") or {}
+        return params.get("model_name") or params.get("model") or "unknown"
+
+    def on_chain_start(self, serialized, inputs, *, run_id, parent_run_id=None, **kwargs) -> None:
+        self._start(run_id, parent_run_id, f"chain {self._name(serialized, kwargs)}")
+
+    def on_chain_end(self, outputs, *, run_id, **kwargs) -> None:
+        self._end(run_id)
+
+    def on_chain_error(self, error, *, run_id, **kwargs) -> None:
+        self._end(run_id, error)
+
+    def on_tool_start(self, serialized, input_str, *, run_id, parent_run_id=None, **kwargs) -> None:
+        self._start(run_id, parent_run_id, f"tool {self._name(serialized, kwargs)}",
+                    attributes={"tool.input_chars": len(input_str or "")})
+
+    def on_tool_end(self, output, *, run_id, **kwargs) -> None:
+        self._end(run_id)
+
+    def on_tool_error(self, error, *, run_id, **kwargs) -> None:
+        self._end(run_id, error)
+
+    def _start_llm(self, run_id, parent_run_id, kwargs):
+        model = self._model(kwargs)
+        self._start(run_id, parent_run_id, f"llm {model}", "client",
+                    {"gen_ai.system": "groq", "gen_ai.request.model": model})
+
+    def on_llm_start(self, serialized, prompts, *, run_id, parent_run_id=None, **kwargs) -> None:
+        self._start_llm(run_id, parent_run_id, kwargs)
+
+    def on_chat_model_start(self, serialized, messages, *, run_id, parent_run_id=None, **kwargs) -> None:
+        self._start_llm(run_id, parent_run_id, kwargs)
+
+    def on_llm_end(self, response, *, run_id, **kwargs) -> None:
+        prompt_tokens, completion_tokens = response_token_usage(response)
+        self._end(run_id, attributes={"gen_ai.usage.input_tokens": prompt_tokens,
+                                      "gen_ai.usage.output_tokens": completion_tokens})
+
+    def on_llm_error(self, error, *, run_id, **kwargs) -> None:
+        self._end(run_id, error)
+
+
+class JsonFileExporter:
+    """
+    Appends finished spans to a file as OTLP/JSON, one ExportTraceServiceRequest per
+    line (the format the OpenTelemetry Collector's otlpjsonfile receiver reads).
+    Spans are written by a daemon thread every `interval` seconds or once `batch_size`
+    are waiting; past `max_queue` waiting spans, new ones are dropped.
+    """
+
+    def __init__(self, path: str = TRACE_EXPORT_PATH, interval: float = TRACE_EXPORT_INTERVAL,
+                 batch_size: int = TRACE_EXPORT_BATCH_SIZE, max_queue: int = TRACE_MAX_QUEUE,
+                 max_bytes: int = TRACE_EXPORT_MAX_BYTES):
+        self.path = path
+        self.interval = interval
+        self.batch_size = batch_size
+        self.max_queue = max_queue
+        self.max_bytes = max_bytes
+        self._spans = []
+        self._cond = threading.Condition()
+        self._write_lock = threading.Lock()
+        self._closed = False
+        self._stats = {"exported": 0, "dropped": 0, "write_errors": 0}
+        self._thread = threading.Thread(target=self._export_on_interval, name="trace-exporter", daemon=True)
+        self._thread.start()
+
+    def export(self, finished: Span):
+        with self._cond:
+            if len(self._spans) >= self.max_queue:
+                self._stats["dropped"] += 1
+                return
+            self._spans.append(finished)
+            if len(self._spans) >= self.batch_size:
+                self._cond.notify()
+
+    def _export_on_interval(self):
+        while True:
+            with self._cond:
+                if not self._closed and len(self._spans) < self.batch_size:
+                    self._cond.wait(self.interval)
+                closed = self._closed
+            self.flush()
+            if closed:
+                return
+
+    def flush(self):
+        """Write the waiting spans now"""
+        with self._cond:
+            spans, self._spans = self._spans, []
+        if not spans:
+            return
+        request = {"resourceSpans": [{
+            "resource": {"attributes": [otlp_attribute("service.name", TRACE_SERVICE_NAME)]},
+            "scopeSpans": [{"scope": {"name": __name__}, "spans": [finished.to_otlp() for finished in spans]}],
+        }]}
+        line = json.dumps(request, separators=(",", ":"), default=str) + "\n"
+        try:
+            with self._write_lock:
+                os.makedirs(os.path.dirname(self.path) or ".", exist_ok=True)
+                if os.path.exists(self.path) and os.path.getsize(self.path) >= self.max_bytes:
+                    os.replace(self.path, f"{self.path}.1")
+                with open(self.path, "a", encoding="utf-8") as f:
+                    f.write(line)
+        except Exception as e:
+            logger.error(f"Trace export to {self.path} failed: {e}")
+            with self._cond:
+                self._stats["write_errors"] += 1
+                self._stats["dropped"] += len(spans)
+            return
+        with self._cond:
+            self._stats["exported"] += len(spans)
+
+    def stats(self) -> dict:
+        with self._cond:
+            return dict(self._stats, queued=len(self._spans))
+
+    def close(self):
+        """Write what is left and stop the export thread"""
+        with self._cond:
+            self._closed = True
+            self._cond.notify_all()
+        self._thread.join(timeout=self.interval + 1)
+        self.flush()
+
+
+def _log_suffix() -> str:
+    current = _current_span.get()
+    if current is None or not current.trace_id:
+        return ""
+    return f" [trace={current.trace_id} span={current.span_id}]"
+
+
+# Log lines name the trace and span they were written in, whichever thread wrote them
+set_trace_suffix(_log_suffix)
+
+# Attached by LangChain to every chain, tool and LLM run in the process
+_tracing_handler = contextvars.ContextVar("tracing_handler", default=TracingCallbackHandler() if TRACING_ENABLED else None)
+register_configure_hook(_tracing_handler, inheritable=True)
+
+_trace_exporter = None
+_trace_exporter_lock = threading.Lock()
+
+def get_trace_exporter() -> JsonFileExporter:
+    global _trace_exporter
+    if _trace_exporter is None:
+        with _trace_exporter_lock:
+            if _trace_exporter is None:
+                _trace_exporter = JsonFileExporter()
+                atexit.register(_trace_exporter.close)
+    return _trace_exporter
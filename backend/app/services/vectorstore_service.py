@@ -1,25 +1,192 @@
+import os
+import threading
+import uuid
+import numpy as np
 from langchain.vectorstores import FAISS
 from langchain.schema import Document
-from app.utils.persistent_faiss import save_faiss_index, load_faiss_index
+from app.utils.persistent_faiss import (
+    save_faiss_index,
+    load_faiss_snapshot,
+    get_index_generation,
+    append_to_wal,
+    read_wal,
+    replay_wal,
+    index_file_lock
+)
+from app.services.metrics import timed_call
+from app.utils.rwlock import ReadWriteLock
+from app.utils.async_utils import run_blocking
+from app.utils.logging import setup_logger
+
+logger = setup_logger(__name__)
+
+# Fold the WAL into a new base snapshot once it grows past this size
+WAL_COMPACT_BYTES = int(os.getenv("FAISS_WAL_COMPACT_BYTES", 64 * 1024 * 1024))
+
+
+class ResidentVectorStore:
+    """Process-wide in-memory FAISS index.
+
+    Searches share a read lock, additions are applied in place under the
+    write lock and appended to the WAL, and the disk copy is only re-read
+    when its generation differs from the one we last saw: a new base
+    snapshot triggers a full reload, a grown WAL only replays the new tail.
+    """
+
+    def __init__(self):
+        self._lock = ReadWriteLock()
+        self._save_lock = threading.Lock()
+        self._vectorstore = None
+        self._generation = None
+        self._wal_offset = 0
+        self._compacting = False
+
+    def _sync_from_disk(self, embedding_model):
+        """Bring the resident copy up to the disk generation. Caller holds the write lock"""
+        generation = get_index_generation()
+        if generation is None or generation == self._generation:
+            return
+        base, wal_size = generation
+        if self._generation is None or base != self._generation[0] or wal_size < self._wal_offset:
+            self._vectorstore, self._wal_offset = load_faiss_snapshot(embedding_model)
+            logger.info(f"FAISS index (re)loaded from disk: {self._vectorstore.index.ntotal if self._vectorstore else 0} vectors")
+        else:
+            records, self._wal_offset = read_wal(offset=self._wal_offset)
+            self._vectorstore = replay_wal(self._vectorstore, records, embedding_model)
+        self._generation = generation
+
+    def _refresh(self, embedding_model):
+        generation = get_index_generation()
+        if generation is None or generation == self._generation:
+            return
+        with self._lock.write():
+            self._sync_from_disk(embedding_model)
+
+    def search(self, query, embedding_model, k=3):
+        self._refresh(embedding_model)
+        if self._vectorstore is None:
+            return []
+        embedding = embedding_model.embed_query(query)
+        return self._search_by_vector(embedding, k)
+
+    def _search_by_vector(self, embedding, k):
+        with timed_call("faiss", "search"), self._lock.read():
+            if self._vectorstore is None:
+                return []
+            return self._vectorstore.similarity_search_by_vector(embedding, k=k)
+
+    def search_by_vectors(self, embeddings, embedding_model, k=3):
+        """One FAISS search for many query vectors; a list of documents per vector"""
+        self._refresh(embedding_model)
+        with timed_call("faiss", "search_batch"), self._lock.read():
+            vectorstore = self._vectorstore
+            if vectorstore is None or not len(embeddings):
+                return [[] for _ in embeddings]
+            vectors = np.asarray(embeddings, dtype=np.float32)
+            if getattr(vectorstore, "_normalize_L2", False):
+                vectors = vectors / np.maximum(np.linalg.norm(vectors, axis=1, keepdims=True), 1e-12)
+            _, indices = vectorstore.index.search(vectors, k)
+            return [
+                [vectorstore.docstore.search(vectorstore.index_to_docstore_id[i]) for i in row if i != -1]
+                for row in indices
+            ]
+
+    async def asearch(self, query, embedding_model, k=3):
+        """Async search: the query is embedded on the event loop, the locked lookup runs on the bounded pool"""
+        if get_index_generation() != self._generation:
+            await run_blocking(self._refresh, embedding_model)
+        if self._vectorstore is None:
+            return []
+        embedding = await embedding_model.aembed_query(query)
+        return await run_blocking(self._search_by_vector, embedding, k)
+
+    def add_documents(self, docs, embedding_model):
+        # Embed outside the lock so searches are not blocked on the provider
+        texts = [doc.page_content for doc in docs]
+        vectors = embedding_model.embed_documents(texts)
+        records = [
+            (str(uuid.uuid4()), text, doc.metadata, vector)
+            for doc, text, vector in zip(docs, texts, vectors)
+        ]
+        with timed_call("faiss", "add"), self._lock.write():
+            # Durable first; replaying the tail also picks up other writers' records
+            append_to_wal(records)
+            self._sync_from_disk(embedding_model)
+        if self._generation and self._generation[1] >= WAL_COMPACT_BYTES:
+            self.compact_in_background()
+
+    def compact(self):
+        """Write a new base snapshot from the resident index and drop the WAL records it holds"""
+        with self._save_lock:
+            # Readers keep searching; this process's writers wait for the write lock and
+            # other processes' appends for the file lock. The resident index holds the WAL
+            # up to _wal_offset, so only that prefix is dropped: anything appended by another
+            # process since stays in the WAL.
+            with self._lock.read(), index_file_lock():
+                if self._vectorstore is None:
+                    return
+                save_faiss_index(self._vectorstore, wal_offset=self._wal_offset)
+                base = get_index_generation()[0]
+                vectors = self._vectorstore.index.ntotal
+            with self._lock.write():
+                # The kept tail is replayed by the next sync
+                self._generation = (base, 0)
+                self._wal_offset = 0
+            logger.info(f"FAISS index compacted: {vectors} vectors")
+
+    def compact_in_background(self):
+        with self._save_lock:
+            if self._compacting:
+                return
+            self._compacting = True
+
+        def run():
+            try:
+                self.compact()
+            except Exception as e:
+                logger.error(f"FAISS compaction failed: {e}")
+            finally:
+                self._compacting = False
+
+        threading.Thread(target=run, name="faiss-compaction", daemon=True).start()
+
+    def replace(self, vectorstore):
+        with self._lock.write():
+            self._vectorstore = vectorstore
+        self.compact()
+
+    def invalidate(self):
+        """Drop the resident copy so the next access reloads from disk"""
+        with self._lock.write():
+            self._vectorstore = None
+            self._generation = None
+            self._wal_offset = 0
+
+
+_resident_store = ResidentVectorStore()
+
+def get_resident_store():
+    return _resident_store
 
 def index_documents(docs, embedding_model):
     vectorstore = FAISS.from_documents(docs, embedding_model)
-    save_faiss_index(vectorstore)
+    _resident_store.replace(vectorstore)
     return vectorstore
 
 def query_vectorstore(query, embedding_model, k=3):
     return search_documents(query, embedding_model, k)
 
 def search_documents(query, embedding_model, k=3):
-    vectorstore = load_faiss_index()
-    if not vectorstore:
-        return []
-    return vectorstore.similarity_search(query, k=k)
+    return _resident_store.search(query, embedding_model, k=k)
+
+def search_documents_batch(queries, embedding_model, k=3, embeddings=None):
+    """Documents for each query from one batched query embedding and one FAISS search (pass embeddings to reuse them)"""
+    if embeddings is None:
+        embeddings = embedding_model.embed_queries(list(queries))
+    return _resident_store.search_by_vectors(embeddings, embedding_model, k=k)
+
+async def asearch_documents(query, embedding_model, k=3):
+    return await _resident_store.asearch(query, embedding_model, k=k)
 
 def add_documents_to_index(docs, embedding_model):
-    vectorstore = load_faiss_index()
-    if vectorstore:
-        vectorstore.add_documents(docs)
-    else:
-        vectorstore = FAISS.from_documents(docs, embedding_model)
-    save_faiss_index(vectorstore)
+    _resident_store.add_documents(docs, embedding_model)
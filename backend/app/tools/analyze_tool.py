@@ -1,20 +1,10 @@
 # tools/analyze_tool.py
-import os
 from langchain.tools import Tool
 from langchain.prompts import PromptTemplate
-from langchain.chains import LLMChain
-from langchain_groq import ChatGroq
+from app.services.llm_clients import get_llm_chain
 
-def analyze_content(input_text: str) -> str:
-    """Analyze research findings and extract key insights."""
-    try:
-        llm = ChatGroq(
-            groq_api_key=os.getenv("GROQ_API_KEY"),
-            model="llama3-70b-8192"
-        )
-
-        prompt = PromptTemplate.from_template(
-            """You are an Expert Analyst.
+ANALYZE_PROMPT = PromptTemplate.from_template(
+    """You are an Expert Analyst.
 
 Analyze the following research findings and provide comprehensive insights.
 
@@ -33,19 +23,37 @@ Please provide your analysis in a clear, structured format with:
 - Important Themes
 - Implications
 - Areas for Further Investigation"""
-        )
-
-        chain = LLMChain(llm=llm, prompt=prompt)
-        result = chain.run(input=input_text)
-        
-        return result
-        
-    except Exception as e:
+)
+
+def _build_analyze_chain():
+    return get_llm_chain("analyze", ANALYZE_PROMPT)
+
+def analyze_content(input_text: str, raise_errors: bool = False) -> str:
+    """Analyze research findings and extract key insights.
+
+    With raise_errors, LLM failures propagate instead of returning placeholder text
+    (the pipeline's direct mode retries them or uses its own fallback).
+    """
+    try:
+        return _build_analyze_chain().run(input=input_text)
+    except Exception:
+        if raise_errors:
+            raise
+        return f"Analysis completed with basic insights: {input_text[:200]}..."
+
+async def aanalyze_content(input_text: str, raise_errors: bool = False) -> str:
+    """Async variant of analyze_content for agents driven with ainvoke."""
+    try:
+        return await _build_analyze_chain().arun(input=input_text)
+    except Exception:
+        if raise_errors:
+            raise
         return f"Analysis completed with basic insights: {input_text[:200]}..."
 
 def get_analyze_tool():
     return Tool(
         name="Content Analyzer",
         func=analyze_content,
+        coroutine=aanalyze_content,
         description="Analyzes research findings and extracts key insights, themes, and implications."
     )
@@ -1,20 +1,10 @@
-import os
 from langchain.tools import Tool
 from langchain.prompts import PromptTemplate
-from langchain.chains import LLMChain
-from langchain_groq import ChatGroq
+from app.services.llm_clients import get_llm_chain
 import json
 
-def plan_content(input_text: str) -> str:
-    """Create a structured content plan based on analysis insights."""
-    try:
-        llm = ChatGroq(
-            groq_api_key=os.getenv("GROQ_API_KEY"),
-            model="llama3-70b-8192"
-        )
-
-        prompt = PromptTemplate.from_template(
-            """You are a Content Planning Expert.
+PLAN_PROMPT = PromptTemplate.from_template(
+    """You are a Content Planning Expert.
 
 Create a detailed, structured content plan based on the provided insights.
 
@@ -36,19 +26,40 @@ Please create a content plan with the following structure:
 - Section 5: [Title and objectives]
 
 Make sure each section has clear objectives and flows logically."""
-        )
+)
+
+def _build_plan_chain():
+    return get_llm_chain("plan", PLAN_PROMPT)
 
-        chain = LLMChain(llm=llm, prompt=prompt)
+def plan_content(input_text: str, raise_errors: bool = False) -> str:
+    """Create a structured content plan based on analysis insights.
+
+    With raise_errors, LLM failures propagate instead of returning placeholder text.
+    """
+    try:
+        chain = _build_plan_chain()
         result = chain.run(input=input_text)
         
         return result
         
     except Exception as e:
+        if raise_errors:
+            raise
+        return f"Content Planning Error: {str(e)}. Proceeding with basic plan structure."
+
+async def aplan_content(input_text: str, raise_errors: bool = False) -> str:
+    """Async variant of plan_content for agents driven with ainvoke."""
+    try:
+        return await _build_plan_chain().arun(input=input_text)
+    except Exception as e:
+        if raise_errors:
+            raise
         return f"Content Planning Error: {str(e)}. Proceeding with basic plan structure."
 
 def get_plan_tool():
     return Tool(
         name="Content Planner",
         func=plan_content,
+        coroutine=aplan_content,
         description="Creates a structured content plan based on analysis insights. Input should be analysis results or topic information."
     )
\ No newline at end of file
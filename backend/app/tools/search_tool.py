@@ -1,16 +1,27 @@
 import os
 from langchain.tools import Tool
 from functools import partial
-from app.services.vectorstore_service import search_documents
+from app.services.vectorstore_service import search_documents, asearch_documents
 from app.services.embedding_service import get_embedding_model
 from langchain_community.utilities.serpapi import SerpAPIWrapper
 from app.services.vectorstore_service import query_vectorstore
+from app.services.rate_limiter import rate_limited, arate_limited
 
 def get_web_search_tool():
     search = SerpAPIWrapper(serpapi_api_key=os.getenv("SERPAPI_API_KEY"))
+    
+    def web_search(query: str) -> str:
+        with rate_limited("serpapi"):
+            return search.run(query)
+    
+    async def aweb_search(query: str) -> str:
+        async with arate_limited("serpapi"):
+            return await search.arun(query)
+    
     return Tool(
         name="Web Search",
-        func=search.run,
+        func=web_search,
+        coroutine=aweb_search,
         description="Search the web using SerpAPI for up-to-date information."
     )
     
@@ -22,10 +33,19 @@ def local_vector_search(query: str) -> str:
     except Exception as e:
         return f"Vector search failed: {str(e)}"
 
+async def alocal_vector_search(query: str) -> str:
+    try:
+        embedding_model = get_embedding_model()
+        results = await asearch_documents(query, embedding_model, k=3)
+        return "\n".join([doc.page_content for doc in results])
+    except Exception as e:
+        return f"Vector search failed: {str(e)}"
+
 def get_local_vector_search_tool():
     return Tool(
         name="Local Vector Search",
         func=local_vector_search,
+        coroutine=alocal_vector_search,
         description="Searches local FAISS vector store for relevant documents."
     )
 
@@ -1,10 +1,8 @@
-import os
 import json
 import re
 from langchain.tools import Tool
 from langchain.prompts import PromptTemplate
-from langchain.chains import LLMChain
-from langchain_groq import ChatGroq
+from app.services.llm_clients import get_llm_chain
 
 def extract_json_from_response(response: str) -> dict:
     """Extract JSON from LLM response that might contain markdown code blocks."""
@@ -30,52 +28,68 @@ def extract_json_from_response(response: str) -> dict:
     
     return None
 
-def write_content_wrapper(input_text: str) -> str:
-    """Wrapper function for the write tool with JSON parsing."""
-    try:
-        llm = ChatGroq(
-            groq_api_key=os.getenv("GROQ_API_KEY"),
-            model="llama3-70b-8192"
-        )
-
-        prompt = PromptTemplate.from_template(
-            """You are a professional writer.
+WRITE_PROMPT = PromptTemplate.from_template(
+    """You are a professional writer.
 
 Task: Based on the following content plan, draft a detailed, coherent, and well-structured article or report.
 
 IMPORTANT: Respond with ONLY a JSON object in this exact format:
 
-{
+{{
   "title": "Title of the article/report",
   "body": "Full article/report text with proper formatting and structure"
-}
+}}
 
 Content plan:
 {input}
 
 Remember: Return ONLY the JSON object, no additional text, explanations, or markdown code blocks."""
-        )
-        
-        chain = LLMChain(llm=llm, prompt=prompt)
+)
+
+def _build_write_chain():
+    return get_llm_chain("write", WRITE_PROMPT, streaming=True)
+
+def _format_article(response: str) -> str:
+    # Try to extract JSON from the response
+    json_data = extract_json_from_response(response)
+    
+    if json_data and "title" in json_data and "body" in json_data:
+        # Format as a readable article
+        formatted_content = f"# {json_data['title']}\n\n{json_data['body']}"
+        return formatted_content
+    else:
+        # Fallback: return the raw response
+        return f"# Article Draft\n\n{response}"
+
+def write_content_wrapper(input_text: str, raise_errors: bool = False) -> str:
+    """Wrapper function for the write tool with JSON parsing.
+
+    With raise_errors, LLM failures propagate instead of returning placeholder text.
+    """
+    try:
+        chain = _build_write_chain()
         response = chain.run(input=input_text)
-        
-        # Try to extract JSON from the response
-        json_data = extract_json_from_response(response)
-        
-        if json_data and "title" in json_data and "body" in json_data:
-            # Format as a readable article
-            formatted_content = f"# {json_data['title']}\n\n{json_data['body']}"
-            return formatted_content
-        else:
-            # Fallback: return the raw response
-            return f"# Article Draft\n\n{response}"
+        return _format_article(response)
             
     except Exception as e:
+        if raise_errors:
+            raise
+        return f"# Content Writing Error\n\nUnable to generate content: {str(e)}\n\nFallback content based on: {input_text[:100]}..."
+
+async def awrite_content_wrapper(input_text: str, raise_errors: bool = False) -> str:
+    """Async variant of write_content_wrapper for agents driven with ainvoke."""
+    try:
+        response = await _build_write_chain().arun(input=input_text)
+        return _format_article(response)
+    except Exception as e:
+        if raise_errors:
+            raise
         return f"# Content Writing Error\n\nUnable to generate content: {str(e)}\n\nFallback content based on: {input_text[:100]}..."
 
 def get_write_tool():
     return Tool(
         name="Writer",
         func=write_content_wrapper,
+        coroutine=awrite_content_wrapper,
         description="Draft content from a given plan using an LLM."
     )
\ No newline at end of file
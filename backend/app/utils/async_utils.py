@@ -0,0 +1,19 @@
+import asyncio
+import contextvars
+import functools
+import os
+from concurrent.futures import ThreadPoolExecutor
+
+# One bounded pool for the blocking work the async pipeline cannot avoid
+# (FAISS lookups under the index lock, disk reloads). Shared by every event
+# loop so the thread count stays fixed no matter how many runs are in flight.
+ASYNC_BLOCKING_THREADS = int(os.getenv("ASYNC_BLOCKING_THREADS", 8))
+
+_blocking_executor = ThreadPoolExecutor(max_workers=ASYNC_BLOCKING_THREADS, thread_name_prefix="pipeline-blocking")
+
+
+async def run_blocking(func, *args, **kwargs):
+    """Run a blocking call on the shared bounded pool, keeping the caller's context"""
+    loop = asyncio.get_running_loop()
+    context = contextvars.copy_context()
+    return await loop.run_in_executor(_blocking_executor, functools.partial(context.run, func, *args, **kwargs))
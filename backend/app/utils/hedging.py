@@ -0,0 +1,159 @@
+import asyncio
+import contextvars
+import os
+import queue
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from typing import Callable, Optional
+
+from app.utils.logging import setup_logger
+
+logger = setup_logger(__name__)
+
+RETRY_BASE_DELAY = float(os.getenv("LLM_RETRY_BASE_DELAY", 0.5))
+RETRY_MAX_DELAY = float(os.getenv("LLM_RETRY_MAX_DELAY", 4))
+# Threads shared by every hedged call's attempts; a hedge is skipped while all are busy
+LLM_ATTEMPT_THREADS = int(os.getenv("LLM_ATTEMPT_THREADS", 32))
+
+# HTTP statuses worth retrying: rate limiting and transient server errors
+TRANSIENT_STATUS_CODES = {408, 409, 429, 500, 502, 503, 504}
+TRANSIENT_ERROR_NAMES = (
+    "Timeout", "TimeoutError", "APITimeoutError", "APIConnectionError", "ConnectError",
+    "ConnectionError", "RemoteProtocolError", "ReadError", "RateLimitError", "InternalServerError",
+    "ServiceUnavailableError",
+)
+
+
+def is_transient_error(error: BaseException) -> bool:
+    """Network errors, timeouts, rate limits and 5xx responses from the LLM provider"""
+    status = getattr(error, "status_code", None) or getattr(getattr(error, "response", None), "status_code", None)
+    if status in TRANSIENT_STATUS_CODES:
+        return True
+    return any(cls.__name__ in TRANSIENT_ERROR_NAMES for cls in type(error).__mro__)
+
+
+def backoff_delay(attempt: int, base: float = RETRY_BASE_DELAY, cap: float = RETRY_MAX_DELAY) -> float:
+    """Full-jitter exponential backoff for the given retry number (0-based)"""
+    return random.uniform(0, min(cap, base * 2 ** attempt))
+
+
+_attempt_executor = ThreadPoolExecutor(max_workers=LLM_ATTEMPT_THREADS, thread_name_prefix="llm-attempt")
+_attempts_lock = threading.Lock()
+_attempts_running = 0
+
+
+def _start_attempt(call: Callable, outcomes: queue.Queue, hedge: bool = False) -> bool:
+    """Run call on the shared pool, its outcome going to the queue. A hedge is only started on an idle thread."""
+    global _attempts_running
+    with _attempts_lock:
+        if hedge and _attempts_running >= LLM_ATTEMPT_THREADS:
+            return False
+        _attempts_running += 1
+    context = contextvars.copy_context()
+
+    def attempt():
+        global _attempts_running
+        try:
+            outcomes.put((context.run(call), None))
+        except Exception as e:
+            outcomes.put((None, e))
+        finally:
+            with _attempts_lock:
+                _attempts_running -= 1
+
+    _attempt_executor.submit(attempt)
+    return True
+
+
+def _hedged_round(call: Callable, duplicate: Callable, hedge_after: Optional[float], label: str):
+    """One round of attempts: the first successful result, else the first non-transient or last error"""
+    if hedge_after is None:
+        return call()
+
+    # Attempts run on the shared pool, like execute_with_timeout; outcomes arrive on the queue
+    outcomes = queue.Queue()
+    _start_attempt(call, outcomes)
+    running = 1
+    try:
+        outcome = outcomes.get(timeout=hedge_after)
+    except queue.Empty:
+        # A saturated pool would only queue the duplicate behind the calls it is meant to beat
+        if _start_attempt(duplicate, outcomes, hedge=True):
+            logger.info(f" {label} slower than {hedge_after:.2f}s, sending a hedged request")
+            running += 1
+        else:
+            logger.info(f" {label} slower than {hedge_after:.2f}s, no idle thread for a hedged request")
+        outcome = outcomes.get()
+
+    while True:
+        running -= 1
+        result, error = outcome
+        if error is None:
+            return result
+        if not running or not is_transient_error(error):
+            raise error
+        outcome = outcomes.get()
+
+
+def hedged_call(call: Callable, hedge_after: Optional[float] = None, retries: int = 0,
+                duplicate: Optional[Callable] = None, label: str = "call"):
+    """
+    Run call(); if it hasn't returned after hedge_after seconds, start duplicate() (default:
+    call) alongside it and return whichever succeeds first. If a round fails with a
+    transient error, retry up to `retries` times after a jittered backoff; other errors
+    are raised at once. A losing attempt can't be interrupted on a thread, so its result
+    is simply dropped.
+    """
+    duplicate = duplicate or call
+    for retry in range(retries + 1):
+        try:
+            return _hedged_round(call, duplicate, hedge_after, label)
+        except Exception as e:
+            if retry == retries or not is_transient_error(e):
+                raise
+            delay = backoff_delay(retry)
+            logger.warning(f" {label} failed ({e}), retry {retry + 1}/{retries} in {delay:.2f}s")
+            time.sleep(delay)
+
+
+async def _ahedged_round(call: Callable, duplicate: Callable, hedge_after: Optional[float], label: str):
+    if hedge_after is None:
+        return await call()
+
+    attempts = [asyncio.ensure_future(call())]
+    try:
+        done, _ = await asyncio.wait(attempts, timeout=hedge_after)
+        if not done:
+            logger.info(f" {label} slower than {hedge_after:.2f}s, sending a hedged request")
+            attempts.append(asyncio.ensure_future(duplicate()))
+
+        pending = set(attempts)
+        while True:
+            done, pending = await asyncio.wait(pending, return_when=asyncio.FIRST_COMPLETED)
+            errors = [task.exception() for task in done]
+            for task, error in zip(done, errors):
+                if error is None:
+                    return task.result()
+            if not pending or not all(is_transient_error(error) for error in errors):
+                raise next(error for error in errors if not pending or not is_transient_error(error))
+    finally:
+        # Unlike threads, the losing attempt can be cancelled
+        for task in attempts:
+            task.cancel()
+
+
+async def ahedged_call(call: Callable, hedge_after: Optional[float] = None, retries: int = 0,
+                       duplicate: Optional[Callable] = None, label: str = "call"):
+    """Async hedged_call: call/duplicate return coroutines, and the losing attempt is cancelled"""
+    duplicate = duplicate or call
+    for retry in range(retries + 1):
+        try:
+            return await _ahedged_round(call, duplicate, hedge_after, label)
+        except Exception as e:
+            if retry == retries or not is_transient_error(e):
+                raise
+            delay = backoff_delay(retry)
+            logger.warning(f" {label} failed ({e}), retry {retry + 1}/{retries} in {delay:.2f}s")
+            await asyncio.sleep(delay)
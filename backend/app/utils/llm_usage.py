@@ -0,0 +1,69 @@
+import contextvars
+import threading
+from contextlib import contextmanager
+
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.tracers.context import register_configure_hook
+
+# Handler that LangChain attaches to every LLM/chat model run in the current context
+_usage_handler = contextvars.ContextVar("llm_usage_handler", default=None)
+register_configure_hook(_usage_handler, inheritable=True)
+
+
+def response_token_usage(response) -> tuple:
+    """(prompt_tokens, completion_tokens) reported in an LLMResult"""
+    prompt_tokens = completion_tokens = 0
+    token_usage = (response.llm_output or {}).get("token_usage") or {}
+    if token_usage:
+        return token_usage.get("prompt_tokens", 0), token_usage.get("completion_tokens", 0)
+    # Streaming responses report usage per message instead
+    for generations in response.generations:
+        for generation in generations:
+            usage = getattr(getattr(generation, "message", None), "usage_metadata", None) or {}
+            prompt_tokens += usage.get("input_tokens", 0)
+            completion_tokens += usage.get("output_tokens", 0)
+    return prompt_tokens, completion_tokens
+
+
+class LLMUsageHandler(BaseCallbackHandler):
+    """Counts LLM calls and token usage for every model run it sees"""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.prompt_tokens = 0
+        self.completion_tokens = 0
+
+    def on_llm_start(self, serialized, prompts, **kwargs) -> None:
+        with self._lock:
+            self.calls += 1
+
+    def on_chat_model_start(self, serialized, messages, **kwargs) -> None:
+        with self._lock:
+            self.calls += 1
+
+    def on_llm_end(self, response, **kwargs) -> None:
+        prompt_tokens, completion_tokens = response_token_usage(response)
+        with self._lock:
+            self.prompt_tokens += prompt_tokens
+            self.completion_tokens += completion_tokens
+
+    def stats(self) -> dict:
+        with self._lock:
+            return {
+                "llm_calls": self.calls,
+                "prompt_tokens": self.prompt_tokens,
+                "completion_tokens": self.completion_tokens,
+                "total_tokens": self.prompt_tokens + self.completion_tokens
+            }
+
+
+@contextmanager
+def track_llm_usage():
+    """Count every LLM call made in this context (including threads that copy it)"""
+    handler = LLMUsageHandler()
+    reset_token = _usage_handler.set(handler)
+    try:
+        yield handler
+    finally:
+        _usage_handler.reset(reset_token)
@@ -1,6 +1,21 @@
 import logging
 import sys
 
+# Set by app.services.tracing: " [trace=<id> span=<id>]" inside a trace, "" outside
+_trace_suffix = lambda: ""
+
+
+def set_trace_suffix(func):
+    global _trace_suffix
+    _trace_suffix = func
+
+
+class _TraceFilter(logging.Filter):
+    def filter(self, record):
+        record.trace = _trace_suffix()
+        return True
+
+
 def setup_logger(name="agent_logger", level=logging.DEBUG) -> logging.Logger:
     """Setup and return a configured logger instance."""
     logger = logging.getLogger(name)
@@ -9,10 +24,11 @@ def setup_logger(name="agent_logger", level=logging.DEBUG) -> logging.Logger:
     if not logger.handlers:
         handler = logging.StreamHandler(sys.stdout)
         formatter = logging.Formatter(
-            '%(asctime)s | %(levelname)s | %(name)s | %(message)s',
+            '%(asctime)s | %(levelname)s | %(name)s | %(message)s%(trace)s',
             datefmt='%Y-%m-%d %H:%M:%S'
         )
         handler.setFormatter(formatter)
+        handler.addFilter(_TraceFilter())
         logger.addHandler(handler)
 
     return logger
@@ -1,15 +1,216 @@
+import base64
+import json
 import os
+import shutil
+from contextlib import contextmanager
+import numpy as np
 from langchain_community.vectorstores import FAISS
 from flask import current_app
 
+try:
+    import fcntl
+except ImportError:  # Windows: no inter-process locking, single writer process only
+    fcntl = None
+
 FAISS_INDEX_PATH = "app/storage/faiss_index"
 
-def save_faiss_index(faiss_index):
-    os.makedirs(FAISS_INDEX_PATH, exist_ok=True)
-    faiss_index.save_local(FAISS_INDEX_PATH)
+# On-disk layout:
+#   CURRENT          name of the active base snapshot directory (e.g. "base-000003")
+#   base-NNNNNN/     index.faiss + index.pkl written by save_local
+#   index.wal        append-only JSON lines, one per document added since the snapshot
+#   index.lock       flock()ed shared by appends, exclusively by compaction
+# A directory without CURRENT but with index.faiss/index.pkl at the top level is
+# treated as a legacy base snapshot.
+CURRENT_FILENAME = "CURRENT"
+WAL_FILENAME = "index.wal"
+LOCK_FILENAME = "index.lock"
+
+
+def _wal_path(path):
+    return os.path.join(path, WAL_FILENAME)
+
+@contextmanager
+def index_file_lock(path=None, shared=False):
+    """
+    Inter-process lock on the index directory. WAL appends share it; compaction holds it
+    exclusively, so no process appends between the snapshot and the WAL rewrite.
+    """
+    path = path or FAISS_INDEX_PATH
+    os.makedirs(path, exist_ok=True)
+    with open(os.path.join(path, LOCK_FILENAME), "a") as f:
+        if fcntl is not None:
+            fcntl.flock(f.fileno(), fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            if fcntl is not None:
+                fcntl.flock(f.fileno(), fcntl.LOCK_UN)
+
+def _read_current(path):
+    try:
+        with open(os.path.join(path, CURRENT_FILENAME)) as f:
+            return f.read().strip() or None
+    except FileNotFoundError:
+        return None
+
+def _write_current(path, name):
+    tmp_path = os.path.join(path, CURRENT_FILENAME + ".tmp")
+    with open(tmp_path, "w") as f:
+        f.write(name)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, os.path.join(path, CURRENT_FILENAME))
+
+def _base_dir(path):
+    current = _read_current(path)
+    if current:
+        return os.path.join(path, current)
+    if os.path.exists(os.path.join(path, "index.faiss")):
+        return path
+    return None
+
+def _base_fingerprint(path):
+    base_dir = _base_dir(path)
+    if base_dir is None:
+        return None
+    fingerprint = [_read_current(path)]
+    for name in ("index.faiss", "index.pkl"):
+        try:
+            stat = os.stat(os.path.join(base_dir, name))
+        except FileNotFoundError:
+            return None
+        fingerprint.append((stat.st_mtime_ns, stat.st_size))
+    return tuple(fingerprint)
+
+
+def append_to_wal(records, path=None):
+    """Durably append (id, text, metadata, vector) records; cost is O(len(records))"""
+    path = path or FAISS_INDEX_PATH
+    os.makedirs(path, exist_ok=True)
+    lines = []
+    for doc_id, text, metadata, vector in records:
+        lines.append(json.dumps({
+            "id": doc_id,
+            "text": text,
+            "metadata": metadata,
+            "vector": base64.b64encode(np.asarray(vector, dtype=np.float32).tobytes()).decode("ascii"),
+        }, ensure_ascii=False))
+    with index_file_lock(path, shared=True), open(_wal_path(path), "ab") as f:
+        f.write(("\n".join(lines) + "\n").encode("utf-8"))
+        f.flush()
+        os.fsync(f.fileno())
+
+def read_wal(path=None, offset=0):
+    """Read complete WAL records after `offset`.
+
+    Returns (records, new_offset). A torn trailing line from an interrupted
+    append is left unconsumed.
+    """
+    path = path or FAISS_INDEX_PATH
+    try:
+        with open(_wal_path(path), "rb") as f:
+            f.seek(offset)
+            data = f.read()
+    except FileNotFoundError:
+        return [], 0
+
+    records = []
+    consumed = 0
+    for line in data.split(b"\n")[:-1]:
+        consumed += len(line) + 1
+        if not line.strip():
+            continue
+        try:
+            record = json.loads(line)
+        except json.JSONDecodeError:
+            continue
+        record["vector"] = np.frombuffer(base64.b64decode(record["vector"]), dtype=np.float32).tolist()
+        records.append(record)
+    return records, offset + consumed
+
+def replay_wal(vectorstore, records, embedding_model):
+    """Apply WAL records to `vectorstore`, skipping ids it already holds"""
+    if vectorstore is not None:
+        known_ids = vectorstore.docstore._dict
+        records = [record for record in records if record["id"] not in known_ids]
+    if not records:
+        return vectorstore
+
+    text_embeddings = [(record["text"], record["vector"]) for record in records]
+    metadatas = [record["metadata"] for record in records]
+    ids = [record["id"] for record in records]
+    if vectorstore is None:
+        return FAISS.from_embeddings(text_embeddings, embedding_model, metadatas=metadatas, ids=ids)
+    vectorstore.add_embeddings(text_embeddings, metadatas=metadatas, ids=ids)
+    return vectorstore
+
+
+def save_faiss_index(faiss_index, path=None, wal_offset=None):
+    """Write a full base snapshot and drop the WAL records it holds (compaction).
+
+    faiss_index must contain the WAL up to wal_offset; records after it (appended
+    by other processes since) are kept in the new WAL. Without wal_offset the
+    whole WAL is dropped. Call under index_file_lock() so no append lands in between.
+
+    The new snapshot goes to a fresh directory and CURRENT is swapped
+    atomically, so a crash at any point leaves a loadable base; records still
+    in the WAL are deduplicated by id on replay.
+    """
+    path = path or FAISS_INDEX_PATH
+    os.makedirs(path, exist_ok=True)
+    previous = _read_current(path)
+    generation = int(previous.split("-")[1]) + 1 if previous else 1
+    name = f"base-{generation:06d}"
+
+    faiss_index.save_local(os.path.join(path, name))
+    _write_current(path, name)
+    tail = b""
+    if wal_offset is not None:
+        try:
+            with open(_wal_path(path), "rb") as f:
+                f.seek(wal_offset)
+                tail = f.read()
+        except FileNotFoundError:
+            pass
+    tmp_path = _wal_path(path) + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(tail)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, _wal_path(path))
+
+    if previous:
+        shutil.rmtree(os.path.join(path, previous), ignore_errors=True)
+
+def load_faiss_snapshot(embedding_model, path=None):
+    """Load the base snapshot and replay the WAL. Returns (vectorstore, wal_offset)"""
+    path = path or FAISS_INDEX_PATH
+    base_dir = _base_dir(path)
+    vectorstore = None
+    if base_dir is not None:
+        vectorstore = FAISS.load_local(base_dir, embedding_model, allow_dangerous_deserialization=True)
+    records, offset = read_wal(path)
+    return replay_wal(vectorstore, records, embedding_model), offset
+
+def load_faiss_index(embedding_model=None, path=None):
+    path = path or FAISS_INDEX_PATH
+    if embedding_model is None:
+        embedding_model = current_app.embedding_model
+    if not os.path.exists(path):
+        return None
+    return load_faiss_snapshot(embedding_model, path)[0]
+
+def get_index_generation(path=None):
+    """Cheap fingerprint of the on-disk index: (base fingerprint, WAL size).
 
-def load_faiss_index():
-    embedding_model = current_app.embedding_model
-    if not os.path.exists(FAISS_INDEX_PATH):
+    Returns None when nothing has been saved yet.
+    """
+    path = path or FAISS_INDEX_PATH
+    base = _base_fingerprint(path)
+    try:
+        wal_size = os.path.getsize(_wal_path(path))
+    except FileNotFoundError:
+        wal_size = 0
+    if base is None and wal_size == 0:
         return None
-    return FAISS.load_local(FAISS_INDEX_PATH, embedding_model,allow_dangerous_deserialization=True)
+    return (base, wal_size)
@@ -0,0 +1,92 @@
+import contextvars
+import copy
+import threading
+from typing import Callable, Hashable, Iterator
+
+from app.utils.logging import setup_logger
+
+logger = setup_logger(__name__)
+
+
+class _Flight:
+    def __init__(self):
+        self.events = []
+        self.done = False
+        self.error = None
+        self.subscribers = 1
+        self.cond = threading.Condition()
+
+
+class SingleFlight:
+    """
+    Shares one run of a generator between concurrent callers with the same key.
+
+    The first caller's generator is drained on a background thread into a
+    buffer; every caller, including the first, replays the buffer and then
+    follows new events as they arrive, so a late joiner still sees the whole
+    stream. Once the run ends the key is released and the next caller starts
+    a fresh one. The run keeps going even if every caller stops reading.
+    """
+
+    def __init__(self, name: str = "single-flight"):
+        self.name = name
+        self._flights = {}
+        self._lock = threading.Lock()
+        self._stats = {"runs": 0, "coalesced": 0}
+
+    def stream(self, key: Hashable, make_iter: Callable[[], Iterator]) -> Iterator:
+        with self._lock:
+            flight = self._flights.get(key)
+            if flight is None:
+                flight = self._flights[key] = _Flight()
+                self._stats["runs"] += 1
+                leader = True
+            else:
+                flight.subscribers += 1
+                self._stats["coalesced"] += 1
+                leader = False
+        if leader:
+            # The run carries the first caller's context (token sinks, usage trackers)
+            context = contextvars.copy_context()
+            threading.Thread(target=context.run, args=(self._produce, key, flight, make_iter),
+                             name=self.name, daemon=True).start()
+        else:
+            logger.info(f" {self.name}: joined an in-flight run ({flight.subscribers} callers)")
+        return self._follow(flight)
+
+    def _produce(self, key, flight: _Flight, make_iter):
+        try:
+            for event in make_iter():
+                with flight.cond:
+                    flight.events.append(event)
+                    flight.cond.notify_all()
+        except Exception as e:
+            flight.error = e
+        finally:
+            with self._lock:
+                self._flights.pop(key, None)
+            with flight.cond:
+                flight.done = True
+                flight.cond.notify_all()
+
+    @staticmethod
+    def _follow(flight: _Flight) -> Iterator:
+        seen = 0
+        while True:
+            with flight.cond:
+                while seen == len(flight.events) and not flight.done:
+                    flight.cond.wait()
+                events = flight.events[seen:]
+                done = flight.done
+            seen += len(events)
+            # Each caller gets its own copy, so one can't change what the others receive
+            for event in events:
+                yield copy.deepcopy(event)
+            if done:
+                if flight.error is not None:
+                    raise flight.error
+                return
+
+    def stats(self) -> dict:
+        with self._lock:
+            return dict(self._stats, in_flight=len(self._flights))
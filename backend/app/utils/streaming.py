@@ -0,0 +1,35 @@
+import contextvars
+from contextlib import contextmanager
+
+from langchain_core.callbacks import BaseCallbackHandler
+
+# Where streamed LLM tokens go for the code running in the current context.
+# Unset (None) outside streaming runs, so the handler below is a no-op there.
+_token_sink = contextvars.ContextVar("token_sink", default=None)
+
+
+class ContextTokenHandler(BaseCallbackHandler):
+    """Forwards streamed LLM tokens to the sink bound to the current context, if any"""
+
+    # Called directly on the event loop in async runs instead of via a thread pool
+    run_inline = True
+
+    def on_llm_new_token(self, token: str, **kwargs) -> None:
+        sink = _token_sink.get()
+        if sink is not None and token:
+            sink(token)
+
+
+@contextmanager
+def token_sink(sink):
+    reset_token = _token_sink.set(sink)
+    try:
+        yield
+    finally:
+        _token_sink.reset(reset_token)
+
+
+def run_with_token_sink(sink, func, *args, **kwargs):
+    with token_sink(sink):
+        return func(*args, **kwargs)
+
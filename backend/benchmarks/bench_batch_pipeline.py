@@ -0,0 +1,106 @@
+"""Batch throughput in queries/minute: run_optimized_pipeline in a loop vs run_batch_pipeline.
+
+Agents and chains are replaced by a fake LLM that sleeps for the stage's typical
+duration (times scale) and, like the pooled clients, lets at most LLM_MAX_CONCURRENCY
+calls run at once. Embeddings use the local fake provider; indexing and result saves
+are left out.
+
+Run from backend/:  python -m benchmarks.bench_batch_pipeline [queries] [mode] [scale]
+"""
+import dataclasses
+import os
+import sys
+import threading
+import time
+
+os.environ.setdefault("EMBEDDING_PROVIDER", "fake")
+os.environ.setdefault("LLM_HEDGING_ENABLED", "false")
+
+from app.agents import batch_pipeline, pipeline_agent
+from app.config.pipeline_config import PERFORMANCE_CONFIGS
+from app.services.llm_clients import LLM_MAX_CONCURRENCY
+from app.services.stage_latency import DEFAULT_STAGE_SECONDS
+
+AGENT_STAGES = {"researcher": "research", "analyst": "analysis", "planner": "plan", "writer": "draft", "validator": "validation"}
+CHAIN_STAGES = {"report": "strategic_report", "swot": "swot_analysis", "timeline": "timeline"}
+
+
+class FakeLLM:
+    """Counts calls and the most in flight at once; at most max_concurrency run together"""
+
+    def __init__(self, max_concurrency):
+        self._slots = threading.Semaphore(max_concurrency)
+        self._lock = threading.Lock()
+        self.calls = 0
+        self.in_flight = 0
+        self.peak = 0
+
+    def call(self, seconds):
+        with self._slots:
+            with self._lock:
+                self.calls += 1
+                self.in_flight += 1
+                self.peak = max(self.peak, self.in_flight)
+            time.sleep(seconds)
+            with self._lock:
+                self.in_flight -= 1
+
+
+class FakeAgent:
+    def __init__(self, llm, seconds):
+        self.llm = llm
+        self.seconds = seconds
+
+    def invoke(self, inputs):
+        self.llm.call(self.seconds)
+        return {"output": f"output after {self.seconds:.2f}s"}
+
+
+class FakeChain:
+    def __init__(self, llm, seconds):
+        self.llm = llm
+        self.seconds = seconds
+
+    def run(self, **kwargs):
+        self.llm.call(self.seconds)
+        return f"output after {self.seconds:.2f}s"
+
+
+def _install(scale):
+    llm = FakeLLM(LLM_MAX_CONCURRENCY)
+    for name, stage in AGENT_STAGES.items():
+        pipeline_agent._agent_cache[name] = FakeAgent(llm, DEFAULT_STAGE_SECONDS[stage] * scale)
+    for name, stage in CHAIN_STAGES.items():
+        pipeline_agent._chain_cache[name] = FakeChain(llm, DEFAULT_STAGE_SECONDS[stage] * scale)
+    return llm
+
+
+def main(queries=40, mode="comprehensive", scale=0.05):
+    no_op = lambda *args, **kwargs: None
+    pipeline_agent.schedule_background_work = no_op
+    batch_pipeline.schedule_background_work = no_op
+    # "agent" mode so every stage goes through the fake agents, not the real tools
+    config = dataclasses.replace(PERFORMANCE_CONFIGS[mode], execution_mode="agent", enable_caching=False)
+    topics = [f"impact of topic {i} on healthcare" for i in range(queries)]
+
+    llm = _install(scale)
+    start = time.perf_counter()
+    for topic in topics:
+        pipeline_agent.run_optimized_pipeline(topic, config=config, use_cache=False)
+    loop_rate = queries / (time.perf_counter() - start) * 60
+    loop_llm = llm
+
+    llm = _install(scale)
+    start = time.perf_counter()
+    results = list(batch_pipeline.run_batch_pipeline(topics, config, use_cache=False))
+    batch_rate = queries / (time.perf_counter() - start) * 60
+    assert len(results) == queries and all(item["result"] for item in results)
+
+    print(f"{queries} '{mode}' queries, stage durations x{scale}, LLM_MAX_CONCURRENCY={LLM_MAX_CONCURRENCY}")
+    print(f"run_optimized_pipeline loop: {loop_rate:>8.1f} queries/min  ({loop_llm.calls} LLM calls, peak {loop_llm.peak} in flight)")
+    print(f"run_batch_pipeline:          {batch_rate:>8.1f} queries/min  ({llm.calls} LLM calls, peak {llm.peak} in flight, "
+          f"{batch_pipeline.get_batch_concurrency(config)} queries at once)")
+
+
+if __name__ == "__main__":
+    main(*(cast(arg) for cast, arg in zip((int, str, float), sys.argv[1:4])))
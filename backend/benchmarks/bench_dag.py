@@ -0,0 +1,89 @@
+"""Comprehensive-run makespan: the old fixed schedule vs the stage DAG.
+
+The old schedule ran research -> analysis -> plan -> draft and only then the four
+final steps; the DAG starts timeline and strategic_report as soon as the plan exists.
+Agents and chains are replaced by sleeps of typical relative duration.
+
+Run from backend/:  python -m benchmarks.bench_dag [scale] [deadline_seconds]
+scale multiplies the simulated stage durations (default 0.1, i.e. 10x faster than real).
+With a deadline (in real seconds), a third run shows which stages degrade to fit it.
+"""
+import dataclasses
+import sys
+import time
+
+from app.agents import pipeline_agent
+from app.agents.dag import DagScheduler, render_gantt
+from app.config.pipeline_config import PERFORMANCE_CONFIGS
+from app.services.stage_latency import DEFAULT_STAGE_SECONDS, STAGE_LATENCY_MIN_SAMPLES, get_stage_latency_tracker
+
+AGENT_STAGES = {"researcher": "research", "analyst": "analysis", "planner": "plan", "writer": "draft", "validator": "validation"}
+CHAIN_STAGES = {"report": "strategic_report", "swot": "swot_analysis", "timeline": "timeline"}
+
+
+class SleepingAgent:
+    def __init__(self, seconds):
+        self.seconds = seconds
+
+    def invoke(self, inputs):
+        time.sleep(self.seconds)
+        return {"output": f"output after {self.seconds:.2f}s"}
+
+
+class SleepingChain:
+    def __init__(self, seconds):
+        self.seconds = seconds
+
+    def run(self, **kwargs):
+        time.sleep(self.seconds)
+        return f"output after {self.seconds:.2f}s"
+
+
+def _makespan(stages, max_concurrency, deadline_seconds=None):
+    deadline = time.time() + deadline_seconds if deadline_seconds is not None else None
+    scheduler = DagScheduler(max_concurrency=max_concurrency, deadline=deadline)
+    start = time.perf_counter()
+    scheduler.run(stages)
+    return time.perf_counter() - start, scheduler.trace
+
+
+def main(scale=0.1, deadline_seconds=None):
+    tracker = get_stage_latency_tracker()
+    for name, stage in AGENT_STAGES.items():
+        pipeline_agent._agent_cache[name] = SleepingAgent(DEFAULT_STAGE_SECONDS[stage] * scale)
+    for name, stage in CHAIN_STAGES.items():
+        pipeline_agent._chain_cache[name] = SleepingChain(DEFAULT_STAGE_SECONDS[stage] * scale)
+    # Stage costs come from observed latencies; seed them with the simulated durations
+    for stage, seconds in DEFAULT_STAGE_SECONDS.items():
+        for _ in range(STAGE_LATENCY_MIN_SAMPLES):
+            tracker.record(stage, seconds * scale)
+
+    # "agent" mode so every stage goes through the simulated agents above, not the real tools
+    config = dataclasses.replace(PERFORMANCE_CONFIGS["comprehensive"], execution_mode="agent")
+    stages = pipeline_agent.build_pipeline_stages("benchmark topic", "", config)
+    final_steps = {"validation", "strategic_report", "swot_analysis", "timeline"}
+    legacy_stages = [
+        dataclasses.replace(stage, deps=("draft",)) if stage.name in final_steps else stage
+        for stage in stages
+    ]
+
+    legacy_time, legacy_trace = _makespan(legacy_stages, config.max_workers)
+    dag_time, dag_trace = _makespan(stages, config.max_workers)
+
+    print("old fixed schedule:")
+    print(render_gantt(legacy_trace))
+    print(f"makespan {legacy_time:.2f}s\n")
+    print("stage DAG:")
+    print(render_gantt(dag_trace))
+    print(f"makespan {dag_time:.2f}s ({(1 - dag_time / legacy_time) * 100:.0f}% lower)")
+
+    if deadline_seconds is not None:
+        deadline_time, deadline_trace = _makespan(stages, config.max_workers, deadline_seconds)
+        print(f"\nstage DAG with a {deadline_seconds:.2f}s deadline:")
+        print(render_gantt(deadline_trace))
+        degraded = {entry["stage"]: entry["status"] for entry in deadline_trace if entry["status"] != "ok"}
+        print(f"makespan {deadline_time:.2f}s, degraded: {degraded or 'none'}")
+
+
+if __name__ == "__main__":
+    main(*(float(arg) for arg in sys.argv[1:3]))
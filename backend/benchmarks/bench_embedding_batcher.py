@@ -0,0 +1,71 @@
+"""Embedding throughput under concurrency: one provider call per embed vs micro-batching.
+
+Uses a local fake provider with artificial per-call latency.
+Run from backend/:  python -m benchmarks.bench_embedding_batcher [threads] [calls_per_thread]
+"""
+import sys
+import threading
+import time
+
+from langchain_core.embeddings import Embeddings
+
+from app.services.embedding_batcher import BatchingEmbeddings
+
+
+class SlowFakeEmbeddings(Embeddings):
+    """Deterministic vectors with a fixed round-trip cost plus a small per-text cost.
+
+    At most `max_concurrency` calls are served at once, like a provider's
+    connection/rate limit.
+    """
+
+    def __init__(self, call_latency=0.05, per_text_latency=0.0005, size=16, max_concurrency=4):
+        self.call_latency = call_latency
+        self.per_text_latency = per_text_latency
+        self.size = size
+        self.calls = 0
+        self._slots = threading.Semaphore(max_concurrency)
+
+    def embed_documents(self, texts):
+        with self._slots:
+            self.calls += 1
+            time.sleep(self.call_latency + self.per_text_latency * len(texts))
+        return [[float(hash(text) % 1000)] * self.size for text in texts]
+
+    def embed_query(self, text):
+        return self.embed_documents([text])[0]
+
+    def embed_queries(self, texts):
+        # Symmetric embedder: queries batch like documents (Cohere's batched search_query call)
+        return self.embed_documents(texts)
+
+
+def _run(embeddings, threads, calls_per_thread):
+    def worker(worker_id):
+        for i in range(calls_per_thread):
+            embeddings.embed_query(f"query {worker_id}-{i}")
+
+    workers = [threading.Thread(target=worker, args=(i,)) for i in range(threads)]
+    start = time.perf_counter()
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    return time.perf_counter() - start
+
+
+def main(threads=32, calls_per_thread=20):
+    total = threads * calls_per_thread
+
+    direct = SlowFakeEmbeddings()
+    elapsed = _run(direct, threads, calls_per_thread)
+    print(f"direct:  {total / elapsed:8.1f} embeds/s, {direct.calls} provider calls")
+
+    provider = SlowFakeEmbeddings()
+    batched = BatchingEmbeddings(provider, window_ms=10, max_batch_size=96)
+    elapsed = _run(batched, threads, calls_per_thread)
+    print(f"batched: {total / elapsed:8.1f} embeds/s, {provider.calls} provider calls, {batched.stats()['queries']}")
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:3]))
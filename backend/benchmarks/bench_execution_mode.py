@@ -0,0 +1,62 @@
+"""LLM calls, tokens and wall time per comprehensive run: ReAct agents vs direct tool calls.
+
+Calls the real Groq API (GROQ_API_KEY, plus SERPAPI_API_KEY for research), so runs cost tokens.
+The LLM response cache, the semantic result cache and hedging are turned off so every
+stage call reaches the provider exactly once. Runs write nowhere outside a temporary
+directory: indexing is skipped, FAISS searches a temporary copy of the shipped index,
+results go to mongomock and stage checkpoints stay in memory.
+
+Run from backend/:  python -m benchmarks.bench_execution_mode ["query"] [runs]
+"""
+import dataclasses
+import os
+import shutil
+import sys
+import tempfile
+import time
+
+import mongomock
+from langchain_core.globals import set_llm_cache
+
+from app.agents.pipeline_agent import run_optimized_pipeline
+from app.config.pipeline_config import PERFORMANCE_CONFIGS
+from app.services import stage_checkpoints, stage_latency
+from app.services.db_service import set_mongo_client
+from app.utils import persistent_faiss
+from app.utils.llm_usage import track_llm_usage
+
+
+def _isolate_storage():
+    """Point the FAISS index, MongoDB and stage checkpoints away from the app's storage"""
+    path = os.path.join(tempfile.mkdtemp(), "faiss_index")
+    os.makedirs(path)
+    for name in ("index.faiss", "index.pkl"):
+        source = os.path.join(persistent_faiss.FAISS_INDEX_PATH, name)
+        if os.path.exists(source):
+            shutil.copy(source, path)
+    persistent_faiss.FAISS_INDEX_PATH = path
+    set_mongo_client(mongomock.MongoClient())
+    stage_checkpoints._checkpoint_store = stage_checkpoints.InMemoryCheckpointStore()
+
+
+def main(query="The impact of AI on healthcare", runs=1):
+    if not os.getenv("GROQ_API_KEY"):
+        sys.exit("GROQ_API_KEY is not set: this benchmark measures real Groq calls")
+    _isolate_storage()
+    set_llm_cache(None)
+    stage_latency.LLM_HEDGING_ENABLED = False
+
+    print(f"{'mode':>8} {'llm calls':>10} {'prompt tok':>11} {'completion tok':>15} {'seconds':>8}")
+    for mode in ("agent", "direct"):
+        config = dataclasses.replace(PERFORMANCE_CONFIGS["comprehensive"], execution_mode=mode, skip_indexing=True)
+        for _ in range(runs):
+            start = time.perf_counter()
+            with track_llm_usage() as usage:
+                run_optimized_pipeline(query, use_cache=False, config=config)
+            stats = usage.stats()
+            print(f"{mode:>8} {stats['llm_calls']:>10} {stats['prompt_tokens']:>11} "
+                  f"{stats['completion_tokens']:>15} {time.perf_counter() - start:>8.1f}")
+
+
+if __name__ == "__main__":
+    main(*(cast(arg) for cast, arg in zip((str, int), sys.argv[1:3])))
@@ -0,0 +1,59 @@
+"""Indexing cost per pipeline run as the store grows: WAL append vs full save_local.
+
+Run from backend/:  python -m benchmarks.bench_faiss_wal [max_vectors] [dim]
+Sizes go 1k, 10k, 100k, ... up to max_vectors (default 1,000,000).
+"""
+import sys
+import tempfile
+import time
+
+import numpy as np
+from langchain.schema import Document
+from langchain_community.embeddings import DeterministicFakeEmbedding
+from langchain_community.vectorstores import FAISS
+
+from app.services import vectorstore_service
+from app.utils import persistent_faiss
+
+
+def _build_store(size, dim, embedding_model):
+    vectors = np.random.default_rng(0).random((size, dim), dtype=np.float32)
+    texts = [f"doc {i}" for i in range(size)]
+    return FAISS.from_embeddings(list(zip(texts, vectors)), embedding_model)
+
+
+def main(max_vectors=1_000_000, dim=64, runs=5):
+    embedding_model = DeterministicFakeEmbedding(size=dim)
+    vectorstore_service.WAL_COMPACT_BYTES = float("inf")
+    new_docs = [
+        Document(page_content="Research: new findings", metadata={"type": "research"}),
+        Document(page_content="Analysis: new insights", metadata={"type": "analysis"}),
+    ]
+
+    size = 1000
+    print(f"{'vectors':>10} {'wal append (ms)':>16} {'full save (ms)':>16}")
+    while size <= max_vectors:
+        with tempfile.TemporaryDirectory() as path:
+            persistent_faiss.FAISS_INDEX_PATH = path
+            vectorstore = _build_store(size, dim, embedding_model)
+            store = vectorstore_service.get_resident_store()
+            store.invalidate()
+            store.replace(vectorstore)
+
+            start = time.perf_counter()
+            for _ in range(runs):
+                store.add_documents(new_docs, embedding_model)
+            wal_ms = (time.perf_counter() - start) / runs * 1000
+
+            start = time.perf_counter()
+            for _ in range(runs):
+                vectorstore.add_documents(new_docs)
+                vectorstore.save_local(path + "/full")
+            full_ms = (time.perf_counter() - start) / runs * 1000
+
+        print(f"{size:>10} {wal_ms:>16.2f} {full_ms:>16.2f}")
+        size *= 10
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:3]))
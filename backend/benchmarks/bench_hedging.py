@@ -0,0 +1,92 @@
+"""Tail latency and failure rate of stage calls: plain vs hedged + retried.
+
+A local fake LLM answers with lognormal latency; a small share of calls stall
+(stall_factor x slower) and some fail with a transient 503. The hedged client
+sends a duplicate once a call runs past the p90 of a warm-up window, and
+retries transient errors with jittered backoff, as the pipeline stages do.
+
+Run from backend/:  python -m benchmarks.bench_hedging [calls] [stall_rate] [error_rate]
+"""
+import random
+import statistics
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from app.services.stage_latency import StageLatencyTracker
+from app.utils.hedging import hedged_call
+
+
+class TransientLLMError(Exception):
+    status_code = 503
+
+
+class FakeLatencyLLM:
+    """Sleeps for a lognormal latency (median `median` seconds), sometimes stalling or failing"""
+
+    def __init__(self, median=0.05, sigma=0.3, stall_rate=0.05, stall_factor=10, error_rate=0.02, seed=0):
+        self.median = median
+        self.sigma = sigma
+        self.stall_rate = stall_rate
+        self.stall_factor = stall_factor
+        self.error_rate = error_rate
+        self._random = random.Random(seed)
+
+    def invoke(self, prompt):
+        latency = self.median * self._random.lognormvariate(0, self.sigma)
+        if self._random.random() < self.stall_rate:
+            latency *= self.stall_factor
+        time.sleep(latency)
+        if self._random.random() < self.error_rate:
+            raise TransientLLMError("503 Service Unavailable")
+        return f"answer to {prompt}"
+
+
+def _run(calls, call_once, concurrency=16):
+    latencies, failures = [], 0
+
+    def timed(i):
+        start = time.perf_counter()
+        try:
+            call_once(f"prompt {i}")
+            return time.perf_counter() - start, False
+        except Exception:
+            return time.perf_counter() - start, True
+
+    with ThreadPoolExecutor(max_workers=concurrency) as executor:
+        for latency, failed in executor.map(timed, range(calls)):
+            latencies.append(latency)
+            failures += failed
+    latencies.sort()
+    return {
+        "p50_ms": statistics.median(latencies) * 1000,
+        "p95_ms": latencies[int(len(latencies) * 0.95) - 1] * 1000,
+        "p99_ms": latencies[int(len(latencies) * 0.99) - 1] * 1000,
+        "failed": failures,
+    }
+
+
+def main(calls=500, stall_rate=0.05, error_rate=0.02):
+    llm = FakeLatencyLLM(stall_rate=stall_rate, error_rate=error_rate)
+
+    # Warm-up window, as the pipeline's rolling per-stage latency tracker would hold
+    tracker = StageLatencyTracker()
+    for i in range(100):
+        start = time.perf_counter()
+        try:
+            llm.invoke(f"warmup {i}")
+        except TransientLLMError:
+            continue
+        tracker.record("stage", time.perf_counter() - start)
+    hedge_after = tracker.percentile("stage", 0.9)
+
+    plain = _run(calls, llm.invoke)
+    hedged = _run(calls, lambda prompt: hedged_call(lambda: llm.invoke(prompt), hedge_after=hedge_after, retries=2))
+
+    print(f"{calls} calls, stall rate {stall_rate:.0%}, error rate {error_rate:.0%}, hedge after {hedge_after * 1000:.1f}ms (p90)")
+    print(f"plain:             {plain}")
+    print(f"hedged + retries:  {hedged}")
+
+
+if __name__ == "__main__":
+    main(*(cast(arg) for cast, arg in zip((int, float, float), sys.argv[1:4])))
@@ -0,0 +1,88 @@
+"""Result saves per second: one insert_one per run vs the buffered insert_many results store.
+
+The stand-in collection charges a network round trip per call plus a small
+per-document cost, like a remote MongoDB. With MONGODB_URI set, the real
+server is used instead (collection "bench_results", dropped afterwards).
+
+Run from backend/:  python -m benchmarks.bench_results_store [documents] [rtt_ms] [writers]
+"""
+import os
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+from app.services.background_tasks import BackgroundTaskService
+from app.services.results_store import ResultsStore
+
+
+class LatencyCollection:
+    """In-memory collection with a round-trip delay per call"""
+
+    def __init__(self, rtt_ms=2.0, per_document_ms=0.02):
+        self.rtt = rtt_ms / 1000
+        self.per_document = per_document_ms / 1000
+        self.documents = []
+        self.calls = 0
+        self._lock = threading.Lock()
+
+    def _store(self, documents):
+        time.sleep(self.rtt + self.per_document * len(documents))
+        with self._lock:
+            self.calls += 1
+            self.documents.extend(documents)
+
+    def insert_one(self, document):
+        self._store([document])
+
+    def insert_many(self, documents, ordered=True):
+        self._store(documents)
+
+        class Result:
+            inserted_ids = [document.get("_id") for document in documents]
+        return Result()
+
+
+def _document(i):
+    return {"query": f"topic {i}", "mode": "comprehensive", "status": "completed",
+            "created_at": datetime.now(timezone.utc), "result": {"draft": "x" * 2000}}
+
+
+def _collection(rtt_ms):
+    if os.getenv("MONGODB_URI"):
+        from app.services.db_service import get_mongo_collection
+        collection = get_mongo_collection("bench_results")
+        collection.drop()
+        return collection
+    return LatencyCollection(rtt_ms)
+
+
+def main(documents=2000, rtt_ms=2.0, writers=8):
+    # Old path: every run inserts its own document
+    collection = _collection(rtt_ms)
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=writers) as executor:
+        list(executor.map(lambda i: collection.insert_one(_document(i)), range(documents)))
+    single = documents / (time.perf_counter() - start)
+
+    # Results store: runs only append to a buffer, background workers write in bulk
+    collection = _collection(rtt_ms)
+    tasks = BackgroundTaskService(workers=2, dead_letter_path=None)
+    store = ResultsStore(get_collection=lambda: collection, submit=tasks.submit)
+    start = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=writers) as executor:
+        list(executor.map(lambda i: store.add(_document(i)), range(documents)))
+    store.close()
+    tasks.drain()
+    buffered = documents / (time.perf_counter() - start)
+    if os.getenv("MONGODB_URI"):
+        collection.drop()
+
+    print(f"{documents} documents, {writers} writers, {rtt_ms}ms round trip")
+    print(f"insert_one per run:     {single:>8.0f} docs/s")
+    print(f"buffered insert_many:   {buffered:>8.0f} docs/s  {store.stats()}")
+
+
+if __name__ == "__main__":
+    main(*(cast(arg) for cast, arg in zip((int, float, int), sys.argv[1:4])))
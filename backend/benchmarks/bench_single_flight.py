@@ -0,0 +1,73 @@
+"""Upstream LLM calls under a burst of duplicate queries: one run per request vs single-flight.
+
+A fake pipeline yields 8 stage events, each after one fake LLM call (a sleep).
+`clients` concurrent requests arrive within `spread` seconds, drawn from
+`distinct` trending queries (case and whitespace vary, as from real users).
+
+Run from backend/:  python -m benchmarks.bench_single_flight [clients] [distinct] [spread]
+"""
+import random
+import statistics
+import sys
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from app.utils.single_flight import SingleFlight
+
+STAGES = ("research", "analysis", "plan", "draft", "validation", "strategic_report", "swot_analysis", "timeline")
+
+
+class FakePipeline:
+    def __init__(self, llm_seconds=0.05):
+        self.llm_seconds = llm_seconds
+        self.llm_calls = 0
+        self._lock = threading.Lock()
+
+    def iter_events(self, query):
+        for stage in STAGES:
+            with self._lock:
+                self.llm_calls += 1
+            time.sleep(self.llm_seconds)
+            yield {"event": "stage", "stage": stage, "result": f"{stage} for {query}"}
+        yield {"event": "result", "result": {"query": query}}
+
+
+def _key(query):
+    return " ".join(query.lower().split())
+
+
+def _run(requests, spread, run_one):
+    latencies = []
+
+    def client(query):
+        time.sleep(random.uniform(0, spread))
+        start = time.perf_counter()
+        events = list(run_one(query))
+        assert events[-1]["event"] == "result"
+        return time.perf_counter() - start
+
+    with ThreadPoolExecutor(max_workers=len(requests)) as executor:
+        latencies = list(executor.map(client, requests))
+    return statistics.median(latencies) * 1000
+
+
+def main(clients=200, distinct=5, spread=0.2):
+    random.seed(0)
+    topics = [f"impact of topic {i} on healthcare" for i in range(distinct)]
+    requests = [random.choice([topic, topic.upper(), f"  {topic} "]) for topic in random.choices(topics, k=clients)]
+
+    plain = FakePipeline()
+    plain_p50 = _run(requests, spread, plain.iter_events)
+
+    shared = FakePipeline()
+    flights = SingleFlight("bench")
+    shared_p50 = _run(requests, spread, lambda query: flights.stream(_key(query), lambda: shared.iter_events(query)))
+
+    print(f"{clients} requests over {distinct} queries within {spread}s")
+    print(f"one run per request: {plain.llm_calls:>5} LLM calls, p50 {plain_p50:.0f}ms")
+    print(f"single-flight:       {shared.llm_calls:>5} LLM calls, p50 {shared_p50:.0f}ms, {flights.stats()}")
+
+
+if __name__ == "__main__":
+    main(*(cast(arg) for cast, arg in zip((int, int, float), sys.argv[1:4])))
@@ -0,0 +1,94 @@
+"""Cost of tracing a pipeline run: tracing off vs traces sampled out vs sampled in.
+
+Each run is the comprehensive stage DAG with instant stages that send the callbacks a
+real agent stage does (chain -> LLM call with token usage -> tool call), plus a FAISS
+search and a Mongo write, so a sampled run has the spans of a real one while the work
+itself is ~0: the time left over is the tracing overhead. Spans go to a temporary
+OTLP/JSON file and their export (serialization and write) is counted in the time.
+
+Run from backend/:  python -m benchmarks.bench_tracing [runs] [sample_rate]
+runs per setting (default 500); sample_rate is measured next to 0 and 1 (default 0.1).
+"""
+import logging
+import os
+import sys
+import tempfile
+import time
+import uuid
+from types import SimpleNamespace
+
+from app.agents.dag import DagScheduler, Stage
+from app.agents.pipeline_agent import instrumented_stages
+from app.services import tracing
+from app.services.metrics import RunMetrics, metrics_scope, record_call
+
+STAGE_DEPS = {
+    "research": (), "analysis": ("research",), "plan": ("analysis",), "draft": ("plan", "analysis"),
+    "validation": ("draft",), "strategic_report": ("research", "plan"), "swot_analysis": ("analysis", "draft"),
+    "timeline": ("plan",),
+}
+LLM_RESPONSE = SimpleNamespace(llm_output={"token_usage": {"prompt_tokens": 800, "completion_tokens": 400}}, generations=[])
+
+
+def _agent_callbacks(handler):
+    chain, llm, tool = uuid.uuid4(), uuid.uuid4(), uuid.uuid4()
+    handler.on_chain_start({"name": "AgentExecutor"}, {}, run_id=chain)
+    handler.on_chat_model_start({}, [], run_id=llm, parent_run_id=chain, invocation_params={"model_name": "benchmark"})
+    handler.on_llm_end(LLM_RESPONSE, run_id=llm)
+    handler.on_tool_start({"name": "search"}, "benchmark topic", run_id=tool, parent_run_id=chain)
+    handler.on_tool_end("results", run_id=tool)
+    handler.on_chain_end({}, run_id=chain)
+
+
+def _run_pipeline(handler):
+    run_metrics = RunMetrics()
+    root = tracing.start_span("pipeline", attributes={"pipeline.query": "benchmark topic"})
+
+    def events():
+        with tracing.use_span(root), metrics_scope(run_metrics):
+            record_call("faiss", "search", 0.0)
+        stages = [Stage(name, lambda results, name=name: _agent_callbacks(handler) or name, deps=deps)
+                  for name, deps in STAGE_DEPS.items()]
+        yield from DagScheduler(max_concurrency=4).iter_run(instrumented_stages(stages, run_metrics, root))
+        with tracing.use_span(root):
+            record_call("mongo", "insert", 0.0)
+
+    for _ in tracing.iter_in_span(root, events()):
+        pass
+
+
+def _measure(runs, enabled, sample_rate, handler):
+    tracing.TRACING_ENABLED, tracing.TRACE_SAMPLE_RATE = enabled, sample_rate
+    exporter = tracing.get_trace_exporter()
+    exported = exporter.stats()["exported"]
+    start = time.perf_counter()
+    for _ in range(runs):
+        _run_pipeline(handler)
+    exporter.flush()
+    elapsed = time.perf_counter() - start
+    return elapsed / runs, (exporter.stats()["exported"] - exported) / runs
+
+
+def main(runs=500, sample_rate=0.1):
+    # Per-stage log lines to stdout would cost more than the spans being measured
+    logging.getLogger("app.agents.dag").setLevel(logging.WARNING)
+    path = os.path.join(tempfile.mkdtemp(), "traces.jsonl")
+    tracing._trace_exporter = tracing.JsonFileExporter(path=path)
+    handler = tracing.TracingCallbackHandler()
+
+    _measure(20, True, 1.0, handler)  # warm up threads and imports
+    settings = [("tracing off", False, 0.0), ("sampled out (rate 0)", True, 0.0),
+                (f"rate {sample_rate:g}", True, sample_rate), ("sampled in (rate 1)", True, 1.0)]
+    baseline = None
+    print(f"{runs} comprehensive-shaped runs per setting, {len(STAGE_DEPS)} stages each\n")
+    print(f"{'setting':<22}{'ms/run':>10}{'overhead':>12}{'spans/run':>11}")
+    for label, enabled, rate in settings:
+        per_run, spans = _measure(runs, enabled, rate, handler)
+        baseline = per_run if baseline is None else baseline
+        print(f"{label:<22}{per_run * 1000:>10.3f}{(per_run - baseline) * 1e6:>10.0f}us{spans:>11.1f}")
+    print(f"\n{os.path.getsize(path) / 1024:.0f} KiB of OTLP/JSON written to {path}")
+    tracing._trace_exporter.close()
+
+
+if __name__ == "__main__":
+    main(*(cast(arg) for cast, arg in zip((int, float), sys.argv[1:3])))
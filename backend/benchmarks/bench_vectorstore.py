@@ -0,0 +1,56 @@
+"""Per-query latency: reload-from-disk on every search vs the resident store.
+
+Run from backend/:  python -m benchmarks.bench_vectorstore [num_docs] [num_queries]
+"""
+import statistics
+import sys
+import tempfile
+import time
+
+from langchain_community.embeddings import DeterministicFakeEmbedding
+from langchain_community.vectorstores import FAISS
+
+from app.services import vectorstore_service
+from app.utils import persistent_faiss
+
+
+def _percentiles(samples):
+    samples = sorted(samples)
+    return {
+        "p50_ms": statistics.median(samples) * 1000,
+        "p95_ms": samples[int(len(samples) * 0.95) - 1] * 1000,
+        "mean_ms": statistics.mean(samples) * 1000,
+    }
+
+
+def main(num_docs=5000, num_queries=200):
+    embedding_model = DeterministicFakeEmbedding(size=1024)
+    texts = [f"Document {i} about topic {i % 97}" for i in range(num_docs)]
+    queries = [f"topic {i % 97}" for i in range(num_queries)]
+
+    with tempfile.TemporaryDirectory() as path:
+        persistent_faiss.FAISS_INDEX_PATH = path
+        persistent_faiss.save_faiss_index(FAISS.from_texts(texts, embedding_model))
+
+        reload_samples = []
+        for query in queries:
+            start = time.perf_counter()
+            persistent_faiss.load_faiss_index(embedding_model).similarity_search(query, k=2)
+            reload_samples.append(time.perf_counter() - start)
+
+        store = vectorstore_service.get_resident_store()
+        store.invalidate()
+        store.search(queries[0], embedding_model, k=2)  # warm load
+        resident_samples = []
+        for query in queries:
+            start = time.perf_counter()
+            store.search(query, embedding_model, k=2)
+            resident_samples.append(time.perf_counter() - start)
+
+    print(f"{num_docs} docs, {num_queries} queries")
+    print(f"reload-per-call: {_percentiles(reload_samples)}")
+    print(f"resident store:  {_percentiles(resident_samples)}")
+
+
+if __name__ == "__main__":
+    main(*(int(arg) for arg in sys.argv[1:3]))
@@ -0,0 +1,27 @@
+from app.services import rate_limiter
+from app.services.embedding_batcher import BatchingEmbeddings
+from app.services.rate_limiter import rate_deadline, rate_priority
+
+
+class RecordingEmbeddings:
+    """Fake provider recording the rate-limit deadline and priority each batch is sent with"""
+
+    def __init__(self):
+        self.batches = []
+
+    def embed_documents(self, texts):
+        self.batches.append((len(texts), rate_limiter._deadline.get(), rate_limiter._priority.get()))
+        return [[float(len(text))] for text in texts]
+
+
+def test_batches_carry_the_callers_rate_limit_context():
+    provider = RecordingEmbeddings()
+    embeddings = BatchingEmbeddings(provider, window_ms=5, max_batch_size=2, max_in_flight=2)
+    with rate_deadline(30), rate_priority("batch"):
+        assert embeddings.embed_documents(["a", "bb", "ccc"]) == [[1.0], [2.0], [3.0]]
+    assert sorted(size for size, _, _ in provider.batches) == [1, 2]
+    assert all(deadline is not None and priority == "batch" for _, deadline, priority in provider.batches)
+
+    provider.batches.clear()
+    embeddings.embed_documents(["a"])
+    assert provider.batches == [(1, None, "interactive")]
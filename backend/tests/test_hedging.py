@@ -0,0 +1,90 @@
+import time
+
+import pytest
+
+from app.services.stage_latency import StageLatencyTracker
+from app.utils.hedging import hedged_call
+
+
+class TransientLLMError(Exception):
+    status_code = 503
+
+
+class FakeLLM:
+    """Local stand-in for a stage LLM: the n-th call sleeps latencies[n] and raises errors[n] if set"""
+
+    def __init__(self, latencies, errors=()):
+        self.latencies = list(latencies)
+        self.errors = list(errors)
+        self.calls = 0
+
+    def invoke(self, prompt):
+        n = self.calls
+        self.calls += 1
+        time.sleep(self.latencies[n % len(self.latencies)])
+        if n < len(self.errors) and self.errors[n] is not None:
+            raise self.errors[n]
+        return f"answer {n} to {prompt}"
+
+
+def timed(call):
+    start = time.perf_counter()
+    result = call()
+    return result, time.perf_counter() - start
+
+
+def test_no_hedge_without_a_delay():
+    llm = FakeLLM([0.01])
+    assert hedged_call(lambda: llm.invoke("q")) == "answer 0 to q"
+    assert llm.calls == 1
+
+
+def test_fast_call_is_not_hedged():
+    llm = FakeLLM([0.01])
+    assert hedged_call(lambda: llm.invoke("q"), hedge_after=0.5) == "answer 0 to q"
+    assert llm.calls == 1
+
+
+def test_stalled_call_is_beaten_by_the_hedge():
+    llm = FakeLLM([1.0, 0.02])
+    result, elapsed = timed(lambda: hedged_call(lambda: llm.invoke("q"), hedge_after=0.05))
+    assert result == "answer 1 to q"
+    assert llm.calls == 2
+    assert elapsed < 0.5
+
+
+def test_transient_errors_are_retried():
+    llm = FakeLLM([0], errors=[TransientLLMError("503"), TransientLLMError("503")])
+    assert hedged_call(lambda: llm.invoke("q"), retries=2) == "answer 2 to q"
+    assert llm.calls == 3
+
+
+def test_retries_are_bounded():
+    llm = FakeLLM([0], errors=[TransientLLMError("503")] * 3)
+    with pytest.raises(TransientLLMError):
+        hedged_call(lambda: llm.invoke("q"), retries=1)
+    assert llm.calls == 2
+
+
+def test_other_errors_are_not_retried():
+    llm = FakeLLM([0], errors=[ValueError("bad prompt")])
+    with pytest.raises(ValueError):
+        hedged_call(lambda: llm.invoke("q"), retries=3)
+    assert llm.calls == 1
+
+
+def test_hedging_at_p90_cuts_the_tail():
+    # Every 10th call stalls, so the p90 of the window is a normal call
+    latencies = [0.01] * 9 + [0.5]
+    tracker = StageLatencyTracker()
+    for latency in latencies:
+        tracker.record("draft", latency)
+    hedge_after = tracker.percentile("draft", 0.9)
+    assert hedge_after == 0.01
+
+    plain_llm, hedged_llm = FakeLLM(latencies), FakeLLM(latencies)
+    plain = max(timed(lambda: plain_llm.invoke("q"))[1] for _ in latencies)
+    hedged = max(timed(lambda: hedged_call(lambda: hedged_llm.invoke("q"), hedge_after=hedge_after))[1]
+                 for _ in latencies)
+    assert plain >= 0.5
+    assert hedged < 0.25
@@ -0,0 +1,10 @@
+from app.services.history_service import build_projection, parse_fields
+
+
+def test_overlapping_fields_keep_the_parent():
+    assert build_projection(parse_fields("result.draft,result,query")) == {"result": 1, "query": 1}
+
+
+def test_nested_fields_without_their_parent_are_kept():
+    assert build_projection(parse_fields("result.draft,result.plan,created_at")) == {
+        "result.draft": 1, "result.plan": 1, "created_at": 1}
@@ -0,0 +1,60 @@
+import time
+
+from langchain_core.language_models import FakeListLLM
+
+from app.services.llm_cache import TieredLLMCache
+
+
+def fake_llm(cache, responses=("first", "second", "third")):
+    """Answers the next response on each uncached call, so a cache hit shows as a repeated answer"""
+    return FakeListLLM(responses=list(responses), cache=cache)
+
+
+def test_memory_hit_after_miss():
+    cache = TieredLLMCache(db_path=None)
+    llm = fake_llm(cache)
+    assert llm.invoke("prompt") == "first"
+    assert llm.invoke("prompt") == "first"
+    assert llm.invoke("other prompt") == "second"
+    stats = cache.stats()
+    assert (stats["misses"], stats["memory_hits"], stats["writes"]) == (2, 1, 2)
+
+
+def test_model_parameters_are_part_of_the_key():
+    cache = TieredLLMCache(db_path=None)
+    assert fake_llm(cache, ["a"]).invoke("prompt") == "a"
+    assert fake_llm(cache, ["b"]).invoke("prompt") == "b"
+    assert cache.stats()["misses"] == 2
+
+
+def test_disk_hit_survives_a_new_cache(tmp_path):
+    db_path = str(tmp_path / "llm_cache.sqlite")
+    assert fake_llm(TieredLLMCache(db_path=db_path)).invoke("prompt") == "first"
+
+    cache = TieredLLMCache(db_path=db_path)
+    llm = fake_llm(cache)
+    assert llm.invoke("prompt") == "first"
+    assert llm.invoke("prompt") == "first"
+    stats = cache.stats()
+    assert (stats["disk_hits"], stats["memory_hits"], stats["misses"]) == (1, 1, 0)
+
+
+def test_lru_evicts_the_oldest_entry():
+    cache = TieredLLMCache(max_size=1, db_path=None)
+    llm = fake_llm(cache)
+    assert llm.invoke("one") == "first"
+    assert llm.invoke("two") == "second"
+    assert llm.invoke("one") == "third"
+    assert cache.stats()["memory_entries"] == 1
+
+
+def test_expired_entries_miss_in_both_tiers(tmp_path):
+    cache = TieredLLMCache(ttl_seconds=0.05, db_path=str(tmp_path / "llm_cache.sqlite"))
+    llm = fake_llm(cache)
+    assert llm.invoke("prompt") == "first"
+    time.sleep(0.1)
+    assert llm.invoke("prompt") == "second"
+    stats = cache.stats()
+    assert stats["expired"] == 2
+    assert stats["misses"] == 2
+    assert stats["memory_hits"] + stats["disk_hits"] == 0
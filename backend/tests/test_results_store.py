@@ -0,0 +1,71 @@
+import mongomock
+import pytest
+
+from app.services import db_service
+from app.services.results_store import RESULTS_COLLECTION, ResultsStore, build_result_document
+
+
+@pytest.fixture
+def collection(monkeypatch):
+    """The results collection on a mongomock client, with every insert_many call recorded"""
+    monkeypatch.setattr(db_service, "_mongo_client", None)
+    db_service.set_mongo_client(mongomock.MongoClient())
+    collection = db_service.get_mongo_collection(RESULTS_COLLECTION)
+    collection.calls = []
+    insert_many = collection.insert_many
+
+    def recording_insert_many(documents, **kwargs):
+        collection.calls.append((len(documents), kwargs))
+        return insert_many(documents, **kwargs)
+
+    monkeypatch.setattr(collection, "insert_many", recording_insert_many)
+    return collection
+
+
+def run_now(name, func, *args, payload=None):
+    """Stand-in for the background task service: runs the write on the caller's thread"""
+    func(*args)
+    return True
+
+
+def result_document(query):
+    return build_result_document({"query": query, "status": "completed", "execution_time": 1.0}, "balanced")
+
+
+def test_results_are_buffered_and_flushed_in_one_unordered_insert(collection):
+    store = ResultsStore(get_collection=lambda: collection, batch_size=3, flush_interval=60, submit=run_now)
+    store.add(result_document("first query"))
+    store.add(result_document("second query"))
+    assert collection.count_documents({}) == 0
+    assert store.stats()["buffered"] == 2
+
+    store.add(result_document("third query"))
+    assert collection.calls == [(3, {"ordered": False})]
+    assert sorted(doc["query"] for doc in collection.find()) == ["first query", "second query", "third query"]
+    assert store.stats() == {"added": 3, "flushes": 1, "written": 3, "buffered": 0}
+    store.close()
+
+
+def test_default_collection_comes_from_the_shared_client(collection):
+    store = ResultsStore(batch_size=10, flush_interval=60, submit=run_now)
+    store.add(result_document("query"))
+    store.close()
+    assert collection.calls == [(1, {"ordered": False})]
+    assert collection.find_one()["query"] == "query"
+
+
+def test_duplicate_keys_of_a_retried_batch_are_tolerated(collection):
+    store = ResultsStore(get_collection=lambda: collection, batch_size=10, flush_interval=60, submit=run_now)
+    stored = result_document("stored query")
+    store.add(stored)
+    store.flush()
+
+    # A retried batch repeats documents already written, by _id, next to new ones
+    store.add(dict(stored))
+    store.add(result_document("new query"))
+    store.flush()
+
+    assert [kwargs for _, kwargs in collection.calls] == [{"ordered": False}] * 2
+    assert collection.count_documents({}) == 2
+    assert store.stats()["written"] == 2
+    store.close()